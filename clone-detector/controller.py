@@ -1,29 +1,74 @@
 #!/usr/bin/env python3
+"""Runs the scripts of SourcererCC with a single command.
+
+The work is a graph of steps, every step starting as soon as the steps it
+depends on are done, so that independent steps run at the same time:
+
+    split_1 ──────┐
+    backup_gtpm ──┴─> init ─> index ─┬─> move_index ──────┐
+    split_n ─────────────────────────┴─> prepare_queries ─┴─> search
+
+The state of every step, and of every node of the steps running on nodes,
+is kept in scriptinator_metadata.scc. When the controller is run again
+after a failure, the steps that are done are skipped and a step on nodes
+only runs on the nodes that failed or didn't finish: runnodes.sh is given
+the list of these nodes, and writes the exit code and wall time of each
+node to NODE_<i>/<mode>.status, reported at the end of the step. The state
+is removed once the search is done, so the next run starts from scratch.
+"""
 
 from __future__ import absolute_import, division, print_function, unicode_literals
+import json
+import shutil
 import subprocess
-import sys
+import threading
+import time
 import os
+from argparse import ArgumentParser
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 # exit codes
 EXIT_SUCCESS = 0
 EXIT_FAILURE = 1
-# states
+# states of the single integer scriptinator_metadata.scc of older versions
 STATE_EXECUTE_1 = 0
 STATE_INIT = 1
 STATE_INDEX = 2
 STATE_MOVE_INDEX = 3
 STATE_EXECUTE_2 = 4
 STATE_SEARCH = 5
+# step -> steps it depends on
+STEPS = {
+    "split_1": [],
+    "backup_gtpm": [],
+    "split_n": [],
+    "init": ["split_1", "backup_gtpm"],
+    "index": ["init"],
+    "move_index": ["index"],
+    "prepare_queries": ["index", "split_n"],
+    "search": ["move_index", "prepare_queries"],
+}
+# steps run in each integer state of an old state file
+OLD_STATE_STEPS = {
+    STATE_EXECUTE_1: ["split_1"],
+    STATE_INIT: ["backup_gtpm", "init"],
+    STATE_INDEX: ["index"],
+    STATE_MOVE_INDEX: ["move_index"],
+    STATE_EXECUTE_2: ["split_n", "prepare_queries"],
+    STATE_SEARCH: ["search"],
+}
+STATUS_DONE = "done"
+STATUS_RUNNING = "running"
+STATUS_FAILED = "failed"
 
 
 class ScriptControllerException(Exception):
     pass
 
 
-def run_command(cmd):
+def run_command(cmd, cwd=None):
     print("running command {}".format(" ".join(cmd)))
-    p = subprocess.Popen(cmd, universal_newlines=True)
+    p = subprocess.Popen(cmd, universal_newlines=True, cwd=cwd)
     p.communicate()
     return p.returncode
 
@@ -39,77 +84,214 @@ def full_script_path(string, param=""):
     return res
 
 
-def run_command_wrapper(cmd, params):
+def run_command_wrapper(cmd, params, cwd=None):
     command = full_script_path(cmd, params)
-    return_code = run_command(command.split())
+    # unevensplit.py writes the query files to the current directory
+    return_code = run_command(command.split(), cwd or full_file_path(""))
     if return_code != EXIT_SUCCESS:
         raise ScriptControllerException("error during executing {}".format(command))
 
 
+def dependents(step):
+    """Steps that run after step, directly or not."""
+    result = set()
+    for other, requires in STEPS.items():
+        if step in requires:
+            result.add(other)
+            result |= dependents(other)
+    return result
+
+
 # Aim of this class is to run the scripts for SourcererCC with a single command
 class ScriptController(object):
-    def __init__(self, num_nodes):
+    def __init__(self, num_nodes, split_dir=None):
         self.num_nodes_search = num_nodes
+        # query_<i>.file of every node already split, e.g. by run.py, instead
+        # of splitting input/dataset/blocks.file with unevensplit.py
+        self.split_dir = split_dir or full_file_path("split")
+        self.split_given = split_dir is not None
         self.script_meta_file_name = full_file_path("scriptinator_metadata.scc")
-        self.current_state = STATE_EXECUTE_1  # default state
-        self.previous_run_state = self.load_previous_state()
+        self.lock = threading.Lock()
+        # {"steps": {step: status}, "nodes": {step: {node: {"status", "wall"}}}}
+        self.state = self.load_previous_state()
+        self.step_times = {}
 
     def execute(self):
-        print("previous run state {}".format(self.previous_run_state))
-        if self.previous_run_state <= STATE_EXECUTE_1:
-            run_command_wrapper("execute.sh", "1")
-        self.current_state += 1
-        self.flush_state()
-        # execute the init command
-        if self.previous_run_state <= STATE_INIT:
-            if self.previous_run_state == STATE_INIT:
-                # last time the execution failed at init step. We need to replace the existing gtpm index from the backup
-                run_command_wrapper("restore-gtpm.sh", "")
-            else:
-                # take backup of existing gtpmindex before starting init
-                run_command_wrapper("backup-gtpm.sh", "")
-            # run the init step
-            run_command_wrapper("runnodes.sh", "init 1")
-        self.current_state += 1
-
-        # execute index
-        self.perform_step(STATE_INDEX, "runnodes.sh", "index 1")
-        # execute move indexes
-        self.perform_step(STATE_MOVE_INDEX, "move-index.sh", "")
-        # execute command to create the dir structure
-        self.perform_step(STATE_EXECUTE_2, "execute.sh", "{}".format(self.num_nodes_search))
-        self.perform_step(STATE_SEARCH, "runnodes.sh", "search {}".format(self.num_nodes_search))
-
-        self.flush_state()
-        self.current_state = STATE_EXECUTE_1  # go back to EXE 1 state
+        print("previous run state {}".format(self.state["steps"]))
+        failures = []
+        running = {}
+        with ThreadPoolExecutor(len(STEPS)) as pool:
+            while True:
+                if not failures:
+                    for step in self.ready_steps(running.values()):
+                        running[pool.submit(self.perform_step, step)] = step
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    try:
+                        future.result()
+                    except (ScriptControllerException, OSError) as e:
+                        print("FAILED: step {}: {}".format(step, e))
+                        failures.append(step)
+        self.report()
+        if failures:
+            raise ScriptControllerException("steps failed: {}, run the controller again to resume".format(", ".join(failures)))
+        os.remove(self.script_meta_file_name)
         print("SUCCESS: Search Completed on all nodes")
 
-    def perform_step(self, state, cmd, params):
-        self.flush_state()
-        if self.previous_run_state <= state:
-            run_command_wrapper(cmd, params)
-        self.current_state += 1
+    def ready_steps(self, running):
+        steps = self.state["steps"]
+        return [step for step, requires in STEPS.items()
+                if steps.get(step) != STATUS_DONE and step not in running and all(steps.get(r) == STATUS_DONE for r in requires)]
+
+    def perform_step(self, step):
+        with self.lock:
+            previous = self.state["steps"].get(step)
+            self.state["steps"][step] = STATUS_RUNNING
+            # what ran after this step used its previous output
+            for other in dependents(step):
+                self.state["steps"].pop(other, None)
+                self.state["nodes"].pop(other, None)
+            self.flush_state()
+        start = time.time()
+        try:
+            getattr(self, "step_" + step)(previous)
+        except Exception:
+            self.set_step_status(step, STATUS_FAILED)
+            raise
+        finally:
+            self.step_times[step] = time.time() - start
+        self.set_step_status(step, STATUS_DONE)
+
+    def set_step_status(self, step, status):
+        with self.lock:
+            self.state["steps"][step] = status
+            self.flush_state()
+
+    def step_split_1(self, previous):
+        # all the dataset in the queries of NODE_1, for init and index
+        run_command_wrapper("execute.sh", "1")
+
+    def step_backup_gtpm(self, previous):
+        run_command_wrapper("backup-gtpm.sh", "")
+
+    def step_split_n(self, previous):
+        if self.split_given:
+            return
+        if not os.path.isdir(self.split_dir):
+            os.makedirs(self.split_dir)
+        run_command_wrapper("unevensplit.py", "{} {}".format(full_file_path("input/dataset/blocks.file"), self.num_nodes_search),
+                            self.split_dir)
+
+    def step_init(self, previous):
+        if previous is not None:
+            # last time the execution failed at init step. We need to replace the existing gtpm index from the backup
+            run_command_wrapper("restore-gtpm.sh", "")
+        self.run_nodes("init", "init", 1)
+
+    def step_index(self, previous):
+        self.run_nodes("index", "index", 1)
+
+    def step_move_index(self, previous):
+        run_command_wrapper("move-index.sh", "")
+
+    def step_prepare_queries(self, previous):
+        # what execute.sh does after unevensplit.py. The split files are
+        # linked, not moved, so that the step can be rerun
+        for i in range(1, self.num_nodes_search + 1):
+            name = "query_{}.file".format(i)
+            target = full_file_path(name)
+            if os.path.exists(target):
+                os.remove(target)
+            try:
+                os.link(os.path.join(self.split_dir, name), target)
+            except OSError:
+                shutil.copyfile(os.path.join(self.split_dir, name), target)
+        run_command_wrapper("preparequery.sh", "{}".format(self.num_nodes_search))
+        run_command_wrapper("replacenodeprefix.sh", "{}".format(self.num_nodes_search))
+
+    def step_search(self, previous):
+        self.run_nodes("search", "search", self.num_nodes_search)
+
+    def run_nodes(self, step, mode, num_nodes):
+        """runnodes.sh in mode on the nodes of step not done yet."""
+        with self.lock:
+            nodes_state = self.state["nodes"].setdefault(step, {})
+            nodes = [str(i) for i in range(1, num_nodes + 1) if nodes_state.get(str(i), {}).get("status") != STATUS_DONE]
+        if not nodes:
+            return
+        print("running {} on nodes {}".format(mode, ",".join(nodes)))
+        try:
+            # empty threshold, runnodes.sh uses its default
+            command = [full_file_path("runnodes.sh"), mode, str(num_nodes), "", ",".join(nodes)]
+            if run_command(command, full_file_path("")) != EXIT_SUCCESS:
+                raise ScriptControllerException("error during executing {}".format(" ".join(command)))
+        finally:
+            with self.lock:
+                for node in nodes:
+                    nodes_state[node] = self.read_node_status(mode, node)
+                self.flush_state()
+            for node in nodes:
+                print("NODE_{} {}: {} in {} s".format(node, mode, nodes_state[node]["status"], nodes_state[node]["wall"]))
+
+    def read_node_status(self, mode, node):
+        # "<exit code> <wall seconds>", written by runnodes.sh when the node exits
+        try:
+            with open(full_file_path("NODE_{}/{}.status".format(node, mode)), "r", encoding="utf-8") as f:
+                code, wall = f.readline().split()
+        except (IOError, ValueError):
+            return {"status": STATUS_FAILED, "wall": None}
+        return {"status": STATUS_DONE if int(code) == EXIT_SUCCESS else STATUS_FAILED, "wall": int(wall)}
+
+    def report(self):
+        print("step timings:")
+        for step in STEPS:
+            if step in self.step_times:
+                print("  {:<16} {:>8} {:>10.1f} s".format(step, self.state["steps"].get(step), self.step_times[step]))
+        for step, nodes_state in self.state["nodes"].items():
+            walls = [(int(node), node_state["wall"]) for node, node_state in nodes_state.items() if node_state["wall"] is not None]
+            if walls:
+                slowest = max(walls, key=lambda node_wall: node_wall[1])
+                print("  {} wall time per node: min {} s, max {} s (NODE_{})".format(step, min(w for _, w in walls), slowest[1], slowest[0]))
 
     def flush_state(self):
-        print("flushing current state {}".format(self.current_state))
-        with open(self.script_meta_file_name, "w", encoding="utf-8") as f:
-            f.write("{}\n".format(self.current_state))
+        print("flushing current state {}".format(self.state["steps"]))
+        with open(self.script_meta_file_name + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(self.script_meta_file_name + ".tmp", self.script_meta_file_name)
 
     def load_previous_state(self):
         print("loading previous run state")
-        if os.path.isfile(self.script_meta_file_name):
-            with open(self.script_meta_file_name, "r", encoding="utf-8") as f:
-                return int(f.readline())
-        else:
-            print("{} doesn't exist, creating one with state EXECUTE_1".format(self.script_meta_file_name))
-            return STATE_EXECUTE_1
+        state = {"steps": {}, "nodes": {}}
+        if not os.path.isfile(self.script_meta_file_name):
+            print("{} doesn't exist, starting from scratch".format(self.script_meta_file_name))
+            return state
+        with open(self.script_meta_file_name, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+        if content.startswith("{"):
+            return json.loads(content)
+        # single integer state of older versions
+        old_state = int(content)
+        for old, steps in sorted(OLD_STATE_STEPS.items()):
+            if old_state > old:
+                for step in steps:
+                    state["steps"][step] = STATUS_DONE
+        if old_state == STATE_INIT:
+            # failed at init, after the backup of the gtpm index
+            state["steps"]["backup_gtpm"] = STATUS_DONE
+            state["steps"]["init"] = STATUS_FAILED
+        return state
 
 
 if __name__ == '__main__':
-    numnodes = 2
-    if len(sys.argv) >= 2:
-        numnodes = int(sys.argv[1])
+    parser = ArgumentParser(description="Run the init, index and search steps of SourcererCC")
+    parser.add_argument("num_nodes", nargs="?", type=int, default=2, help="number of search nodes")
+    parser.add_argument("--split-dir", help="folder with the query_<i>.file of every node, already split")
+    args = parser.parse_args()
+    numnodes = args.num_nodes
     print("search will be carried out with {} nodes".format(numnodes))
 
-    controller = ScriptController(numnodes)
+    controller = ScriptController(numnodes, args.split_dir and os.path.abspath(args.split_dir))
     controller.execute()
@@ -11,34 +11,57 @@ ant -buildfile $rootPATH/build.xml clean cdi
 mode="${1:-search}"
 num_nodes="${2:-50}"
 threshold="${3:-8}"
+# comma separated nodes to run, all of them by default
+nodes="${4:-$(seq -s , 1 1 $num_nodes)}"
 printf "\e[32m[runnodes.sh] \e[0m*****************************************************\n"
 printf "\e[32m[runnodes.sh] \e[0mrunning this script in $mode mode\n"
 printf "\e[32m[runnodes.sh] \e[0m*****************************************************\n"
 
 echo $num_nodes > $rootPATH/search_metadata.txt
 
-PIDS=""
+PIDS=()
+NODES=()
 
 rm -f "$rootPATH/nodes_completed.txt"
+# NODE_1 waits for all the nodes to sign off in nodes_completed.txt, the
+# nodes not run this time finished in an earlier run
+if [ "$mode" == "search" ]; then
+    for i in $(seq 1 1 $num_nodes)
+    do
+        if [[ ",$nodes," != *",$i,"* ]]; then
+            echo "NODE_$i" >> "$rootPATH/nodes_completed.txt"
+        fi
+    done
+fi
 
-for i in $(seq 1 1 $num_nodes)
+for i in ${nodes//,/ }
 do
-    java -Dproperties.rootDir="$rootPATH/" -Dproperties.location="$rootPATH/NODE_$i/sourcerer-cc.properties" -Dlog4j.configurationFile="$rootPATH/NODE_$i/log4j2.xml" -Xms6g -Xmx6g -XX:+UseCompressedOops -jar $rootPATH/dist/indexbased.SearchManager.jar $mode $threshold &
-    PIDS+="$! "
+    # "<exit code> <wall seconds>" once the node exits, read by controller.py
+    status_file="$rootPATH/NODE_$i/$mode.status"
+    rm -f "$status_file"
+    (
+        start=$(date +%s)
+        java -Dproperties.rootDir="$rootPATH/" -Dproperties.location="$rootPATH/NODE_$i/sourcerer-cc.properties" -Dlog4j.configurationFile="$rootPATH/NODE_$i/log4j2.xml" -Xms6g -Xmx6g -XX:+UseCompressedOops -jar $rootPATH/dist/indexbased.SearchManager.jar $mode $threshold
+        code=$?
+        echo "$code $(( $(date +%s) - start ))" > "$status_file"
+        exit $code
+    ) &
+    PIDS+=($!)
+    NODES+=($i)
 done
-printf "\e[32m[runnodes.sh] \e[0m$PIDS\n"
+printf "\e[32m[runnodes.sh] \e[0m${PIDS[*]}\n"
 # wait for the processes to get over
 status=0
-count=1
-for pid in $PIDS
+for k in "${!PIDS[@]}"
 do
+    pid=${PIDS[$k]}
     wait $pid
-    if [ $? -eq 0 ]; then
-        printf "\e[32m[runnodes.sh] \e[0mNODE_$count SUCCESS - Job $pid exited with a status of $?\n"
+    code=$?
+    if [ $code -eq 0 ]; then
+        printf "\e[32m[runnodes.sh] \e[0mNODE_${NODES[$k]} SUCCESS - Job $pid exited with a status of $code\n"
     else
-        printf "\e[32m[runnodes.sh] \e[0mNODE_$count FAILED - Job $pid exited with a status of $?\n"
+        printf "\e[32m[runnodes.sh] \e[0mNODE_${NODES[$k]} FAILED - Job $pid exited with a status of $code\n"
         status=1
     fi
-    count=$((count+1))
 done
 exit $status
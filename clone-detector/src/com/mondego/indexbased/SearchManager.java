@@ -332,7 +332,13 @@ public class SearchManager {
             }
         } else if (SearchManager.ACTION.equalsIgnoreCase(ACTION_INIT)) {
             WordFrequencyStore wfs = new WordFrequencyStore();
-            wfs.populateLocalWordFreqMap();
+            String wfmFile = getProperty("GTPM_WFM_FILE");
+            if (wfmFile != null && wfmFile.trim().length() > 0) {
+                // token frequencies already counted by the tokenizers
+                wfs.importWfmFile(SearchManager.ROOT_DIR + wfmFile.trim());
+            } else {
+                wfs.populateLocalWordFreqMap();
+            }
         }
         long estimatedTime = System.nanoTime() - start_time;
         System.out.println("Total run Time: " + (estimatedTime / 1000) + " micors");
@@ -2,7 +2,9 @@ package com.mondego.indexbased;
 
 import java.io.BufferedReader;
 import java.io.File;
+import java.io.FileInputStream;
 import java.io.IOException;
+import java.io.InputStreamReader;
 import java.io.Writer;
 import java.text.ParseException;
 import java.util.List;
@@ -122,6 +124,49 @@ public class WordFrequencyStore implements ITokensFileProcessor {
         }
     }
 
+    /**
+     * Populates the global word frequency index from a token:frequency file,
+     * like the gtpm.wfm written by the tokenizers, instead of reading the
+     * dataset. Importing the same file again gives the same index.
+     * 
+     * @param wfmFilePath
+     * @throws IOException
+     */
+    public void importWfmFile(String wfmFilePath) throws IOException {
+        File wfmFile = new File(wfmFilePath);
+        if (!wfmFile.isFile()) {
+            logger.error("File: " + wfmFile.getAbsolutePath() + " not found. Exiting now");
+            System.exit(1);
+        }
+        logger.info("Importing WFM file: " + wfmFile.getAbsolutePath());
+        this.prepareIndex();
+        BufferedReader br = new BufferedReader(new InputStreamReader(new FileInputStream(wfmFile), "UTF-8"));
+        int count = 0;
+        try {
+            String line;
+            while ((line = br.readLine()) != null) {
+                int separator = line.lastIndexOf(':');
+                if (separator <= 0) {
+                    continue;
+                }
+                wfmIndexer.indexWFMEntry(line.substring(0, separator), Long.parseLong(line.substring(separator + 1)));
+                if (++count % 1000000 == 0)
+                    logger.info("...imported " + count);
+            }
+        } finally {
+            br.close();
+        }
+        try {
+            this.wfmIndexWriter.forceMerge(1);
+            this.wfmIndexWriter.commit();
+        } catch (Exception e) {
+            logger.error(SearchManager.NODE_PREFIX + ", exception on commit", e);
+            e.printStackTrace();
+        }
+        logger.info("*** IMPORT END *** " + count);
+        shutdown();
+    }
+
     public void prepareIndex() throws IOException {
         File globalWFMDIr = new File(Util.GTPM_INDEX_DIR);
         if (!globalWFMDIr.exists()) {
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 
-import sys
+import heapq
 import math
+import os
+import sys
 
 
 class Spliter():
@@ -55,6 +57,36 @@ class Spliter():
         return res + 1
 
 
+class IncrementalSpliter():
+    """Split of Spliter for lines arriving in batches, without knowing the
+    total number of lines: split i gets 1 + 0.5 * (i - 1) shares of the
+    lines, every line going to the split furthest behind its share. The
+    counts differ from the ones of Spliter only by its rounding. Used by
+    run.py to split the queries while the tokenizer is still writing them.
+    """
+
+    def __init__(self, split_count, output_dir="."):
+        self.outfiles = [open(os.path.join(output_dir, "query_{part}.file".format(part=part)), 'w', encoding="utf-8")
+                         for part in range(1, split_count + 1)]
+        self.weights = [1 + 0.5 * part for part in range(split_count)]
+        # (share the split would have with one more line, split index)
+        self.heap = [(1 / weight, part) for part, weight in enumerate(self.weights)]
+        heapq.heapify(self.heap)
+        self.counts = [0] * split_count
+
+    def write(self, rows):
+        heap = self.heap
+        for row in rows:
+            _, part = heap[0]
+            self.outfiles[part].write(row)
+            self.counts[part] += 1
+            heapq.heapreplace(heap, ((self.counts[part] + 1) / self.weights[part], part))
+
+    def close(self):
+        for outfile in self.outfiles:
+            outfile.close()
+
+
 if __name__ == '__main__':
     input_file = sys.argv[1]
     split_count = int(sys.argv[2])
@@ -11,6 +11,9 @@ import re
 import json
 import zipfile
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "tokenizers"))
+from file_level.block_ids import decode_block_id  # noqa: E402
+
 
 def get_file_name(file_path):
     """Get file name from path of archive.
@@ -19,9 +22,9 @@ def get_file_name(file_path):
     file_path -- path to file in archive
     """
     full_path = file_path.strip("\"").replace("--", "/")
-    result = re.sub(r"\.zip/[a-zA-Z0-9-.]+-master/", "/tree/master/", full_path)
-    result = re.sub(r"/.*/([^/]+/[^/]+/tree/master/)", r"\1", result)
-    return result
+    # The archives unpack to <repo>-<ref>/, the ref being the branch or commit
+    # GitHub named the archive of the default branch after
+    return re.sub(r"^(?:.*/)?([^/]+)/([^/]+)\.zip/\2-([^/]+)/", r"\1/\2/tree/\3/", full_path)
 
 
 def get_file_lines(filename):
@@ -155,8 +158,9 @@ def get_stats_info(stats_files_path, blocks_mode):
                     stats = parse_file_line(line_parts[1:])
                 elif code_type == "b":
                     stats = parse_block_line(line_parts[1:])
-                    stats["relative_id"] = code_id[:5]
-                    stats["file_id"] = code_id[5:]
+                    file_id, block_index = decode_block_id(code_id)
+                    stats["block_index"] = block_index
+                    stats["file_id"] = str(file_id)
             else:
                 code_id = line_parts[1]
                 stats = parse_file_line(line_parts)
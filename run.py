@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+"""Whole SourcererCC pipeline, from urls.txt to clone pairs, in one command.
+
+The stages make a DAG, each stage running in a thread of its own and
+passing its output to the next ones through bounded queues, so a stage
+starts on the first results of its inputs instead of waiting for them to
+finish:
+
+    fetch ──> tokenize ──> queries ──> detect ──> collect
+                  └──────────────────────────────────┘
+
+- fetch downloads the archive of every repository of urls.txt to
+  projects/ and hands it on as soon as it is downloaded;
+- tokenize appends the archives to the project list of the tokenizer and
+  runs it on every --batch new archives. The tokenizer resumes from its
+  manifest, so every run only tokenizes the new projects. While it runs,
+  the progress files of the tokenizer (see tokenizers/file_level/outputs.py)
+  are polled and every range of tokens written by a finished project is
+  handed on;
+- queries appends these ranges to the dataset of the clone detector and
+  splits them into the query files of the --nodes search nodes while the
+  tokenizer is still running;
+- detect runs the init, index and search steps of clone-detector/controller.py
+  on the dataset and the queries, once they are complete;
+- collect gathers the clone pairs of all the nodes in results.pairs and
+  writes them with the code of the clones to results.json (see
+  prettify_results.py).
+
+Every stage records its state in pipeline/<stage>.json in the work folder.
+A stage that finished is skipped when the pipeline is run again, unless one
+of its inputs runs again, and the items it handed on are replayed to the
+stages after it. The log of the commands of a stage is pipeline/<stage>.log.
+At the end the timings of every stage are printed: when it started, how long
+it ran and how long it waited for its inputs and for the stages after it.
+
+Usage: ./run.py [--mode files|blocks] [--nodes N] [--workdir DIR] [--from STAGE]
+"""
+
+import collections
+import glob
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import urllib.request
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CLONE_DETECTOR = os.path.join(ROOT, "clone-detector")
+TOKENIZERS = os.path.join(ROOT, "tokenizers")
+sys.path.insert(0, CLONE_DETECTOR)
+import prettify_results  # noqa: E402
+from unevensplit import IncrementalSpliter  # noqa: E402
+
+STATE_FOLDER = "pipeline"
+PROJECTS_FOLDER = "projects"
+SPLIT_FOLDER = "queries"
+# Seconds between two reads of the tokenizer progress files
+POLL_INTERVAL = 1.0
+# Returned by Channel.get when the producers are done, or on timeout
+END = object()
+EMPTY = object()
+# Stages print from their own threads
+PRINT_LOCK = threading.Lock()
+
+
+def log(message):
+    with PRINT_LOCK:
+        print(message, flush=True)
+
+
+class PipelineError(Exception):
+    pass
+
+
+class UpstreamFailed(PipelineError):
+    pass
+
+
+class Channel(object):
+    """Bounded queue from the producer stages to one consumer stage."""
+
+    def __init__(self, maxsize, producers):
+        self.items = collections.deque()
+        self.maxsize = maxsize
+        self.open_producers = producers
+        self.failed = False
+        # Set by a consumer that failed, its producers go on without it
+        self.abandoned = False
+        self.condition = threading.Condition()
+
+    def put(self, item):
+        with self.condition:
+            while len(self.items) >= self.maxsize and not self.abandoned:
+                self.condition.wait()
+            if not self.abandoned:
+                self.items.append(item)
+                self.condition.notify_all()
+
+    def get(self, timeout=None):
+        with self.condition:
+            if not self.items and self.open_producers > 0 and not self.failed:
+                self.condition.wait_for(lambda: self.items or self.open_producers == 0 or self.failed, timeout)
+            if self.failed:
+                raise UpstreamFailed("a stage before this one failed")
+            if self.items:
+                item = self.items.popleft()
+                self.condition.notify_all()
+                return item
+            return END if self.open_producers == 0 else EMPTY
+
+    def close(self, failed=False):
+        with self.condition:
+            self.open_producers -= 1
+            self.failed = self.failed or failed
+            self.condition.notify_all()
+
+    def abandon(self):
+        with self.condition:
+            self.abandoned = True
+            self.items.clear()
+            self.condition.notify_all()
+
+
+class StageContext(object):
+    """What a stage function sees of the pipeline: its inputs, its outputs,
+    the options and whether it resumes an interrupted run of the stage."""
+
+    def __init__(self, name, inbox, outboxes, options, resume):
+        self.name = name
+        self.inbox = inbox
+        self.outboxes = outboxes
+        self.options = options
+        self.resume = resume
+        self.emitted = []
+        self.items_in = 0
+        self.wait_input = 0.0
+        self.wait_output = 0.0
+
+    def get(self, timeout=None):
+        """Next input item, END once the inputs are done, EMPTY if none came
+        within timeout seconds."""
+        if self.inbox is None:
+            return END
+        start = time.perf_counter()
+        item = self.inbox.get(timeout)
+        if timeout is None:
+            self.wait_input += time.perf_counter() - start
+        if item is not END and item is not EMPTY:
+            self.items_in += 1
+        return item
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            if item is END:
+                return
+            yield item
+
+    def wait_inputs(self):
+        """Wait for the stages before this one to finish."""
+        for _ in self:
+            pass
+
+    def emit(self, item):
+        self.emitted.append(item)
+        start = time.perf_counter()
+        for outbox in self.outboxes:
+            outbox.put(item)
+        self.wait_output += time.perf_counter() - start
+
+    def log_path(self):
+        return os.path.join(self.options.workdir, STATE_FOLDER, "{}.log".format(self.name))
+
+    def run_command(self, cmd, cwd):
+        """Run cmd with its output appended to the log of the stage."""
+        with open(self.log_path(), "a", encoding="utf-8") as log_file:
+            process = subprocess.Popen(cmd, cwd=cwd, stdout=log_file, stderr=subprocess.STDOUT)
+        return process
+
+
+class Stage(object):
+    def __init__(self, name, function, inputs=()):
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs)
+
+
+class Pipeline(object):
+    def __init__(self, stages, options):
+        self.stages = stages
+        self.options = options
+        self.state_folder = os.path.join(options.workdir, STATE_FOLDER)
+        self.start = None
+        self.results = {}
+
+    def checkpoint_path(self, stage):
+        return os.path.join(self.state_folder, "{}.json".format(stage.name))
+
+    def load_checkpoint(self, stage):
+        try:
+            with open(self.checkpoint_path(stage), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"status": "new"}
+
+    def save_checkpoint(self, stage, checkpoint):
+        path = self.checkpoint_path(stage)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(path + ".tmp", path)
+
+    def plan(self):
+        """{stage name: checkpoint} of the stages to run. A finished stage
+        runs again if one of its inputs does, or if --from asks for it."""
+        to_run = {}
+        forced = False
+        for stage in self.stages:
+            forced = forced or stage.name == self.options.from_stage
+            checkpoint = self.load_checkpoint(stage)
+            if forced or checkpoint["status"] != "done" or any(name in to_run for name in stage.inputs):
+                to_run[stage.name] = checkpoint
+        return to_run
+
+    def run(self):
+        os.makedirs(self.state_folder, exist_ok=True)
+        to_run = self.plan()
+        channels = {}
+        for stage in self.stages:
+            if stage.inputs:
+                channels[stage.name] = Channel(self.options.queue_size, len(stage.inputs))
+        self.start = time.perf_counter()
+        threads = []
+        for stage in self.stages:
+            inbox = channels.get(stage.name)
+            outboxes = [channels[other.name] for other in self.stages if stage.name in other.inputs]
+            if stage.name in to_run:
+                checkpoint = to_run[stage.name]
+                # Interrupted, and its inputs are the same as last time
+                resume = checkpoint["status"] == "running" and not any(name in to_run for name in stage.inputs)
+                target = self.run_stage
+                args = (stage, StageContext(stage.name, inbox, outboxes, self.options, resume))
+            else:
+                target = self.replay_stage
+                args = (stage, inbox, outboxes)
+            thread = threading.Thread(target=target, args=args, name=stage.name)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        self.report()
+        return all(result["status"] in ("done", "skipped") for result in self.results.values())
+
+    def run_stage(self, stage, context):
+        log("[INFO] Stage {} {}".format(stage.name, "resuming" if context.resume else "starting"))
+        self.save_checkpoint(stage, {"status": "running"})
+        start = time.perf_counter()
+        status = "failed"
+        try:
+            stage.function(context)
+            status = "done"
+        except UpstreamFailed:
+            status = "cancelled"
+        except Exception:
+            log("[ERROR] Stage {} failed:\n{}".format(stage.name, traceback.format_exc()))
+        finally:
+            if context.inbox is not None and status != "done":
+                context.inbox.abandon()
+            for outbox in context.outboxes:
+                outbox.close(failed=status != "done")
+        timing = {
+            "start": start - self.start,
+            "wall": time.perf_counter() - start,
+            "wait_input": context.wait_input,
+            "wait_output": context.wait_output,
+            "items_in": context.items_in,
+            "items_out": len(context.emitted),
+        }
+        self.results[stage.name] = dict(timing, status=status)
+        if status == "done":
+            self.save_checkpoint(stage, {"status": "done", "items": context.emitted, "timing": timing})
+        log("[INFO] Stage {} {} in {:.1f} s".format(stage.name, status, timing["wall"]))
+
+    def replay_stage(self, stage, inbox, outboxes):
+        """Hand on again the items of a stage finished in an earlier run."""
+        if inbox is not None:
+            for _ in iter(inbox.get, END):
+                pass
+        items = self.load_checkpoint(stage)["items"]
+        for item in items:
+            for outbox in outboxes:
+                outbox.put(item)
+        for outbox in outboxes:
+            outbox.close()
+        log("[INFO] Stage {} already done, skipped".format(stage.name))
+        self.results[stage.name] = {"status": "skipped", "items_out": len(items)}
+
+    def report(self):
+        print("Stage timings, s:")
+        print("{:<10} {:>10} {:>8} {:>8} {:>10} {:>11} {:>9} {:>10}".format(
+            "stage", "status", "start", "wall", "wait_input", "wait_output", "items_in", "items_out"))
+        for stage in self.stages:
+            result = self.results.get(stage.name, {"status": "?"})
+            if "wall" not in result:
+                print("{:<10} {:>10}".format(stage.name, result["status"]))
+                continue
+            print("{:<10} {:>10} {:>8.1f} {:>8.1f} {:>10.1f} {:>11.1f} {:>9} {:>10}".format(
+                stage.name, result["status"], result["start"], result["wall"], result["wait_input"], result["wait_output"],
+                result["items_in"], result["items_out"]))
+
+
+def tokenizer_config(mode):
+    config = ConfigParser()
+    config.read(os.path.join(TOKENIZERS, "{}_level".format(mode.rstrip("s")), "config.ini"))
+    return config
+
+
+def archive_name(url):
+    """owner--repo.zip, the layout prettify_results.get_file_name expects."""
+    parts = url.rstrip("/").split("/")
+    return "{}--{}.zip".format(parts[-2], parts[-1][:-4] if parts[-1].endswith(".git") else parts[-1])
+
+
+def download(url, folder):
+    path = os.path.join(folder, archive_name(url))
+    if os.path.exists(path):
+        return path
+    archive_url = url.rstrip("/")
+    if archive_url.endswith(".git"):
+        archive_url = archive_url[:-4]
+    # HEAD is the default branch, whatever its name
+    archive_url += "/archive/HEAD.zip"
+    try:
+        with urllib.request.urlopen(archive_url) as response, open(path + ".part", "wb") as f:
+            while True:
+                data = response.read(1 << 20)
+                if not data:
+                    break
+                f.write(data)
+    except OSError as e:
+        log("[WARNING] Could not download {}: {}".format(archive_url, e))
+        return None
+    os.replace(path + ".part", path)
+    return path
+
+
+def fetch(ctx):
+    folder = os.path.join(ctx.options.workdir, PROJECTS_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+    with open(ctx.options.urls, "r", encoding="utf-8") as f:
+        urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    # In the order of urls.txt, the project ids of the tokenizer follow it
+    with ThreadPoolExecutor(ctx.options.fetch_threads) as pool:
+        for path in pool.map(lambda url: download(url, folder), urls):
+            if path is not None:
+                ctx.emit(path)
+
+
+def emit_progress(ctx, bookkeeping_folder, offsets):
+    """Hand on the ranges of tokens written by finished projects since the
+    last call, as (path, start, end)."""
+    for progress_path in sorted(glob.glob(os.path.join(bookkeeping_folder, "progress-*.json"))):
+        with open(progress_path, "r", encoding="utf-8") as f:
+            stream = json.load(f)["streams"].get(ctx.options.stream)
+        if stream is None:
+            continue
+        ends = [(path, None) for path in stream["finished"]]
+        if stream["current"] is not None:
+            ends.append((stream["current"], stream["committed_size"]))
+        for path, end in ends:
+            path = os.path.join(ctx.options.workdir, path)
+            if end is None:
+                end = os.path.getsize(path)
+            start = offsets.get(path, 0)
+            if end > start:
+                ctx.emit((path, start, end))
+                offsets[path] = end
+
+
+def tokenize(ctx):
+    config = tokenizer_config(ctx.options.mode)
+    if config.get("Main", "OUTPUT_FORMAT", fallback="text") != "text":
+        raise PipelineError("the clone detector reads text tokens, set OUTPUT_FORMAT = text in the tokenizer config.ini")
+    workdir = ctx.options.workdir
+    driver = os.path.join(TOKENIZERS, "{}_level_tokenizer.py".format(ctx.options.mode.rstrip("s")))
+    bookkeeping_folder = os.path.join(workdir, config.get("Folders/Files", "PATH_bookkeeping_proj_folder"))
+    list_path = os.path.join(workdir, config.get("Main", "FILE_projects_list"))
+    # Only ever appended to: the project ids are the line numbers and the
+    # tokenizer resumes with the ids it gave before
+    listed = []
+    if os.path.exists(list_path):
+        with open(list_path, "r", encoding="utf-8") as f:
+            listed = [line for line in f.read().split("\n") if line]
+    known = set(listed)
+    pending = []
+    offsets = {}
+    ended = False
+    ran = False
+    while True:
+        while not ended and len(pending) < ctx.options.batch:
+            item = ctx.get()
+            if item is END:
+                ended = True
+            elif item not in known:
+                known.add(item)
+                pending.append(item)
+        if pending:
+            with open(list_path, "a", encoding="utf-8") as f:
+                f.write("".join(path + "\n" for path in pending))
+            listed.extend(pending)
+            pending = []
+        elif ran or not listed:
+            return
+        log("[INFO] Tokenizing {} projects".format(len(listed)))
+        process = ctx.run_command([sys.executable, driver], workdir)
+        while process.poll() is None:
+            emit_progress(ctx, bookkeeping_folder, offsets)
+            # The archives fetched meanwhile make the next batch
+            if ended:
+                time.sleep(POLL_INTERVAL)
+                continue
+            item = ctx.get(POLL_INTERVAL)
+            if item is END:
+                ended = True
+            elif item is not EMPTY and item not in known:
+                known.add(item)
+                pending.append(item)
+        emit_progress(ctx, bookkeeping_folder, offsets)
+        if process.returncode != 0:
+            raise PipelineError("the tokenizer exited with {}, see {}".format(process.returncode, ctx.log_path()))
+        ran = True
+
+
+def prepare_queries(ctx):
+    dataset_folder = os.path.join(CLONE_DETECTOR, "input", "dataset")
+    split_folder = os.path.join(ctx.options.workdir, SPLIT_FOLDER)
+    os.makedirs(dataset_folder, exist_ok=True)
+    os.makedirs(split_folder, exist_ok=True)
+    # Always from the start, the ranges of an interrupted run are replayed
+    spliter = IncrementalSpliter(ctx.options.nodes, split_folder)
+    try:
+        with open(os.path.join(dataset_folder, "blocks.file"), "w", encoding="utf-8") as dataset:
+            for path, start, end in ctx:
+                with open(path, "rb") as f:
+                    f.seek(start)
+                    text = f.read(end - start).decode("utf-8")
+                dataset.write(text)
+                spliter.write(text.splitlines(keepends=True))
+    finally:
+        spliter.close()
+    log("[INFO] Queries split: {}".format(", ".join(map(str, spliter.counts))))
+
+
+def detect(ctx):
+    ctx.wait_inputs()
+    state_file = os.path.join(CLONE_DETECTOR, "scriptinator_metadata.scc")
+    if not ctx.resume and os.path.exists(state_file):
+        # New dataset, the state of the last search doesn't apply
+        os.remove(state_file)
+    split_folder = os.path.join(ctx.options.workdir, SPLIT_FOLDER)
+    process = ctx.run_command([sys.executable, os.path.join(CLONE_DETECTOR, "controller.py"), str(ctx.options.nodes),
+                               "--split-dir", split_folder], CLONE_DETECTOR)
+    if process.wait() != 0:
+        raise PipelineError("controller.py exited with {}, see {}".format(process.returncode, ctx.log_path()))
+
+
+def collect(ctx):
+    ctx.wait_inputs()
+    pairs_path = os.path.join(ctx.options.workdir, "results.pairs")
+    with open(pairs_path, "w", encoding="utf-8") as pairs:
+        for node in range(1, ctx.options.nodes + 1):
+            for path in sorted(glob.glob(os.path.join(CLONE_DETECTOR, "NODE_{}".format(node), "output*", "query_*"))):
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        pairs.write(line)
+    config = tokenizer_config(ctx.options.mode)
+    stats_folder = os.path.join(ctx.options.workdir, config.get("Folders/Files", "PATH_stats_file_folder"))
+    results = prettify_results.print_results(pairs_path, stats_folder, ctx.options.mode == "blocks")
+    with open(os.path.join(ctx.options.workdir, "results.json"), "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4)
+    log("[INFO] {} clone pairs, see results.json".format(sum(len(clones["clones"]) for clones in results.values())))
+
+
+STAGES = [
+    Stage("fetch", fetch),
+    Stage("tokenize", tokenize, ["fetch"]),
+    Stage("queries", prepare_queries, ["tokenize"]),
+    Stage("detect", detect, ["queries"]),
+    Stage("collect", collect, ["detect", "tokenize"]),
+]
+
+
+def main():
+    parser = ArgumentParser(description="Find the clones in the repositories of urls.txt")
+    parser.add_argument("--urls", default=os.path.join(ROOT, "urls.txt"), help="repository urls, one per line")
+    parser.add_argument("--workdir", default=".", help="folder of the archives, tokenizer output and results")
+    parser.add_argument("--mode", choices=("files", "blocks"), default="files", help="tokenizer granularity")
+    parser.add_argument("--stream", default="tokens", help="tokens output to search, tokens-<name> for a language profile")
+    parser.add_argument("--nodes", type=int, default=2, help="number of search nodes")
+    parser.add_argument("--batch", type=int, default=20, help="new archives that start a tokenizer run")
+    parser.add_argument("--fetch-threads", type=int, default=4, help="parallel downloads")
+    parser.add_argument("--queue-size", type=int, default=64, help="items buffered between two stages")
+    parser.add_argument("--from", dest="from_stage", choices=[stage.name for stage in STAGES],
+                        help="run this stage and the ones after it again even if they are done")
+    options = parser.parse_args()
+    options.workdir = os.path.abspath(options.workdir)
+    options.urls = os.path.abspath(options.urls)
+    if not Pipeline(STAGES, options).run():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
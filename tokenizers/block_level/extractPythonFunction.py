@@ -0,0 +1,7 @@
+from .extract_python_functions import get_functions
+
+
+def getFunctions(filestring, file_path):
+    """Kept for compatibility, see extract_python_functions.get_functions."""
+    block_linenos, blocks, _ = get_functions(filestring, file_path)
+    return block_linenos, blocks
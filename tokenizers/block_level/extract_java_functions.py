@@ -0,0 +1,154 @@
+import bisect
+import importlib
+import itertools
+
+from . import fast_java_functions
+
+# Imported by getFunctions on first use, the fast extractor doesn't need it
+javalang = None
+
+
+def load_javalang():
+    global javalang
+    if javalang is None:
+        javalang = importlib.import_module('javalang')
+    return javalang
+
+
+def get_functions(filestring, file_path, separators, comment_inline_pattern, extractor='javalang'):
+    """Methods of a Java file with the extractor chosen in config.ini:
+    javalang parses the whole file, fast scans its tokens and braces (see
+    fast_java_functions.py), auto scans and parses only the files the
+    scanner finds ambiguous."""
+    if extractor != 'javalang':
+        try:
+            return fast_java_functions.get_functions(filestring, file_path)
+        except fast_java_functions.AmbiguousSource as e:
+            if extractor == 'fast':
+                print(f"[WARNING] File {file_path} can't be scanned: {e}")
+                return None, None, []
+            print(f"[INFO] File {file_path} is parsed with javalang: {e}")
+    # Notice workaround with replacing. It is needed because javalang counts things like String[]::new as syntax errors
+    return getFunctions(filestring.replace("[]::", "::"), file_path, separators, comment_inline_pattern)
+
+
+def getFunctions(filestring, file_path, separators, comment_inline_pattern):
+    method_string = []
+    method_pos = []
+    method_name = []
+
+    tree = None
+    load_javalang()
+
+    try:
+        # Tokenized once, for the parser and for the end of the methods
+        tokens = list(javalang.tokenizer.tokenize(filestring))
+        tree = javalang.parser.Parser(tokens).parse()
+        package = tree.package
+        if package is None:
+            package = 'JHawkDefaultPackage'
+        else:
+            package = package.name
+    except:
+        print(f"[WARNING] File {file_path} contains syntax error")
+        return None, None, []
+
+    file_string_split = filestring.split('\n')
+    positions = [token.position for token in tokens]
+    closing = brace_table(tokens)
+    nodes = itertools.chain(tree.filter(javalang.tree.ConstructorDeclaration), \
+        tree.filter(javalang.tree.MethodDeclaration))
+    # Classes are numbered in source order, as by the fast extractor
+    namer = fast_java_functions.ClassNamer()
+    for _, node in tree:
+        name = class_name(node)
+        if name is not None:
+            namer.name(id(node), name)
+
+    try:
+        for path, node in nodes:
+            # Outermost class first: .Top$Inner$AnonymousType
+            name = ''
+            for var in path:
+                var_name = class_name(var)
+                if var_name is not None:
+                    name += ('$' if name else '.') + namer.name(id(var), var_name)
+            name += '.' + node.name
+            args = []
+            for t in node.parameters:
+                args.append(type_name(t.type) + "[]" * len(t.type.dimensions or []))
+            args = ",".join(args)
+
+            fqn = "%s%s(%s)" % (package, name, args)
+
+            init_line = node.position[0]
+            end_line = method_end_line(tokens, closing, bisect.bisect_left(positions, node.position))
+            method_body = '\n'.join(file_string_split[init_line - 1:end_line])
+
+            method_pos.append((init_line, end_line))
+            method_string.append(method_body)
+
+            method_name.append(fqn)
+    except RecursionError:
+        print(f"[WARNING] Stack recursion limit exceeded on {method_name}")
+        return None, None, method_name
+
+    if len(method_pos) != len(method_string):
+        print(f"[WARNING] File {file_path} contains syntax error")
+        return None, None, method_name
+    else:
+        return method_pos, method_string, method_name
+
+
+def brace_table(tokens):
+    """{index of a `{` token: index of its matching `}`}, in one pass."""
+    closing = {}
+    stack = []
+    for i, token in enumerate(tokens):
+        if isinstance(token, javalang.tokenizer.Separator):
+            if token.value == '{':
+                stack.append(i)
+            elif token.value == '}' and stack:
+                closing[stack.pop()] = i
+    return closing
+
+
+def method_end_line(tokens, closing, start):
+    """Line of the `}` closing the body of the method declared from token
+    start, or of its `;` if it has no body."""
+    depth = 0
+    for i in range(start, len(tokens)):
+        token = tokens[i]
+        if not isinstance(token, javalang.tokenizer.Separator):
+            continue
+        if token.value == '(':
+            depth += 1
+        elif token.value == ')':
+            depth -= 1
+        elif depth == 0 and token.value == ';':
+            return token.position[0]
+        elif depth == 0 and token.value == '{':
+            return tokens[closing[i]].position[0] if i in closing else tokens[-1].position[0]
+    return tokens[-1].position[0]
+
+
+def type_name(reference_type):
+    """Dotted name of a type, java.util.List for java.util.List<String>."""
+    names = [reference_type.name]
+    while getattr(reference_type, 'sub_type', None) is not None:
+        reference_type = reference_type.sub_type
+        names.append(reference_type.name)
+    return '.'.join(names)
+
+
+def class_name(node):
+    """Name of the class declared by node, None if it's not a class: the
+    type of anonymous classes, the constant of enum constant bodies."""
+    if isinstance(node, (javalang.tree.ClassDeclaration, javalang.tree.InterfaceDeclaration,
+                         javalang.tree.EnumDeclaration, javalang.tree.AnnotationDeclaration)):
+        return node.name
+    if isinstance(node, javalang.tree.ClassCreator) and node.body is not None:
+        return type_name(node.type).split('.')[-1]
+    if isinstance(node, javalang.tree.EnumConstantDeclaration) and node.body is not None:
+        return node.name
+    return None
@@ -0,0 +1,41 @@
+import ast
+
+
+def function_nodes(tree):
+    """(node, qualname) of every function and method of the tree, nested
+    ones and async ones included, in source order. Qualnames follow
+    __qualname__: Class.method, function.<locals>.inner."""
+    stack = [(tree, '')]
+    while stack:
+        node, prefix = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            yield node, prefix + node.name
+            prefix += node.name + '.<locals>.'
+        elif isinstance(node, ast.ClassDef):
+            prefix += node.name + '.'
+        # Pushed in reverse so the first child is visited first
+        stack.extend((child, prefix) for child in reversed(list(ast.iter_child_nodes(node))))
+
+
+def get_functions(file_string, file_path):
+    """Blocks of a Python file: ([(start_line, end_line)], [block string],
+    [qualname]). A block starts at its first decorator and ends at the last
+    line of its body; the file is parsed once and every block is a slice of
+    the same list of lines."""
+    try:
+        tree = ast.parse(file_string)
+    except (SyntaxError, ValueError, RecursionError, MemoryError) as e:
+        print("[WARNING] File {} cannot be parsed\n{}".format(file_path, e))
+        return None, None, []
+
+    lines = file_string.split('\n')
+    block_linenos = []
+    blocks = []
+    names = []
+    for node, qualname in function_nodes(tree):
+        start_line = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+        end_line = node.end_lineno
+        block_linenos.append((start_line, end_line))
+        blocks.append('\n'.join(lines[start_line - 1:end_line]))
+        names.append(qualname)
+    return block_linenos, blocks, names
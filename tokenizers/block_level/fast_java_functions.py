@@ -0,0 +1,333 @@
+"""Java method extraction by scanning tokens and braces, without an AST.
+
+The source is split into tokens once (comments, strings, text blocks and char
+literals are skipped as a whole), then a single pass keeps a stack of the
+open braces. Every `{` is classified from the tokens of the declaration in
+front of it as a class-like body (class, interface, enum, record, annotation
+type, anonymous class or enum constant body), a method or constructor body,
+or any other block. Methods end at their matching `}`; body-less methods
+(abstract, interface and annotation members) at their `;`.
+
+Blocks start at the first token after the annotations and modifiers of the
+declaration, like javalang positions. FQNs are built the same way as by
+extract_java_functions: `package.Outer$Inner.method(Type1,Type2[])`, with
+`$Type` for anonymous classes and a `_<n>` suffix for class names repeated
+in the file.
+
+Anything the scanner can't classify with confidence raises AmbiguousSource,
+so the caller can fall back to javalang.
+"""
+
+import re
+
+DEFAULT_PACKAGE = 'JHawkDefaultPackage'
+MODIFIERS = {'public', 'protected', 'private', 'static', 'final', 'abstract', 'native', 'synchronized',
+             'transient', 'volatile', 'strictfp', 'default', 'sealed', 'non-sealed'}
+CLASS_KEYWORDS = {'class', 'interface', 'enum', 'record'}
+
+TOKEN_RE = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<literal>"""(?:\\.|[^\\])*?"""|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])+')
+  | (?P<word>non-sealed\b|[^\W\d][\w$]*|\$[\w$]*)
+  | (?P<number>\.?\d(?:[eEpP][+-]|[\w.])*)
+  | (?P<punct>\.\.\.|::|->|[{}()\[\];,.<>=?:!~&|^%*/+\-@])
+''', re.DOTALL | re.VERBOSE)
+
+
+class AmbiguousSource(Exception):
+    pass
+
+
+class ClassNamer(object):
+    """Names of the classes of one file. A class named like an earlier one
+    of the file gets a `_<n>` suffix, n counting from 0 for the second one.
+    Classes are identified by a key unique in the file: id() of their node,
+    or the index of their first token."""
+
+    def __init__(self):
+        # key -> name with suffix
+        self.names = {}
+        # name -> classes with that name so far
+        self.counts = {}
+
+    def name(self, key, name):
+        named = self.names.get(key)
+        if named is None:
+            count = self.counts.get(name, 0)
+            self.counts[name] = count + 1
+            named = self.names[key] = name if count == 0 else '{}_{}'.format(name, count - 1)
+        return named
+
+
+def tokenize(file_string):
+    """[(text, line)] of the significant tokens."""
+    tokens = []
+    line = 1
+    pos = 0
+    end = len(file_string)
+    match = TOKEN_RE.match
+    while pos < end:
+        m = match(file_string, pos)
+        if m is None:
+            raise AmbiguousSource('unexpected {!r} at line {}'.format(file_string[pos], line))
+        text = m.group()
+        kind = m.lastgroup
+        if kind != 'space' and kind != 'comment':
+            tokens.append((text, line))
+        if kind != 'word' and kind != 'punct':
+            line += text.count('\n')
+        pos = m.end()
+    return tokens
+
+
+def matching(texts, start, open_text, close_text):
+    """Index of the token closing the one at start, scanning forward."""
+    depth = 0
+    for i in range(start, len(texts)):
+        if texts[i] == open_text:
+            depth += 1
+        elif texts[i] == close_text:
+            depth -= 1
+            if depth == 0:
+                return i
+    raise AmbiguousSource('unbalanced {}'.format(open_text))
+
+
+def skip_modifiers(texts, start, end):
+    """Index of the first token in [start, end) after the annotations and
+    modifiers."""
+    i = start
+    while i < end:
+        if texts[i] in MODIFIERS:
+            i += 1
+        elif texts[i] == '@' and i + 1 < end and texts[i + 1] != 'interface':
+            i += 2
+            while i + 1 < end and texts[i] == '.':
+                i += 2
+            if i < end and texts[i] == '(':
+                i = matching(texts, i, '(', ')') + 1
+        else:
+            break
+    return i
+
+
+def strip_type_arguments(texts):
+    result = []
+    depth = 0
+    for text in texts:
+        if text == '<':
+            depth += 1
+        elif text == '>':
+            depth -= 1
+        elif depth == 0:
+            result.append(text)
+    return result
+
+
+def parameter_types(texts):
+    """Types of the parameter list tokens, as in `int,String[],List`."""
+    params = []
+    current = []
+    depth = 0
+    for text in texts:
+        if text in ('(', '<'):
+            depth += 1
+        elif text in (')', '>'):
+            depth -= 1
+        if text == ',' and depth == 0:
+            params.append(current)
+            current = []
+        else:
+            current.append(text)
+    if current:
+        params.append(current)
+    types = []
+    for param in params:
+        start = skip_modifiers(param, 0, len(param))
+        param = strip_type_arguments(param[start:])
+        # The name is the last word, dimensions may follow it
+        dims = ''
+        while len(param) >= 2 and param[-2:] == ['[', ']']:
+            dims += '[]'
+            param = param[:-2]
+        type_tokens = [text for text in param[:-1] if text != '...']
+        types.append(''.join(type_tokens) + dims)
+    return ','.join(types)
+
+
+class Scope(object):
+    __slots__ = ('kind', 'name', 'class_name', 'header', 'start_line', 'start_index', 'enum_constants')
+
+    def __init__(self, kind, name='', class_name='', start_line=0, start_index=0):
+        self.kind = kind
+        # FQN prefix of class-like scopes, FQN of method scopes
+        self.name = name
+        self.class_name = class_name
+        # Index of the first token of the current declaration
+        self.header = 0
+        self.start_line = start_line
+        self.start_index = start_index
+        self.enum_constants = kind == 'enum'
+
+
+def get_functions(file_string, file_path):
+    """([(start_line, end_line)], [method string], [FQN]) of a Java file."""
+    tokens = tokenize(file_string)
+    texts = [text for text, _ in tokens]
+    lines = file_string.split('\n')
+
+    package = DEFAULT_PACKAGE
+    i = skip_modifiers(texts, 0, len(texts))
+    if i < len(texts) and texts[i] == 'package':
+        end = texts.index(';', i) if ';' in texts[i:] else len(texts)
+        package = ''.join(texts[i + 1:end])
+
+    namer = ClassNamer()
+
+    def class_scope(kind, name, parent, start_index):
+        separator = '.' if parent.kind == 'file' else '$'
+        return Scope(kind, parent.name + separator + namer.name(start_index, name), name, start_index=start_index)
+
+    def owner(stack):
+        """Innermost class-like scope."""
+        for scope in reversed(stack):
+            if scope.kind not in ('method', 'block'):
+                return scope
+        return stack[0]
+
+    found = []
+    stack = [Scope('file', package)]
+    for i, text in enumerate(texts):
+        scope = stack[-1]
+        if text == '{':
+            stack.append(classify(texts, tokens, i, scope, owner(stack), class_scope))
+            stack[-1].header = i + 1
+        elif text == '}':
+            if len(stack) == 1:
+                raise AmbiguousSource('unbalanced }} at line {}'.format(tokens[i][1]))
+            closed = stack.pop()
+            if closed.kind == 'method':
+                found.append((closed.start_index, closed.start_line, tokens[i][1], closed.name))
+            stack[-1].header = i + 1
+        elif text == ';':
+            if scope.kind in ('class', 'interface', 'enum', 'record', 'annotation') and not scope.enum_constants:
+                method = method_declaration(texts, tokens, scope.header, i, scope)
+                if method is not None:
+                    found.append((method.start_index, method.start_line, tokens[i][1], method.name))
+            scope.enum_constants = False
+            scope.header = i + 1
+        elif text == ',' and scope.enum_constants:
+            scope.header = i + 1
+    if len(stack) != 1:
+        raise AmbiguousSource('unbalanced {')
+
+    found.sort()
+    block_linenos = [(start_line, end_line) for _, start_line, end_line, _ in found]
+    blocks = ['\n'.join(lines[start_line - 1:end_line]) for start_line, end_line in block_linenos]
+    return block_linenos, blocks, [name for _, _, _, name in found]
+
+
+def method_declaration(texts, tokens, start, end, scope):
+    """Method scope for the declaration texts[start:end] in a class-like
+    scope, None if it's not a method."""
+    first = skip_modifiers(texts, start, end)
+    if first >= end:
+        return None
+    if scope.kind == 'record' and end - first == 1 and texts[first] == scope.class_name:
+        # Compact constructor
+        name_index, params = first, ''
+    else:
+        if '(' not in texts[first:end]:
+            return None
+        open_index = texts.index('(', first, end)
+        name_index = open_index - 1
+        if name_index < first or '=' in texts[first:open_index]:
+            return None
+        name = texts[name_index]
+        # A method has a return type (or type parameters) before its name,
+        # a constructor is named after its class
+        if name_index == first and name != scope.class_name:
+            return None
+        close_index = matching(texts, open_index, '(', ')')
+        rest = texts[close_index + 1:end]
+        while rest[:2] == ['[', ']']:
+            rest = rest[2:]
+        if rest and rest[0] not in ('throws', 'default'):
+            return None
+        params = parameter_types(texts[open_index + 1:close_index])
+    return Scope('method', '{}.{}({})'.format(scope.name, texts[name_index], params), start_line=tokens[first][1], start_index=first)
+
+
+def anonymous_class_type(texts, brace_index):
+    """Type of `new Type(...) {` ending at brace_index, or None."""
+    if texts[brace_index - 1] != ')':
+        return None
+    depth = 0
+    i = brace_index - 1
+    while i >= 0:
+        if texts[i] == ')':
+            depth += 1
+        elif texts[i] == '(':
+            depth -= 1
+            if depth == 0:
+                break
+        i -= 1
+    i -= 1
+    if i >= 0 and texts[i] == '>':
+        depth = 0
+        while i >= 0:
+            if texts[i] == '>':
+                depth += 1
+            elif texts[i] == '<':
+                depth -= 1
+                if depth == 0:
+                    break
+            i -= 1
+        i -= 1
+    if i < 0 or not is_word(texts[i]):
+        return None
+    type_name = texts[i]
+    while i >= 2 and texts[i - 1] == '.' and is_word(texts[i - 2]):
+        i -= 2
+    if i >= 1 and texts[i - 1] == 'new':
+        return type_name
+    return None
+
+
+def is_word(text):
+    return text[0].isalpha() or text[0] in '_$'
+
+
+def classify(texts, tokens, i, scope, owner, class_scope):
+    """Scope opened by the `{` at index i."""
+    start = scope.header
+    # Class declarations, local classes included
+    for k in range(start, i - 1):
+        keyword = texts[k]
+        if keyword in CLASS_KEYWORDS and (k == start or texts[k - 1] != '.') and is_word(texts[k + 1]):
+            if keyword == 'record' and texts[k + 2] not in ('(', '<'):
+                continue
+            kind = 'annotation' if k > start and texts[k - 1] == '@' else keyword
+            return class_scope(kind, texts[k + 1], owner, k)
+    anonymous_type = anonymous_class_type(texts, i)
+    if anonymous_type is not None:
+        return class_scope('class', anonymous_type, owner, i)
+    if scope.kind not in ('class', 'interface', 'enum', 'record', 'annotation'):
+        return Scope('block')
+    if texts[start:i].count('(') > texts[start:i].count(')'):
+        # Array in the arguments of an annotation
+        return Scope('block')
+    if scope.enum_constants:
+        first = skip_modifiers(texts, start, i)
+        if first < i and is_word(texts[first]):
+            return class_scope('class', texts[first], owner, first)
+        raise AmbiguousSource('enum constant at line {}'.format(tokens[i][1]))
+    method = method_declaration(texts, tokens, start, i, scope)
+    if method is not None:
+        return method
+    first = skip_modifiers(texts, start, i)
+    if first == i or '=' in texts[start:i] or texts[i - 1] == '->':
+        # Initializer, or array initializer or lambda of a field
+        return Scope('block')
+    raise AmbiguousSource('declaration at line {}'.format(tokens[i][1]))
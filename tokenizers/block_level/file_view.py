@@ -0,0 +1,107 @@
+"""One preprocessing pass per file, shared by the file and all its blocks.
+
+Comments are stripped and separators translated once for the whole file.
+The result is kept as one piece per line of the file: the code left on the
+line after removing comments, the same code with its separators turned into
+spaces, and whether the newline ending the line survived (it doesn't inside
+a multi-line comment). A block is then a range of lines whose pieces are
+joined, instead of being stripped and translated again.
+
+The stats and tokens are the same as stripping each block on its own,
+except for a block starting on the line that closes a multi-line comment,
+e.g. `... */ void f() {`. Stripped on its own, the block kept the end of the
+comment as code; here it is left out like the rest of the comment.
+"""
+
+import collections
+import re
+
+
+class FileView(object):
+    def __init__(self, file_string, comment_stripper, separators):
+        self.file_string = file_string
+        self.lines = file_string.split('\n')
+        translated = file_string.translate({ord(separator): ' ' for separator in separators})
+
+        self.code = []
+        self.translated = []
+        self.newline_kept = []
+        # Non blank lines per line of the file, a line can hold several
+        # for splitlines() (\r, form feeds...)
+        self.loc = []
+        # Ranges of the string literals left in the code
+        self.literals = []
+        self.spans = spans = comment_stripper.spans(file_string, self.literals)
+        span_index = 0
+        line_start = 0
+        for line in self.lines:
+            line_end = line_start + len(line)
+            code = []
+            code_translated = []
+            while span_index < len(spans) and spans[span_index][0] < line_end:
+                start, end = spans[span_index]
+                start = max(start, line_start)
+                if start < min(end, line_end):
+                    code.append(file_string[start:min(end, line_end)])
+                    code_translated.append(translated[start:min(end, line_end)])
+                if end > line_end:
+                    break
+                span_index += 1
+            self.code.append(''.join(code))
+            self.translated.append(''.join(code_translated))
+            self.newline_kept.append(span_index < len(spans) and spans[span_index][0] <= line_end < spans[span_index][1])
+            self.loc.append(sum(1 for s in line.splitlines() if s.strip()))
+            line_start = line_end + 1
+
+    def code_outside_literals(self):
+        """The code of every line with the content of its string literals
+        blanked out, e.g. to count brackets."""
+        file_string = self.file_string
+        parts = []
+        pos = 0
+        for start, end in self.literals:
+            parts.append(file_string[pos:start])
+            parts.append(re.sub(r'[^\n]', ' ', file_string[start:end]))
+            pos = end
+        parts.append(file_string[pos:])
+        blanked = ''.join(parts)
+        # Same pieces as the code, cut from the blanked string
+        spans = self.spans
+        code = []
+        span_index = 0
+        line_start = 0
+        for line in self.lines:
+            line_end = line_start + len(line)
+            pieces = []
+            while span_index < len(spans) and spans[span_index][0] < line_end:
+                start, end = spans[span_index]
+                start = max(start, line_start)
+                if start < min(end, line_end):
+                    pieces.append(blanked[start:min(end, line_end)])
+                if end > line_end:
+                    break
+                span_index += 1
+            code.append(''.join(pieces))
+            line_start = line_end + 1
+        return code
+
+    def _join(self, pieces, start_line, end_line):
+        """Pieces of the lines start_line..end_line (from 1), separated by
+        the newlines that survived."""
+        parts = []
+        for i in range(start_line - 1, end_line):
+            parts.append(pieces[i])
+            if i < end_line - 1 and self.newline_kept[i]:
+                parts.append('\n')
+        return ''.join(parts)
+
+    def stats(self, start_line, end_line):
+        """(LOC, SLOC) of the lines start_line..end_line."""
+        loc = max(sum(self.loc[start_line - 1:end_line]), 1)
+        sloc = sum(1 for s in self._join(self.code, start_line, end_line).splitlines() if s.strip())
+        return loc, sloc
+
+    def tokens(self, start_line, end_line):
+        """(tokens bag, total tokens) of the lines start_line..end_line."""
+        tokens_list = self._join(self.translated, start_line, end_line).split()
+        return dict(collections.Counter(tokens_list)), len(tokens_list)
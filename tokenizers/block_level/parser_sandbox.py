@@ -0,0 +1,111 @@
+"""Block extraction in a separate parser process.
+
+A pathological file can make javalang run for hours, exhaust the memory or
+overflow the stack with the raised recursion limit. Parsed in the worker,
+it stalls or kills the whole batch of the worker. With PARSE_TIMEOUT set,
+every worker hands its files to a parser process of its own instead, so the
+parsers make a pool of N_PROCESSES processes, one per worker:
+
+- the parser process runs with its address space limited to
+  PARSE_MEMORY_LIMIT bytes, so a runaway parse gets a MemoryError in the
+  parser instead of swapping the machine;
+- the worker waits at most PARSE_TIMEOUT seconds for each file, then kills
+  the parser and starts a new one for the next file;
+- a parser that dies (segfault, stack overflow...) is replaced the same way.
+
+The file is then skipped with the reason parse_timeout, parse_memory,
+parse_crash or parse_error (an unexpected exception), recorded like the
+other skips (see file_level/filters.py), and the worker goes on with the
+rest of the project.
+"""
+
+import sys
+import traceback
+from multiprocessing import Pipe, Process
+
+from file_level.filters import SkipFile
+
+try:
+    import resource
+except ImportError:  # Not available on Windows, the memory isn't limited there
+    resource = None
+
+
+def _serve(conn, memory_limit, recursion_limit):
+    if memory_limit > 0 and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    sys.setrecursionlimit(recursion_limit)
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        function, args = request
+        try:
+            reply = ('ok', function(*args))
+        except MemoryError:
+            reply = ('parse_memory', None)
+        except Exception:
+            reply = ('parse_error', traceback.format_exc())
+        try:
+            conn.send(reply)
+        except MemoryError:
+            conn.send(('parse_memory', None))
+
+
+class ParserSandbox(object):
+    """Runs functions in a parser process, started on first use."""
+
+    def __init__(self, timeout, memory_limit=0):
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.process = None
+        self.conn = None
+
+    def run(self, function, *args):
+        """function(*args) in the parser process. Raises SkipFile if it
+        takes too long, runs out of memory or fails."""
+        if self.process is not None and not self.process.is_alive():
+            self._kill()
+        if self.process is None:
+            self._start()
+        self.conn.send((function, args))
+        if not self.conn.poll(self.timeout):
+            self._kill()
+            raise SkipFile('parse_timeout')
+        try:
+            status, result = self.conn.recv()
+        except (EOFError, ConnectionError):
+            self._kill()
+            raise SkipFile('parse_crash')
+        if status != 'ok':
+            if status == 'parse_error':
+                print("[WARNING] Parser failed:\n{}".format(result))
+            raise SkipFile(status)
+        return result
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, ConnectionError):
+            pass
+        self.process.join(self.timeout)
+        self._kill()
+
+    def _start(self):
+        self.conn, child_conn = Pipe()
+        self.process = Process(name='Parser', target=_serve, args=(child_conn, self.memory_limit, sys.getrecursionlimit()), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def _kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self.process = None
+        self.conn = None
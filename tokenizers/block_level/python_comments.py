@@ -0,0 +1,100 @@
+"""Comments of Python files found by the tokenize module.
+
+The generic CommentStripper only knows string delimiters that end at the end
+of the line, so a `#` on a line inside a triple-quoted string is taken for a
+comment, and a quote in such a string can hide a real comment. For the
+language profiles with BLOCK_EXTRACTOR = python the comments are instead
+the COMMENT tokens of the stdlib tokenizer, which lexes strings exactly.
+String tokens opening with the comment_open_tag of the profile (''' in the
+shipped config, for docstrings) are removed too, as the generic stripper
+does.
+
+The file is tokenized once; FileView builds the code, SLOC and token bags
+of the file and of all its blocks from the kept spans. Files the tokenizer
+rejects fall back to the generic stripper.
+"""
+
+import io
+import tokenize
+
+STRING_PREFIXES = 'rRbBuUfF'
+# Token types of the f-strings, Python 3.12 and later
+FSTRING_START = getattr(tokenize, 'FSTRING_START', None)
+FSTRING_END = getattr(tokenize, 'FSTRING_END', None)
+
+
+class PythonCommentStripper(object):
+    """Same interface as CommentStripper, for Python sources."""
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+        self.comment_inline = fallback.comment_inline
+        self.comment_open_tag = fallback.comment_open_tag
+
+    def strip(self, string):
+        return ''.join([string[start:end] for start, end in self.spans(string)])
+
+    def spans(self, string, literals=None):
+        """(start, end) ranges of string that are kept, in order. The ranges
+        of the string literals kept are also appended to the list `literals`."""
+        # Left empty if the tokenizer gives up half way
+        kept_literals = None if literals is None else []
+        try:
+            removed = self.removed(string, kept_literals)
+        except (tokenize.TokenError, SyntaxError):
+            return self.fallback.spans(string, literals)
+        if literals is not None:
+            literals.extend(kept_literals)
+        result = []
+        pos = 0
+        for start, end in removed:
+            if start > pos:
+                result.append((pos, start))
+            pos = end
+        if pos < len(string):
+            result.append((pos, len(string)))
+        return result
+
+    def removed(self, string, literals=None):
+        """(start, end) ranges of the comments, in order. The ranges of the
+        other string literals, f-strings included, are appended to the list
+        `literals`."""
+        # Offset of the start of every line handed to the tokenizer, the
+        # token positions are (line from 1, column)
+        line_starts = []
+        lines = io.StringIO(string, newline='')
+        offset = 0
+
+        def readline():
+            nonlocal offset
+            line = lines.readline()
+            line_starts.append(offset)
+            offset += len(line)
+            return line
+
+        def offset_of(position):
+            row, col = position
+            return line_starts[row - 1] + col
+
+        tag = self.comment_open_tag
+        result = []
+        # Start of the outermost f-string being read and how deep we are in
+        # f-strings, tokenized in pieces since Python 3.12
+        fstring_start = None
+        fstring_depth = 0
+        for token in tokenize.generate_tokens(readline):
+            if token.type == tokenize.COMMENT or token.type == tokenize.STRING and tag and token.string.lstrip(STRING_PREFIXES).startswith(tag):
+                result.append((offset_of(token.start), offset_of(token.end)))
+            elif literals is None:
+                continue
+            elif token.type == tokenize.STRING and not fstring_depth:
+                literals.append((offset_of(token.start), offset_of(token.end)))
+            elif token.type == FSTRING_START:
+                if not fstring_depth:
+                    fstring_start = offset_of(token.start)
+                fstring_depth += 1
+            elif token.type == FSTRING_END:
+                fstring_depth -= 1
+                if not fstring_depth:
+                    literals.append((fstring_start, offset_of(token.end)))
+        return result
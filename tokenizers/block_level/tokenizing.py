@@ -0,0 +1,394 @@
+import time
+import re
+import sys
+import hashlib
+import importlib
+import os
+from configparser import ConfigParser
+
+from file_level.block_ids import MAX_BLOCKS, MAX_FILE_ID, encode_block_id
+from file_level.filters import FileFilter, SkipFile, skipped_line
+from file_level.languages import LanguageRegistry
+from file_level.manifest import file_md5
+from file_level.metrics import Metrics
+from file_level.sources import open_source
+
+from . import windows
+from .parser_sandbox import ParserSandbox
+from .file_view import FileView
+from .python_comments import PythonCommentStripper
+
+MULTIPLIER = 50000000
+
+N_PROCESSES = 2
+PROJECTS_BATCH = 20
+OUTPUT_FORMAT = 'text'
+BUILD_VOCABULARY = False
+METRICS_FILE = ''
+OUTPUT_BUFFER_SIZE = 1 << 20
+MAX_SHARD_SIZE = 0
+FSYNC = 'none'
+SPLIT_PROJECT_SIZE = 0
+CHUNK_SIZE = 1 << 25
+FILE_projects_list = 'project-list.txt'
+PATH_stats_file_folder = 'files_stats'
+PATH_bookkeeping_proj_folder = 'bookkeeping_projs'
+PATH_tokens_file_folder = 'files_tokens'
+PATH_vocabulary_folder = 'vocabulary'
+
+# Language profiles, see file_level/languages.py
+languages = LanguageRegistry([])
+# Comment stripper of every profile, by name: the tokenize module for the
+# Python profiles (see python_comments.py)
+comment_strippers = {}
+file_filter = FileFilter()
+JAVA_EXTRACTOR = 'javalang'
+# How Java methods are found, see extract_java_functions.get_functions
+JAVA_EXTRACTORS = ('javalang', 'fast', 'auto')
+# Modules of the BLOCK_EXTRACTORs, and the ones already imported
+EXTRACTOR_MODULES = {'java': '.extract_java_functions', 'python': '.extract_python_functions'}
+extractor_modules = {}
+PARSE_TIMEOUT = 0
+PARSE_MEMORY_LIMIT = 0
+# Parser process of this worker, None to parse in the worker (see parser_sandbox.py)
+parser_sandbox = None
+BLOCK_MODES = ('functions', 'windows')
+BLOCK_MODE = 'functions'
+WINDOW_UNIT = 'lines'
+WINDOW_SIZE = 10
+WINDOW_STRIDE = 5
+config_hash = None
+token_counter = None
+# Timings of the current project, see file_level/metrics.py
+metrics = Metrics()
+
+file_count = 0
+
+
+def hash_measuring_time(string):
+    start_time = time.perf_counter_ns()
+    m = hashlib.md5()
+    m.update(string.encode("utf-8"))
+    hash_value = m.hexdigest()
+    return hash_value, time.perf_counter_ns() - start_time
+
+
+def read_config():
+    global N_PROCESSES, PROJECTS_BATCH, OUTPUT_FORMAT, BUILD_VOCABULARY
+    global OUTPUT_BUFFER_SIZE, MAX_SHARD_SIZE, FSYNC, SPLIT_PROJECT_SIZE, CHUNK_SIZE
+    global PATH_stats_file_folder, PATH_bookkeeping_proj_folder, PATH_tokens_file_folder, PATH_vocabulary_folder
+    global languages, comment_strippers, file_filter, JAVA_EXTRACTOR
+    global PARSE_TIMEOUT, PARSE_MEMORY_LIMIT, parser_sandbox
+    global BLOCK_MODE, WINDOW_UNIT, WINDOW_SIZE, WINDOW_STRIDE
+    global FILE_projects_list, config_hash, METRICS_FILE
+
+    global init_file_id
+    global init_proj_id
+    global proj_id_flag
+
+    config = ConfigParser()
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.ini')
+
+    # parse existing file
+    try:
+        config.read(config_path)
+        config_hash = file_md5(config_path)
+    except IOError:
+        print('[ERROR] - Config settings not found. Usage: $python this-script.py config-file.ini')
+        sys.exit()
+
+    # Get info from config.ini into global variables
+    N_PROCESSES = config.getint('Main', 'N_PROCESSES')
+    PROJECTS_BATCH = config.getint('Main', 'PROJECTS_BATCH')
+    OUTPUT_FORMAT = config.get('Main', 'OUTPUT_FORMAT', fallback='text')
+    BUILD_VOCABULARY = config.getboolean('Main', 'BUILD_VOCABULARY', fallback=False)
+    OUTPUT_BUFFER_SIZE = config.getint('Main', 'OUTPUT_BUFFER_SIZE', fallback=1 << 20)
+    MAX_SHARD_SIZE = config.getint('Main', 'MAX_SHARD_SIZE', fallback=0)
+    FSYNC = config.get('Main', 'FSYNC', fallback='none')
+    SPLIT_PROJECT_SIZE = config.getint('Main', 'SPLIT_PROJECT_SIZE', fallback=0)
+    CHUNK_SIZE = config.getint('Main', 'CHUNK_SIZE', fallback=1 << 25)
+    FILE_projects_list = config.get('Main', 'FILE_projects_list')
+    PATH_stats_file_folder = config.get('Folders/Files', 'PATH_stats_file_folder')
+    PATH_bookkeeping_proj_folder = config.get('Folders/Files', 'PATH_bookkeeping_proj_folder')
+    PATH_tokens_file_folder = config.get('Folders/Files', 'PATH_tokens_file_folder')
+    PATH_vocabulary_folder = config.get('Folders/Files', 'PATH_vocabulary_folder', fallback='vocabulary')
+    METRICS_FILE = config.get('Folders/Files', 'METRICS_FILE', fallback='')
+
+    # Reading Language settings, one profile per [Language] section
+    try:
+        languages = LanguageRegistry.from_config(config)
+    except ValueError as e:
+        print('[ERROR] {}'.format(e))
+        sys.exit(1)
+    comment_strippers = {profile.name: PythonCommentStripper(profile.comment_stripper) if profile.block_extractor == 'python' else profile.comment_stripper
+                         for profile in languages.profiles}
+    file_filter = FileFilter.from_config(config)
+    JAVA_EXTRACTOR = config.get('Language', 'JAVA_EXTRACTOR', fallback='javalang')
+    if JAVA_EXTRACTOR not in JAVA_EXTRACTORS:
+        print('[ERROR] Unknown JAVA_EXTRACTOR "{}", expected one of: {}'.format(JAVA_EXTRACTOR, ', '.join(JAVA_EXTRACTORS)))
+        sys.exit(1)
+    BLOCK_MODE = config.get('Blocks', 'BLOCK_MODE', fallback='functions')
+    WINDOW_UNIT = config.get('Blocks', 'WINDOW_UNIT', fallback='lines')
+    WINDOW_SIZE = config.getint('Blocks', 'WINDOW_SIZE', fallback=10)
+    WINDOW_STRIDE = config.getint('Blocks', 'WINDOW_STRIDE', fallback=5)
+    if BLOCK_MODE not in BLOCK_MODES or WINDOW_UNIT not in windows.UNITS or WINDOW_SIZE < 1 or WINDOW_STRIDE < 1:
+        print('[ERROR] Invalid [Blocks] settings: BLOCK_MODE must be one of {}, WINDOW_UNIT one of {}, WINDOW_SIZE and WINDOW_STRIDE at least 1'.format(', '.join(BLOCK_MODES), ', '.join(windows.UNITS)))
+        sys.exit(1)
+    PARSE_TIMEOUT = config.getfloat('Parser', 'PARSE_TIMEOUT', fallback=0)
+    PARSE_MEMORY_LIMIT = config.getint('Parser', 'PARSE_MEMORY_LIMIT', fallback=0)
+    # Started by every worker on its first file
+    parser_sandbox = ParserSandbox(PARSE_TIMEOUT, PARSE_MEMORY_LIMIT) if PARSE_TIMEOUT > 0 else None
+
+    # Reading config settings
+    init_file_id = config.getint('Config', 'init_file_id')
+    init_proj_id = config.getint('Config', 'init_proj_id')
+
+    # flag before proj_id
+    proj_id_flag = config.getint('Config', 'init_proj_id')
+
+
+def count_lines(string, count_empty = True):
+    result = string.count('\n')
+    if not string.endswith('\n') and (count_empty or string != ""):
+        result += 1
+    return result
+
+
+# SourcererCC formatting
+def format_tokens(tokens_bag):
+    start_time = time.perf_counter_ns()
+    tokens = ','.join(['{}@@::@@{}'.format(k, v) for k, v in tokens_bag.items()])
+    return tokens, time.perf_counter_ns() - start_time
+
+
+def extractor_module(block_extractor):
+    """Module of a BLOCK_EXTRACTOR, imported on first use: a worker loads
+    only the extractors, and their parsers, of the languages it meets."""
+    module = extractor_modules.get(block_extractor)
+    if module is None:
+        module = extractor_modules[block_extractor] = importlib.import_module(EXTRACTOR_MODULES[block_extractor], __package__)
+    return module
+
+
+def extract_blocks(file_string, file_path, block_extractor, java_extractor, separators, comment_inline_pattern):
+    """(block_linenos, blocks, experimental_values) of a file, by the
+    BLOCK_EXTRACTOR of its language. Runs in the parser process if there is
+    one."""
+    block_linenos = None
+    blocks = None
+    experimental_values = ''
+    if block_extractor == 'python':
+        (block_linenos, blocks, experimental_values) = extractor_module('python').get_functions(file_string, file_path)
+    elif block_extractor == 'java':
+        (block_linenos, blocks, experimental_values) = extractor_module('java').get_functions(file_string, file_path, separators, comment_inline_pattern,
+                                                                                             java_extractor)
+    return block_linenos, blocks, experimental_values
+
+
+def tokenize_blocks(file_string, comment_stripper, comment_inline_pattern, separators, file_path, block_extractor):
+    # This function will return (file_stats, [(blocks_tokens,blocks_stats)], file_parsing_times]
+    # Raises SkipFile if the parser process gives up on the file
+    if BLOCK_MODE == 'functions':
+        start_time = time.perf_counter_ns()
+        args = (file_string, file_path, block_extractor, JAVA_EXTRACTOR, separators, comment_inline_pattern)
+        try:
+            if parser_sandbox is None:
+                (block_linenos, blocks, experimental_values) = extract_blocks(*args)
+            else:
+                (block_linenos, blocks, experimental_values) = parser_sandbox.run(extract_blocks, *args)
+        finally:
+            metrics.observe("parse", time.perf_counter_ns() - start_time)
+
+        if block_linenos is None:
+            print("[INFO] Returning None on tokenize_blocks for file {}".format(file_path))
+            return None, None, None
+
+    se_time = 0
+    token_time = 0
+    blocks_data = []
+    file_hash, hash_time = hash_measuring_time(file_string)
+    # Comments are stripped and separators translated once for the whole
+    # file, blocks are ranges of lines of the same view (see file_view.py)
+    start_time = time.perf_counter_ns()
+    view = FileView(file_string, comment_stripper, separators)
+    re_time = time.perf_counter_ns() - start_time
+    final_stats = (file_hash, count_lines(file_string), *view.stats(1, len(view.lines)))
+
+    if BLOCK_MODE == 'windows':
+        # The bag and tokens hash are moved along the file (see windows.py)
+        start_time = time.perf_counter_ns()
+        for start_line, end_line, bag in windows.windows(view, WINDOW_SIZE, WINDOW_STRIDE, WINDOW_UNIT):
+            se_time += time.perf_counter_ns() - start_time
+            block_string = '\n'.join(view.lines[start_line - 1:end_line])
+            block_hash, hash_delta_time = hash_measuring_time(block_string)
+            hash_time += hash_delta_time
+            tokens, format_time = format_tokens(bag.bag)
+            token_time += format_time
+
+            block_tokens = (bag.total, len(bag.bag), bag.hexdigest(), '@#@' + tokens)
+            block_stats = (block_hash, count_lines(block_string), *view.stats(start_line, end_line), start_line, end_line)
+            blocks_data.append((block_tokens, block_stats, ''))
+            start_time = time.perf_counter_ns()
+        return final_stats, blocks_data, [se_time, token_time, hash_time, re_time]
+
+    for i, block_string in enumerate(blocks):
+        (start_line, end_line) = block_linenos[i]
+
+        block_hash, hash_delta_time = hash_measuring_time(block_string)
+        hash_time += hash_delta_time
+        start_time = time.perf_counter_ns()
+        tokens_bag, tokens_count_total = view.tokens(start_line, end_line)
+        se_time += time.perf_counter_ns() - start_time
+        tokens, format_time = format_tokens(tokens_bag)
+        token_time += format_time
+        tokens_hash, hash_delta_time = hash_measuring_time(tokens)
+        hash_time += hash_delta_time
+
+        block_tokens = (tokens_count_total, len(tokens_bag), tokens_hash, '@#@' + tokens)
+        block_stats = (block_hash, count_lines(block_string), *view.stats(start_line, end_line), start_line, end_line)
+        blocks_data.append((block_tokens, block_stats, experimental_values[i]))
+    return final_stats, blocks_data, [se_time, token_time, hash_time, re_time]
+
+
+def process_file_contents(file_string, proj_id, file_id, container_path, file_path, file_bytes, proj_url, file_tokens_file, file_stats_file, profile):
+    print(f"[INFO] Started process_file_contents on {file_path}")
+    global file_count
+    file_count += 1
+    metrics.count("files")
+
+    print(f"[INFO] Started tokenizing blocks on {file_path}")
+    separators = ' '.join(profile.separators)
+    comment_inline_pattern = re.escape(profile.comment_stripper.comment_inline) + '.*?$'
+    (final_stats, blocks_data, file_parsing_times) = tokenize_blocks(file_string, comment_strippers[profile.name], comment_inline_pattern, separators,
+                                                                     os.path.join(container_path, file_path), profile.block_extractor)
+    if (final_stats is None) or (blocks_data is None) or (file_parsing_times is None):
+        print("[WARNING] " + 'Problems tokenizing file ' + os.path.join(container_path, file_path))
+        return
+
+    for stage, ns in zip(("separators", "format", "hash", "regex"), file_parsing_times):
+        metrics.observe(stage, ns)
+    metrics.count("blocks", len(blocks_data))
+
+    if len(blocks_data) > MAX_BLOCKS or file_id > MAX_FILE_ID:
+        print("[WARNING] File {} (id {}) has {} blocks, block ids are limited to {} blocks and file ids up to {}, see file_level/block_ids.py".format(os.path.join(container_path, file_path), file_id, len(blocks_data), MAX_BLOCKS, MAX_FILE_ID))
+        return
+
+    # write file stats
+    file_url = proj_url + '/' + file_path.replace(' ', '%20')
+    file_path = os.path.join(container_path, file_path)
+
+    # file stats start with a letter 'f'
+    (file_hash, lines, LOC, SLOC) = final_stats
+    file_stats_file.write('f,{},{},\"{}\",\"{}\",\"{}\",{},{},{},{}\n'.format(proj_id, file_id, file_path, file_url, file_hash, file_bytes, lines, LOC, SLOC))
+
+    start_time = time.perf_counter_ns()
+    try:
+        for block_index, block_data in enumerate(blocks_data):
+            (blocks_tokens, blocks_stats, experimental_values) = block_data
+            block_id = encode_block_id(file_id, block_index)
+
+            (block_hash, block_lines, block_LOC, block_SLOC, start_line, end_line) = blocks_stats
+            (tokens_count_total, tokens_count_unique, token_hash, tokens) = blocks_tokens
+
+            # Adjust the blocks stats written to the files, file stats start with a letter 'b'
+            file_stats_file.write('b,{},{},\"{}\",{},{},{},{},{}\n'.format(proj_id, block_id, block_hash, block_lines, block_LOC, block_SLOC, start_line, end_line))
+            if token_counter is not None:
+                token_counter.add(tokens)
+            if OUTPUT_FORMAT == 'binary':
+                file_tokens_file.write_bag(proj_id, block_id, tokens_count_total, tokens_count_unique, token_hash, tokens, experimental_values.replace(",", ";"))
+                continue
+            if len(experimental_values) != 0:
+                file_tokens_file.write('{},{},{},{},{},{}{}\n'.format(proj_id, block_id, tokens_count_total, tokens_count_unique, experimental_values.replace(",", ";"), token_hash, tokens))
+            else:
+                file_tokens_file.write('{},{},{},{},{}{}\n'.format(proj_id, block_id, tokens_count_total, tokens_count_unique, token_hash, tokens))
+        metrics.observe("write", time.perf_counter_ns() - start_time)
+    except Exception as e:
+        print("[WARNING] Error on step3 of process_file_contents")
+        print(e)
+    print(f"[INFO] Successfully ran process_file_contents {os.path.join(container_path, file_path)}")
+
+
+def skip_file(proj_id, proj_path, source_file, reason, file_skipped_file):
+    print("[INFO] Skipping file <{}>: {}".format(os.path.join(proj_path, source_file.path), reason))
+    metrics.count("skipped_{}".format(reason))
+    if file_skipped_file is not None:
+        file_skipped_file.write(skipped_line(proj_id, os.path.join(proj_path, source_file.path), source_file.size, reason))
+
+
+def process_source(process_num, proj_id, proj_path, proj_url, base_file_id, file_tokens_files, file_stats_file, chunk=None, file_skipped_file=None):
+    # file_tokens_files has the tokens output of every language profile, by name
+    print(f"[INFO] Started project source {proj_path}")
+    start_time = time.perf_counter_ns()
+    try:
+        source = open_source(proj_path, languages.extensions)
+    except Exception as e:
+        print(f"[ERROR] Unable to open project {proj_path}")
+        print(e)
+        return
+    metrics.observe("open", time.perf_counter_ns() - start_time)
+    if source is None:
+        print(f"[ERROR] Unsupported project {proj_path}, expected a zip, tarball, directory or bare git repository")
+        return
+
+    try:
+        for member_index, file in enumerate(source.files(chunk)):
+            try:
+                reason = file_filter.check(file)
+                if reason is not None:
+                    raise SkipFile(reason)
+                start_time = time.perf_counter_ns()
+                file_content = file_filter.read(file, file.peek is not None)
+                metrics.observe("read", time.perf_counter_ns() - start_time)
+                metrics.count("bytes", len(file_content))
+                start_time = time.perf_counter_ns()
+                try:
+                    file_string = file_content.decode("utf-8")
+                except UnicodeDecodeError:
+                    raise SkipFile('decode_error')
+                metrics.observe("decode", time.perf_counter_ns() - start_time)
+            except SkipFile as e:
+                skip_file(proj_id, proj_path, file, e.reason, file_skipped_file)
+                continue
+
+            if chunk is None:
+                file_id = process_num * MULTIPLIER + base_file_id + file_count
+            else:
+                file_id = chunk.first_file_id + member_index
+            profile = languages.profile_for(file.path)
+            try:
+                process_file_contents(file_string, proj_id, file_id, proj_path, file.path, str(file.size), proj_url, file_tokens_files[profile.name], file_stats_file,
+                                      profile)
+            except SkipFile as e:
+                skip_file(proj_id, proj_path, file, e.reason, file_skipped_file)
+    finally:
+        source.close()
+
+    print(f"[INFO] Processed project source {proj_path}")
+
+
+def process_one_project(process_num, proj_id, proj_path, base_file_id, file_tokens_files, file_bookkeeping_proj, file_stats_file, chunk=None,
+                        file_skipped_file=None):
+    # Timings of the project, or of one chunk of it, are added to metrics
+    p_start = time.perf_counter_ns()
+
+    proj_url = 'NULL'
+    proj_id = str(proj_id_flag) + proj_id
+    if not os.path.exists(proj_path):
+        print("[WARNING] " + 'Unable to open project <' + proj_id + ',' + proj_path + '> (process ' + str(process_num) + ')')
+        return
+    process_source(process_num, proj_id, proj_path, proj_url, base_file_id, file_tokens_files, file_stats_file, chunk, file_skipped_file)
+    if chunk is None or chunk.index == 0:
+        file_bookkeeping_proj.write("{},\"{}\",\"{}\"\n".format(proj_id, proj_path, proj_url))
+
+    p_elapsed = (time.perf_counter_ns() - p_start) / 1e6
+    part = '' if chunk is None else ' chunk {}/{}'.format(chunk.index + 1, chunk.count)
+    print("[INFO] " + 'Project finished <{},{}>{} (process {})'.format(proj_id, proj_path, part, process_num))
+    print("[INFO] " + ' ({}): Total: {:.1f} ms'.format(process_num, p_elapsed))
+    print("[INFO] " + '     Open: {:.1f} ms'.format(metrics.total_ms("open")))
+    print("[INFO] " + '     Read: {:.1f} ms'.format(metrics.total_ms("read") + metrics.total_ms("decode")))
+    print("[INFO] " + '     Parse: {:.1f} ms'.format(metrics.total_ms("parse")))
+    print("[INFO] " + '     Separators: {:.1f} ms'.format(metrics.total_ms("separators")))
+    print("[INFO] " + '     Tokens: {:.1f} ms'.format(metrics.total_ms("format")))
+    print("[INFO] " + '     Write: {:.1f} ms'.format(metrics.total_ms("write")))
+    print("[INFO] " + '     Hash: {:.1f} ms'.format(metrics.total_ms("hash")))
+    print("[INFO] " + '     regex: {:.1f} ms'.format(metrics.total_ms("regex")))
@@ -0,0 +1,114 @@
+"""Sliding windows of code as blocks, for clones smaller than a method.
+
+With BLOCK_MODE = windows the blocks of a file are not its functions but
+every WINDOW_SIZE consecutive units of code, the window moving WINDOW_STRIDE
+units at a time. A unit is a line with code left after removing comments
+(WINDOW_UNIT = lines), or such lines joined until their parentheses and
+brackets balance, roughly one statement (WINDOW_UNIT = statements). Brackets
+inside string literals, as the comment stripper delimits them, are not
+counted. The last
+window is aligned with the end of the file so the tail is never left out,
+and a file shorter than one window is a single window.
+
+The bag of a window is not recomputed: when the window moves, the tokens of
+the units leaving it are subtracted and the tokens of the units entering it
+added. The tokens hash is a multiset hash, the sum modulo 2^128 of the md5
+of every token occurrence, updated the same way. Like an md5 of the bag it
+is the same for the same bag whatever the order of the tokens, and it is
+written as 32 hex digits.
+"""
+
+import hashlib
+
+UNITS = ('lines', 'statements')
+HASH_MASK = (1 << 128) - 1
+
+
+def units(view, unit='lines'):
+    """[(start_line, end_line, tokens)] of the units of a FileView."""
+    result = []
+    start_line = None
+    tokens = []
+    depth = 0
+    bare_code = view.code_outside_literals() if unit == 'statements' else None
+    for i, code in enumerate(view.code):
+        if not code.strip():
+            continue
+        if start_line is None:
+            start_line = i + 1
+        tokens.extend(view.translated[i].split())
+        if unit == 'statements':
+            bare = bare_code[i]
+            depth = max(depth + bare.count('(') + bare.count('[') - bare.count(')') - bare.count(']'), 0)
+            if depth > 0:
+                continue
+        result.append((start_line, i + 1, tokens))
+        start_line = None
+        tokens = []
+    if start_line is not None:
+        result.append((start_line, len(view.code), tokens))
+    return result
+
+
+def window_starts(n_units, size, stride):
+    if n_units <= size:
+        return [0] if n_units else []
+    starts = list(range(0, n_units - size + 1, stride))
+    if starts[-1] != n_units - size:
+        starts.append(n_units - size)
+    return starts
+
+
+class RollingBag(object):
+    """Bag of tokens with its total and multiset hash, updated in place."""
+
+    def __init__(self):
+        self.bag = {}
+        self.total = 0
+        self.hash_sum = 0
+        self.token_hashes = {}
+
+    def token_hash(self, token):
+        h = self.token_hashes.get(token)
+        if h is None:
+            h = self.token_hashes[token] = int.from_bytes(hashlib.md5(token.encode('utf-8')).digest(), 'big')
+        return h
+
+    def add(self, tokens):
+        bag = self.bag
+        for token in tokens:
+            bag[token] = bag.get(token, 0) + 1
+            self.hash_sum += self.token_hash(token)
+        self.total += len(tokens)
+
+    def remove(self, tokens):
+        bag = self.bag
+        for token in tokens:
+            count = bag[token] - 1
+            if count:
+                bag[token] = count
+            else:
+                del bag[token]
+            self.hash_sum -= self.token_hash(token)
+        self.total -= len(tokens)
+
+    def hexdigest(self):
+        return '{:032x}'.format(self.hash_sum & HASH_MASK)
+
+
+def windows(view, size, stride, unit='lines'):
+    """(start_line, end_line, bag) of every window of a FileView, bag being
+    the same RollingBag moved along the file."""
+    file_units = units(view, unit)
+    bag = RollingBag()
+    start, end = 0, 0
+    for new_start in window_starts(len(file_units), size, stride):
+        new_end = min(new_start + size, len(file_units))
+        # Units leaving and entering the window, all of them if the stride
+        # is larger than the window
+        for k in range(start, min(new_start, end)):
+            bag.remove(file_units[k][2])
+        for k in range(max(end, new_start), new_end):
+            bag.add(file_units[k][2])
+        start, end = new_start, new_end
+        yield file_units[start][0], file_units[end - 1][1], bag
@@ -3,99 +3,139 @@
 import datetime as dt
 import os
 import sys
-from multiprocessing import Process, Queue
-
-from block_level.tokenizing import *
-
-
-def process_projects(process_num, list_projects, base_file_id, global_queue):
-    file_files_tokens_file = os.path.join(PATH_tokens_file_folder, 'files-tokens-{}.tokens'.format(process_num))
-    file_bookkeeping_proj_name = os.path.join(PATH_bookkeeping_proj_folder, 'bookkeeping-proj-{}.projs'.format(process_num))
-    file_files_stats_file = os.path.join(PATH_stats_file_folder, 'files-stats-{}.stats'.format(process_num))
-
-    global file_count
-    file_count = 0
+from contextlib import ExitStack
+
+from block_level import tokenizing
+from block_level.tokenizing import process_one_project, read_config
+from file_level.binary_format import KIND_BLOCKS, tokens_opener
+from file_level.chunks import plan_tasks
+from file_level.filters import SKIPPED_EXTENSION, SKIPPED_NAME
+from file_level.manifest import Manifest, output_offsets
+from file_level.metrics import Metrics
+from file_level.outputs import OutputStream, write_progress
+from file_level.pool import run_pool, worker_tasks
+from file_level.vocabulary import TokenCounter, merge_counts, remove_counts, write_vocabulary
+
+
+def process_projects(process_num, task_queue, result_queue, manifest):
+    file_bookkeeping_proj_name = os.path.join(tokenizing.PATH_bookkeeping_proj_folder, 'bookkeeping-proj-{}'.format(process_num))
+    file_files_stats_file = os.path.join(tokenizing.PATH_stats_file_folder, 'files-stats-{}'.format(process_num))
+    file_skipped_name = os.path.join(tokenizing.PATH_bookkeeping_proj_folder, SKIPPED_NAME.format(process_num))
+    stream_options = {"buffer_size": tokenizing.OUTPUT_BUFFER_SIZE, "max_bytes": tokenizing.MAX_SHARD_SIZE, "fsync": tokenizing.FSYNC}
+    tokens_extension, tokens_file_opener = tokens_opener(tokenizing.OUTPUT_FORMAT, KIND_BLOCKS, tokenizing.OUTPUT_BUFFER_SIZE)
+    n_projects = manifest.projects_per_process.get(process_num, 0)
+
+    base_file_id = tokenizing.init_file_id + manifest.files_per_process.get(process_num, 0)
+    tokenizing.file_count = 0
+    if tokenizing.BUILD_VOCABULARY:
+        tokenizing.token_counter = TokenCounter.resume(tokenizing.PATH_vocabulary_folder, process_num, manifest.records(process_num))
     print("[INFO] Process {} starting".format(process_num))
-    with open(file_files_tokens_file, 'a+', encoding="utf-8") as tokens_file, open(file_bookkeeping_proj_name, 'a+', encoding="utf-8") as bookkeeping_file, open(file_files_stats_file, 'a+', encoding="utf-8") as stats_file:
+    with ExitStack() as tokens_streams, \
+            OutputStream(file_bookkeeping_proj_name, '.projs', **stream_options) as bookkeeping_file, \
+            OutputStream(file_files_stats_file, '.stats', **stream_options) as stats_file, \
+            OutputStream(file_skipped_name, SKIPPED_EXTENSION, **stream_options) as skipped_file:
+        # One tokens output per language profile
+        tokens_files = {}
+        for profile in tokenizing.languages.profiles:
+            tokens_files[profile.name] = tokens_streams.enter_context(OutputStream(
+                os.path.join(tokenizing.PATH_tokens_file_folder, profile.output_name('files-tokens', process_num)), tokens_extension, tokens_file_opener, **stream_options))
+        outputs = {"bookkeeping": bookkeeping_file, "stats": stats_file, "skipped": skipped_file}
+        for profile in tokenizing.languages.profiles:
+            outputs[profile.output_name('tokens')] = tokens_files[profile.name]
         p_start = dt.datetime.now()
-        for proj_id, proj_path in list_projects:
-            process_one_project(process_num, str(proj_id), proj_path, base_file_id, tokens_file, bookkeeping_file, stats_file)
-
-    p_elapsed = (dt.datetime.now() - p_start).seconds
-    print("[INFO] " + 'Process {} finished. {} files in {} s'.format(process_num, file_count, p_elapsed))
+        for proj_id, proj_path, chunk in worker_tasks(task_queue):
+            start_offsets = output_offsets(outputs)
+            files_before = tokenizing.file_count
+            proj_start = dt.datetime.now()
+            tokenizing.metrics = Metrics()
+            process_one_project(process_num, str(proj_id), proj_path, base_file_id, tokens_files, bookkeeping_file, stats_file, chunk, skipped_file)
+            n_files = tokenizing.file_count - files_before
+            end_offsets = output_offsets(outputs)
+            n_shards = sum(len(stream.finished) for stream in outputs.values())
+            for stream in outputs.values():
+                stream.end_project()
+            manifest.record(process_num, proj_id, proj_path, n_files, start_offsets, end_offsets, None if chunk is None else chunk.index)
+            if tokenizing.token_counter is not None and sum(len(stream.finished) for stream in outputs.values()) > n_shards:
+                # A resume only counts again the projects written after this
+                tokenizing.token_counter.save(tokenizing.PATH_vocabulary_folder, process_num, manifest.files_per_process.get(process_num, 0) + tokenizing.file_count)
+            n_projects += 1
+            write_progress(tokenizing.PATH_bookkeeping_proj_folder, process_num, outputs, n_projects)
+            result_queue.put((process_num, proj_id, n_files, (dt.datetime.now() - proj_start).total_seconds(), tokenizing.metrics.to_dict()))
+    write_progress(tokenizing.PATH_bookkeeping_proj_folder, process_num, outputs, n_projects)
+    if tokenizing.parser_sandbox is not None:
+        tokenizing.parser_sandbox.close()
+
+    if tokenizing.token_counter is not None:
+        tokenizing.token_counter.save(tokenizing.PATH_vocabulary_folder, process_num, manifest.files_per_process.get(process_num, 0) + tokenizing.file_count)
+
+    p_elapsed = (dt.datetime.now() - p_start).total_seconds()
+    print("[INFO] " + 'Process {} finished. {} files in {} s'.format(process_num, tokenizing.file_count, p_elapsed))
 
     # Let parent know
-    global_queue.put((process_num, file_count))
-    sys.exit(0)
-
-
-def start_child(processes, global_queue, proj_paths, batch):
-    # This is a blocking get. If the queue is empty, it waits
-    pid, n_files_processed = global_queue.get()
-    # OK, one of the processes finished. Let's get its data and kill it
-    kill_child(processes, pid, n_files_processed)
-
-    # Get a new batch of project paths ready
-    paths_batch = proj_paths[:batch]
-    del proj_paths[:batch]
-
-    print("[INFO] Starting new process {}".format(pid))
-    p = Process(name='Process ' + str(pid), target=process_projects, args=(pid, paths_batch, processes[pid][1], global_queue))
-    processes[pid][0] = p
-    p.start()
-
-
-def kill_child(processes, pid, n_files_processed):
-    global file_count
-    file_count += n_files_processed
-    if processes[pid][0] is not None:
-        processes[pid][0] = None
-        processes[pid][1] += n_files_processed
-        print("[INFO] Process {} finished, {} files processed {}. Current total: {}".format(pid, n_files_processed, processes[pid][1], file_count))
-
-
-def active_process_count(processes):
-    return len([p for p in processes if p[0] is not None])
+    result_queue.put((process_num, None, tokenizing.file_count, p_elapsed, None))
 
 
 if __name__ == '__main__':
-    # Need to bypass javalang syntax tree traverse limits
-    sys.setrecursionlimit(3000)
-
     read_config()
+    if tokenizing.JAVA_EXTRACTOR != 'fast':
+        # Need to bypass javalang syntax tree traverse limits
+        sys.setrecursionlimit(3000)
     p_start = dt.datetime.now()
 
     proj_paths = []
-    with open(FILE_projects_list, "r", encoding="utf-8") as f:
+    with open(tokenizing.FILE_projects_list, "r", encoding="utf-8") as f:
         proj_paths = f.read().split("\n")
-    proj_paths = list(enumerate(proj_paths, start=1))
+    proj_paths = [(proj_id, proj_path) for proj_id, proj_path in enumerate(proj_paths, start=1) if proj_path]
+    # Chunks of split projects take their file ids above the ones of the processes
+    tasks = plan_tasks(proj_paths, tokenizing.languages.extensions, tokenizing.SPLIT_PROJECT_SIZE, tokenizing.CHUNK_SIZE,
+                       tokenizing.init_file_id + tokenizing.N_PROCESSES * tokenizing.MULTIPLIER)
     # it will diverge the process flow on process_file()
 
-    if os.path.exists(PATH_stats_file_folder) or os.path.exists(PATH_bookkeeping_proj_folder) or os.path.exists(PATH_tokens_file_folder):
-        print('[ERROR] ERROR - Folder [{}] or [{}] or [{}] already exists!'.format(PATH_stats_file_folder, PATH_bookkeeping_proj_folder, PATH_tokens_file_folder))
-        sys.exit(1)
+    output_folders = [tokenizing.PATH_stats_file_folder, tokenizing.PATH_bookkeeping_proj_folder, tokenizing.PATH_tokens_file_folder]
+    manifest = Manifest(tokenizing.PATH_bookkeeping_proj_folder, tokenizing.config_hash)
+    if any(map(os.path.exists, output_folders)):
+        if manifest.load() == 0:
+            print('[ERROR] ERROR - Folder [{}] or [{}] or [{}] already exists and has no manifest to resume from!'.format(*output_folders))
+            sys.exit(1)
+        stale = manifest.stale()
+        if stale:
+            for proj_path, reason in stale:
+                print('[ERROR] Project {} {}'.format(proj_path, reason))
+            print('[ERROR] ERROR - Its rows are already in [{}] and [{}] and [{}], remove these folders to start a clean run'.format(*output_folders))
+            sys.exit(1)
+        # Resuming: drop what was written after the last finished project
+        for folder in output_folders:
+            os.makedirs(folder, exist_ok=True)
+        manifest.truncate_outputs(output_folders)
+        n_tasks = len(tasks)
+        tasks = [(proj_id, proj_path, chunk) for proj_id, proj_path, chunk in tasks if not manifest.is_completed(proj_path, None if chunk is None else chunk.index)]
+        print("[INFO] *** Resuming, {} projects or chunks already processed".format(n_tasks - len(tasks)))
     else:
-        os.makedirs(PATH_stats_file_folder)
-        os.makedirs(PATH_bookkeeping_proj_folder)
-        os.makedirs(PATH_tokens_file_folder)
-
-    # Multiprocessing with N_PROCESSES
-    # [process, file_count]
-    processes = [[None, init_file_id] for i in range(N_PROCESSES)]
-    # The queue for processes to communicate back to the parent (this process)
-    # Initialize it with N_PROCESSES number of (process_id, n_files_processed)
-    global_queue = Queue()
-    for i in range(N_PROCESSES):
-        global_queue.put((i, 0))
-
+        for folder in output_folders:
+            os.makedirs(folder)
+        if os.path.isdir(tokenizing.PATH_vocabulary_folder):
+            remove_counts(tokenizing.PATH_vocabulary_folder)
+    if tokenizing.BUILD_VOCABULARY:
+        os.makedirs(tokenizing.PATH_vocabulary_folder, exist_ok=True)
+
+    # Pool of N_PROCESSES long-lived processes pulling projects one at a time
     print("[INFO] *** Starting regular projects...")
-    while len(proj_paths) > 0:
-        start_child(processes, global_queue, proj_paths, PROJECTS_BATCH)
-
-    print("[INFO] *** No more projects to process. Waiting for children to finish...")
-    while active_process_count(processes) > 0:
-        pid, n_files_processed = global_queue.get()
-        kill_child(processes, pid, n_files_processed)
+    n_processes = min(tokenizing.N_PROCESSES, len(tasks))
+    file_count = 0
+    if n_processes > 0:
+        file_count, metrics = run_pool(n_processes, process_projects, (manifest,), tasks, tokenizing.PROJECTS_BATCH,
+                                       metrics_path=tokenizing.METRICS_FILE)
+        print("[INFO] *** Time per stage:")
+        for line in metrics.summary():
+            print("[INFO] " + line)
+
+    if tokenizing.BUILD_VOCABULARY:
+        # Processes of the previous runs that had nothing left to do
+        for process_num, n_files in manifest.files_per_process.items():
+            if process_num >= n_processes:
+                TokenCounter.resume(tokenizing.PATH_vocabulary_folder, process_num, manifest.records(process_num)).save(tokenizing.PATH_vocabulary_folder, process_num, n_files)
+        n_tokens = write_vocabulary(merge_counts(tokenizing.PATH_vocabulary_folder), tokenizing.PATH_vocabulary_folder)
+        print("[INFO] *** Vocabulary of {} tokens written to {}".format(n_tokens, tokenizing.PATH_vocabulary_folder))
 
     p_elapsed = dt.datetime.now() - p_start
     print("[INFO] *** All done. %s files in %s" % (file_count, p_elapsed))
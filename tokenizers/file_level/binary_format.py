@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""Compact binary alternative to the `@#@` tokens format.
+
+A binary tokens file (`.btokens`) starts with the 6 byte header
+`b'SCCB' + version + kind`, kind being `f` for files or `b` for blocks.
+It is followed by records, each one prefixed by its length as a varint:
+
+    TOKEN  0x01, token id (varint), token text (utf-8, rest of the record)
+    BAG    0x02, proj_id, code_id (varint length + ascii each),
+           total tokens, unique tokens (varints), token hash (16 raw bytes),
+           experimental values (varint length + utf-8, blocks only),
+           then `unique` pairs of token id and count (varints)
+
+Token ids are local to the file: a TOKEN record defines an id before the
+first BAG that uses it, in order of first appearance. Converting a binary
+file back to text gives byte-identical lines.
+
+Usage: python binary_format.py files-tokens-0.btokens [output.tokens]
+"""
+
+import collections
+import io
+import os
+import sys
+
+MAGIC = b'SCCB'
+VERSION = 1
+KIND_FILES = 'f'
+KIND_BLOCKS = 'b'
+HEADER_SIZE = len(MAGIC) + 2
+
+RECORD_TOKEN = 1
+RECORD_BAG = 2
+
+BINARY_EXTENSION = '.btokens'
+TEXT_EXTENSION = '.tokens'
+
+BagRecord = collections.namedtuple('BagRecord', 'proj_id code_id total unique tokens_hash experimental tokens')
+
+
+def encode_varint(value, out):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def read_varint(f):
+    """Varint at the position of the binary file `f`, None at its end."""
+    result = 0
+    shift = 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        result |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            return result
+        shift += 7
+
+
+def read_vocabulary(path, end=None):
+    """Tokens defined in a binary tokens file, in id order, up to the byte
+    offset `end`. Only the TOKEN records are read, the bags are skipped over
+    with their length."""
+    tokens = []
+    with open(path, 'rb') as f:
+        f.seek(HEADER_SIZE)
+        while end is None or f.tell() < end:
+            length = read_varint(f)
+            if length is None:
+                break
+            record = f.read(1)
+            if record[0] == RECORD_TOKEN:
+                data = f.read(length - 1)
+                _, token_pos = decode_varint(data, 0)
+                tokens.append(data[token_pos:].decode('utf-8'))
+            else:
+                f.seek(length - 1, os.SEEK_CUR)
+    return tokens
+
+
+def encode_string(string, out):
+    data = string.encode('utf-8')
+    encode_varint(len(data), out)
+    out += data
+
+
+def decode_string(data, pos):
+    length, pos = decode_varint(data, pos)
+    return bytes(data[pos:pos + length]).decode('utf-8'), pos + length
+
+
+def parse_tokens(tokens):
+    """Split a `@#@token@@::@@count,...` string into (token, count) pairs."""
+    if len(tokens) <= 3:
+        return []
+    result = []
+    for pair in tokens[3:].split(','):
+        token, _, count = pair.rpartition('@@::@@')
+        result.append((token, int(count)))
+    return result
+
+
+def format_tokens(pairs):
+    return '@#@' + ','.join([f'{token}@@::@@{count}' for token, count in pairs])
+
+
+def format_record(record, kind):
+    """Text line (without newline) of a bag record, as the tokenizers write it."""
+    tokens = format_tokens(record.tokens)
+    if kind == KIND_FILES:
+        return f'{record.proj_id},{record.code_id},{record.total},{record.unique}, {record.tokens_hash}{tokens}'
+    line = ','.join([record.proj_id, record.code_id, str(record.total), str(record.unique)])
+    if len(record.experimental) != 0:
+        line += ',' + record.experimental
+    return line + ',' + record.tokens_hash + tokens
+
+
+class BinaryTokensWriter(object):
+    """Writes bag records to a binary tokens file, appending to it if it
+    already exists. Has the file attributes the manifest needs."""
+
+    def __init__(self, path, kind, buffering=io.DEFAULT_BUFFER_SIZE):
+        self.kind = kind
+        self.vocabulary = {}
+        if os.path.isfile(path) and os.path.getsize(path) > 0:
+            self.vocabulary = {token: token_id for token_id, token in enumerate(read_vocabulary(path))}
+            self.file = open(path, 'ab', buffering=buffering)
+        else:
+            self.file = open(path, 'ab', buffering=buffering)
+            self.file.write(MAGIC + bytes([VERSION]) + kind.encode('ascii'))
+        self.name = self.file.name
+
+    def write_bag(self, proj_id, code_id, total, unique, tokens_hash, tokens, experimental=''):
+        """`tokens` is either the formatted `@#@...` string or (token, count) pairs."""
+        if isinstance(tokens, str):
+            tokens = parse_tokens(tokens)
+        out = bytearray()
+        bag = bytearray([RECORD_BAG])
+        encode_string(str(proj_id), bag)
+        encode_string(str(code_id), bag)
+        encode_varint(int(total), bag)
+        encode_varint(int(unique), bag)
+        bag += bytes.fromhex(tokens_hash)
+        encode_string(experimental, bag)
+        vocabulary = self.vocabulary
+        for token, count in tokens:
+            token_id = vocabulary.get(token)
+            if token_id is None:
+                token_id = vocabulary[token] = len(vocabulary)
+                definition = bytearray([RECORD_TOKEN])
+                encode_varint(token_id, definition)
+                definition += token.encode('utf-8')
+                encode_varint(len(definition), out)
+                out += definition
+            encode_varint(token_id, bag)
+            encode_varint(count, bag)
+        encode_varint(len(bag), out)
+        out += bag
+        self.file.write(out)
+
+    def flush(self):
+        self.file.flush()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class BinaryTokensReader(object):
+    """Iterates over the BagRecords of a binary tokens file, or of the part
+    of it between the byte offsets `start` and `end`."""
+
+    def __init__(self, path, start=0, end=None):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.kind = None
+        self.tokens = []
+
+    def __iter__(self):
+        start = max(self.start, HEADER_SIZE)
+        with open(self.path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+            f.seek(start)
+            data = memoryview(f.read() if self.end is None else f.read(self.end - start))
+        if header[:len(MAGIC)] != MAGIC or header[len(MAGIC)] != VERSION:
+            raise ValueError('{} is not a binary tokens file'.format(self.path))
+        self.kind = chr(header[len(MAGIC) + 1])
+        # Ids defined before the start are used by the bags after it
+        tokens = self.tokens = read_vocabulary(self.path, start) if start > HEADER_SIZE else []
+        pos = 0
+        end = len(data)
+        while pos < end:
+            length, pos = decode_varint(data, pos)
+            record_end = pos + length
+            if data[pos] == RECORD_TOKEN:
+                _, token_pos = decode_varint(data, pos + 1)
+                tokens.append(bytes(data[token_pos:record_end]).decode('utf-8'))
+            else:
+                pos += 1
+                proj_id, pos = decode_string(data, pos)
+                code_id, pos = decode_string(data, pos)
+                total, pos = decode_varint(data, pos)
+                unique, pos = decode_varint(data, pos)
+                tokens_hash = bytes(data[pos:pos + 16]).hex()
+                experimental, pos = decode_string(data, pos + 16)
+                pairs = []
+                for _ in range(unique):
+                    token_id, pos = decode_varint(data, pos)
+                    count, pos = decode_varint(data, pos)
+                    pairs.append((tokens[token_id], count))
+                yield BagRecord(proj_id, code_id, total, unique, tokens_hash, experimental, pairs)
+            pos = record_end
+
+
+def tokens_opener(output_format, kind, buffering=io.DEFAULT_BUFFER_SIZE):
+    """Returns the extension of the tokens files and a function opening one."""
+    if output_format == 'binary':
+        return BINARY_EXTENSION, lambda path: BinaryTokensWriter(path, kind, buffering)
+    return TEXT_EXTENSION, lambda path: open(path, 'a+', encoding="utf-8", buffering=buffering)
+
+
+def open_tokens_output(path, output_format, kind):
+    """Open a tokens output file, `path` having no extension."""
+    extension, opener = tokens_opener(output_format, kind)
+    return opener(path + extension)
+
+
+def convert_to_text(binary_path, text_file):
+    reader = BinaryTokensReader(binary_path)
+    for record in reader:
+        text_file.write(format_record(record, reader.kind) + '\n')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], 'w', encoding='utf-8') as output:
+            convert_to_text(sys.argv[1], output)
+    else:
+        convert_to_text(sys.argv[1], sys.stdout)
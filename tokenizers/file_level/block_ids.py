@@ -0,0 +1,42 @@
+"""Block ids of the block-level tokenizer, packed into one 64-bit integer.
+
+A block id holds the id of its file and the index of the block in the file
+(0 for the first block, in the order of the extractor):
+
+    bit 62       always 1, so block ids never collide with file ids, which
+                 share the stats files and the results of the clone detector
+    bits 61..24  file id, up to 2^38 - 1
+    bits 23..0   block index, up to 2^24 - 1 (16,777,216 blocks per file)
+
+Bit 63 stays 0, so the ids fit the signed longs of the clone detector and
+the BIGINT columns of the importers. They are written in decimal, all with
+the same number of digits, and sort by file and then by block.
+"""
+
+BLOCK_INDEX_BITS = 24
+FILE_ID_BITS = 38
+BLOCK_FLAG = 1 << (BLOCK_INDEX_BITS + FILE_ID_BITS)
+MAX_BLOCKS = 1 << BLOCK_INDEX_BITS
+MAX_FILE_ID = (1 << FILE_ID_BITS) - 1
+
+
+def encode_block_id(file_id, block_index):
+    """Block id of the block_index-th block of file_id."""
+    if not 0 <= file_id <= MAX_FILE_ID:
+        raise ValueError(f"file id {file_id} doesn't fit in {FILE_ID_BITS} bits")
+    if not 0 <= block_index < MAX_BLOCKS:
+        raise ValueError(f"block index {block_index} doesn't fit in {BLOCK_INDEX_BITS} bits")
+    return BLOCK_FLAG | (file_id << BLOCK_INDEX_BITS) | block_index
+
+
+def decode_block_id(block_id):
+    """(file id, block index) of a block id, given as an int or a string."""
+    block_id = int(block_id)
+    if not is_block_id(block_id):
+        raise ValueError(f"{block_id} is not a block id")
+    return (block_id >> BLOCK_INDEX_BITS) & MAX_FILE_ID, block_id & (MAX_BLOCKS - 1)
+
+
+def is_block_id(code_id):
+    """True for block ids, False for file ids."""
+    return int(code_id) >> (BLOCK_INDEX_BITS + FILE_ID_BITS) == 1
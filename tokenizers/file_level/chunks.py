@@ -0,0 +1,66 @@
+"""Splitting of very large projects into chunks processed concurrently.
+
+A zip whose code files add up to more than SPLIT_PROJECT_SIZE uncompressed
+bytes, according to its central directory, is split into ranges of its code
+members of about CHUNK_SIZE bytes each. Every chunk is a separate task, so
+several processes work on the same project at once. All the chunks write
+with the proj_id of the project.
+
+File ids of the chunks come from a reserved space above the ids of the
+processes: every split project gets one id per code member, in the order of
+the project list, so they don't depend on which process takes a chunk or on
+how many times the run was resumed.
+"""
+
+import collections
+import os
+import zipfile
+
+Chunk = collections.namedtuple('Chunk', 'index count start end first_file_id')
+
+
+def code_members(zip_file, file_extensions):
+    """Members of an open ZipFile that are tokenized, in archive order."""
+    return [info for info in zip_file.infolist() if os.path.splitext(info.filename)[1] in file_extensions]
+
+
+def split_members(members, chunk_size):
+    """[(start, end)] ranges of members holding about chunk_size bytes each."""
+    ranges = []
+    start = 0
+    size = 0
+    for i, info in enumerate(members):
+        size += info.file_size
+        if size >= chunk_size:
+            ranges.append((start, i + 1))
+            start = i + 1
+            size = 0
+    if start < len(members):
+        ranges.append((start, len(members)))
+    return ranges
+
+
+def plan_tasks(proj_paths, file_extensions, split_size, chunk_size, first_file_id):
+    """Turn [(proj_id, proj_path)] into [(proj_id, proj_path, chunk)] tasks,
+    chunk being None for a project processed at once. The chunks of the
+    split projects come first, so they are spread over all the processes."""
+    if split_size <= 0:
+        return [(proj_id, proj_path, None) for proj_id, proj_path in proj_paths]
+    chunk_tasks = []
+    tasks = []
+    for proj_id, proj_path in proj_paths:
+        members = None
+        if zipfile.is_zipfile(proj_path):
+            with zipfile.ZipFile(proj_path, 'r') as zip_file:
+                members = code_members(zip_file, file_extensions)
+        ranges = []
+        if members is not None and sum(info.file_size for info in members) > split_size:
+            ranges = split_members(members, chunk_size)
+        if len(ranges) < 2:
+            tasks.append((proj_id, proj_path, None))
+            continue
+        print(f"[INFO] Splitting project <{proj_id},{proj_path}> ({len(members)} files) in {len(ranges)} chunks")
+        for index, (start, end) in enumerate(ranges):
+            chunk_tasks.append((proj_id, proj_path, Chunk(index, len(ranges), start, end, first_file_id + start)))
+        first_file_id += len(members)
+    return chunk_tasks + tasks
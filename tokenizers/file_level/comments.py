@@ -0,0 +1,102 @@
+"""Single-pass comment stripper.
+
+The stripper walks the source once, switching between three states: code,
+string literal and comment. It never backtracks, so it runs in linear time
+even on huge minified files, and comment markers inside string literals are
+left alone.
+"""
+
+
+class CommentStripper(object):
+    """Remove comments as described by a `[Language]` config section.
+
+    Tagged comments (`comment_open_tag` ... `comment_close_tag`) are removed
+    together with the newlines inside them, end of line comments
+    (`comment_inline`) are removed up to, but not including, the newline.
+    String literals are delimited by any of `string_delimiters`, honour
+    backslash escapes and end at the end of the line at the latest.
+    """
+
+    def __init__(self, comment_inline, comment_open_tag, comment_close_tag, string_delimiters=('"', "'")):
+        self.comment_inline = comment_inline
+        self.comment_open_tag = comment_open_tag
+        self.comment_close_tag = comment_close_tag
+        self.string_delimiters = [d for d in string_delimiters if d]
+
+        markers = [(d, 'string') for d in self.string_delimiters]
+        if comment_inline:
+            markers.append((comment_inline, 'inline'))
+        if comment_open_tag and comment_close_tag:
+            markers.append((comment_open_tag, 'tagged'))
+        # On a tie the longest marker wins, e.g. ''' over '
+        markers.sort(key=lambda m: len(m[0]), reverse=True)
+        self.kinds = dict(markers)
+        self.markers = [m[0] for m in markers]
+
+    @classmethod
+    def from_config(cls, config, section='Language'):
+        string_delimiters = config.get(section, 'string_delimiters', fallback='" \'').split()
+        return cls(config.get(section, 'comment_inline'),
+                   config.get(section, 'comment_open_tag'),
+                   config.get(section, 'comment_close_tag'),
+                   string_delimiters)
+
+    def strip(self, string):
+        return ''.join([string[start:end] for start, end in self.spans(string)])
+
+    def spans(self, string, literals=None):
+        """(start, end) ranges of string that are kept, in order. The ranges
+        of the string literals are also appended to the list `literals`."""
+        length = len(string)
+        find = string.find
+        # Next known position of every marker. The scan position only moves
+        # forward, so each marker's region is searched at most once.
+        cache = {}
+
+        def next_marker(markers, pos):
+            best, best_marker = length, None
+            for marker in markers:
+                p = cache.get(marker, -2)
+                if p != -1 and p < pos:
+                    p = find(marker, pos)
+                    cache[marker] = p
+                if p != -1 and p < best:
+                    best, best_marker = p, marker
+            return best, best_marker
+
+        result = []
+        pos = 0
+        while pos < length:
+            start, marker = next_marker(self.markers, pos)
+            if marker is None:
+                result.append((pos, length))
+                break
+            if start > pos:
+                result.append((pos, start))
+            kind = self.kinds[marker]
+            if kind == 'inline':
+                end, _ = next_marker(('\n',), start + len(marker))
+                pos = end
+            elif kind == 'tagged':
+                end, _ = next_marker((self.comment_close_tag,), start + len(marker))
+                pos = min(end + len(self.comment_close_tag), length)
+            else:
+                end = self._string_end(next_marker, marker, start + len(marker), length)
+                result.append((start, end))
+                if literals is not None:
+                    literals.append((start, end))
+                pos = end
+        return result
+
+    @staticmethod
+    def _string_end(next_marker, delimiter, pos, length):
+        stops = (delimiter, '\\', '\n')
+        while pos < length:
+            pos, stop = next_marker(stops, pos)
+            if stop is None or stop == '\n':
+                return pos
+            if stop == '\\':
+                pos += 2
+            else:
+                return pos + len(delimiter)
+        return length
@@ -0,0 +1,73 @@
+"""Content-hash cache letting the tokenizer workers skip files whose exact
+content was already tokenized, in any project and by any worker.
+
+The cache shared by the workers is split in shards, each one a dict in a
+manager process of its own, so that the workers don't all wait on one
+manager. Every worker also keeps a local dict in front of it with the
+entries it added or found, which answers the repeated lookups of a worker
+without a round trip to the managers.
+"""
+
+import hashlib
+from multiprocessing import Manager
+
+# Worker processes served by one manager process
+WORKERS_PER_SHARD = 16
+
+
+def content_hash(file_content):
+    """md5 of the raw bytes. For utf-8 content this is the same value as the
+    file hash written to the stats files."""
+    return hashlib.md5(file_content).hexdigest()
+
+
+class DedupCache(object):
+    """Maps a content hash to the (final_stats, final_tokens) of the first
+    file seen with that content.
+
+    `stores` is a list of mappings, the shards, a key going to the shard
+    chosen by its hash; to share the cache between processes pass the dict
+    proxies of create_shared_store. `max_entries` is the share of this
+    worker: once it added that many files it stops adding new ones, but
+    lookups keep working. The entries are counted here, not in the shared
+    stores, and the local dict holds at most as many.
+    """
+
+    def __init__(self, stores, max_entries=0):
+        self.stores = stores if isinstance(stores, list) else [stores]
+        self.max_entries = max_entries
+        self.local = {}
+        self.entries = 0
+        self.hits = 0
+        self.misses = 0
+
+    def shard(self, key):
+        # Keys end with a hex hash, after the language prefix if any
+        return self.stores[int(key[-8:], 16) % len(self.stores)]
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None:
+            value = self.shard(key).get(key)
+            if value is not None and (not self.max_entries or len(self.local) < self.max_entries):
+                self.local[key] = value
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.max_entries and self.entries >= self.max_entries:
+            return
+        self.entries += 1
+        if not self.max_entries or len(self.local) < self.max_entries:
+            self.local[key] = value
+        self.shard(key)[key] = value
+
+
+def create_shared_store(n_processes=1):
+    """Start the manager processes and return them together with the dict
+    proxies, one per shard, that can be handed to the worker processes."""
+    managers = [Manager() for _ in range(max(1, -(-n_processes // WORKERS_PER_SHARD)))]
+    return managers, [manager.dict() for manager in managers]
@@ -0,0 +1,102 @@
+"""Tokenizer engines turning a comment-free source string into a SourcererCC
+token bag.
+
+Every engine produces byte-identical output: the bag keeps the order in which
+tokens first appear and is formatted as `@#@token@@::@@count,...`.
+"""
+
+import collections
+import hashlib
+
+
+def md5_hash(string):
+    m = hashlib.md5()
+    m.update(string.encode("utf-8"))
+    return m.hexdigest()
+
+
+class ReplaceEngine(object):
+    """Original engine: one `str.replace` per separator, then split and count."""
+    name = "replace"
+
+    def __init__(self, separators):
+        self.separators = list(separators)
+
+    def count_tokens(self, string):
+        for x in self.separators:
+            string = string.replace(x, ' ')
+        # Create a list of tokens
+        tokens_list = string.split()
+        # Converting Counter to dict because according to StackOverflow is better
+        return dict(collections.Counter(tokens_list)), len(tokens_list)
+
+    @staticmethod
+    def format_tokens(tokens_bag):
+        return '@#@' + ','.join(['{}@@::@@{}'.format(k, v) for k, v in tokens_bag.items()])
+
+    def tokenize(self, string):
+        tokens_bag, tokens_count_total = self.count_tokens(string)
+        tokens = self.format_tokens(tokens_bag)
+        return tokens_count_total, len(tokens_bag), md5_hash(tokens[3:]), tokens
+
+    def tokenize_batch(self, strings):
+        return [self.tokenize(string) for string in strings]
+
+
+class TranslateEngine(ReplaceEngine):
+    """Single-pass engine: all one-character separators are mapped to spaces by
+    one `str.translate` call and the split result is counted directly.
+
+    Multi-character separators can't be expressed in a translation table, so
+    when the configuration has any of them they are applied with `str.replace`
+    in their configured order, exactly as the original engine does.
+    """
+    name = "translate"
+
+    def __init__(self, separators):
+        super(TranslateEngine, self).__init__(separators)
+        if all(len(x) == 1 for x in self.separators):
+            self.table = str.maketrans(dict.fromkeys(self.separators, ' '))
+            self.separators = []
+        else:
+            self.table = None
+
+    def count_tokens(self, string):
+        if self.table is None:
+            return super(TranslateEngine, self).count_tokens(string)
+        tokens_list = string.translate(self.table).split()
+        tokens_bag = collections.Counter(tokens_list)
+        return tokens_bag, len(tokens_list)
+
+    @staticmethod
+    def format_tokens(tokens_bag):
+        return '@#@' + ','.join([f'{k}@@::@@{v}' for k, v in tokens_bag.items()])
+
+    def tokenize_batch(self, strings):
+        """Tokenize many strings at once, sharing the table and the bound
+        helpers between them. Returns a list of tokenize() results."""
+        table = self.table
+        if table is None:
+            return super(TranslateEngine, self).tokenize_batch(strings)
+        counter = collections.Counter
+        md5 = hashlib.md5
+        result = []
+        append = result.append
+        for string in strings:
+            tokens_list = string.translate(table).split()
+            tokens_bag = counter(tokens_list)
+            tokens = ','.join([f'{k}@@::@@{v}' for k, v in tokens_bag.items()])
+            append((len(tokens_list), len(tokens_bag), md5(tokens.encode("utf-8")).hexdigest(), '@#@' + tokens))
+        return result
+
+
+ENGINES = {
+    ReplaceEngine.name: ReplaceEngine,
+    TranslateEngine.name: TranslateEngine,
+}
+
+
+def get_engine(name, separators):
+    if name not in ENGINES:
+        raise ValueError('Unknown tokenizer engine "{}", expected one of: {}'.format(name, ', '.join(ENGINES)))
+    return ENGINES[name](separators)
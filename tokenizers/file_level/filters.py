@@ -0,0 +1,103 @@
+"""Early rejection of files that are not worth tokenizing.
+
+The checks run from the cheapest to the most expensive, so most rejected
+files are never decompressed:
+
+    too_large          MAX_FILE_SIZE, from the uncompressed size in the zip
+                       central directory (or the tar header, or the file
+                       system)
+    compression_ratio  MAX_COMPRESSION_RATIO, uncompressed / compressed size
+                       of a zip member; generated and minified sources
+                       compress far better than hand written code
+    binary             a NUL byte or invalid UTF-8 in the first PEEK_SIZE
+                       bytes
+    minified           a line longer than MAX_LINE_LENGTH in the first
+                       PEEK_SIZE bytes
+    generated          one of GENERATED_MARKERS in the first PEEK_SIZE bytes
+
+Files that pass but still fail to read or decode are skipped with the
+reasons `read_error` and `decode_error`. Every skipped file is written to
+the `skipped-files-<process>.skipped` side file of the bookkeeping folder,
+as `proj_id,"path",size,reason`.
+"""
+
+import codecs
+
+SKIPPED_NAME = 'skipped-files-{}'
+SKIPPED_EXTENSION = '.skipped'
+
+
+class SkipFile(Exception):
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class FileFilter(object):
+    """A limit of 0, or no markers, disables the corresponding check."""
+
+    def __init__(self, max_file_size=0, max_compression_ratio=0, peek_size=8192, max_line_length=0, generated_markers=()):
+        self.max_file_size = max_file_size
+        self.max_compression_ratio = max_compression_ratio
+        self.peek_size = peek_size
+        self.max_line_length = max_line_length
+        self.generated_markers = [marker.encode('utf-8') for marker in generated_markers]
+
+    @classmethod
+    def from_config(cls, config):
+        markers = config.get('Filters', 'GENERATED_MARKERS', fallback='')
+        return cls(config.getint('Filters', 'MAX_FILE_SIZE', fallback=0),
+                   config.getfloat('Filters', 'MAX_COMPRESSION_RATIO', fallback=0),
+                   config.getint('Filters', 'PEEK_SIZE', fallback=8192),
+                   config.getint('Filters', 'MAX_LINE_LENGTH', fallback=0),
+                   [marker.strip() for marker in markers.split(',') if marker.strip()])
+
+    def check_size(self, size, compressed_size=None):
+        """Reason to skip a file of that size, or None."""
+        if self.max_file_size > 0 and size > self.max_file_size:
+            return 'too_large'
+        if self.max_compression_ratio > 0 and compressed_size and size / compressed_size > self.max_compression_ratio:
+            return 'compression_ratio'
+        return None
+
+    def check_head(self, head):
+        """Reason to skip a file starting with the bytes head, or None."""
+        head = head[:self.peek_size]
+        try:
+            # A character cut at the end of the peek is not an error
+            codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        except UnicodeDecodeError:
+            return 'binary'
+        if b'\0' in head:
+            return 'binary'
+        if self.max_line_length > 0 and max(map(len, head.split(b'\n'))) > self.max_line_length:
+            return 'minified'
+        for marker in self.generated_markers:
+            if marker in head:
+                return 'generated'
+        return None
+
+    def check(self, source_file):
+        """Reason to skip a SourceFile, or None. Only its first bytes are
+        read, and only if the source can peek."""
+        reason = self.check_size(source_file.size, source_file.compressed_size)
+        if reason is None and source_file.peek is not None:
+            reason = self.check_head(source_file.peek(self.peek_size))
+        return reason
+
+    def read(self, source_file, peeked):
+        """Content of a SourceFile, raising SkipFile if it can't be read or
+        its head was not checked yet (`peeked` false) and fails the check."""
+        try:
+            content = source_file.read()
+        except Exception:
+            raise SkipFile('read_error')
+        if not peeked:
+            reason = self.check_head(content)
+            if reason is not None:
+                raise SkipFile(reason)
+        return content
+
+
+def skipped_line(proj_id, path, size, reason):
+    return f'{proj_id},"{path}",{size},{reason}\n'
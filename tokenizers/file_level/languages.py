@@ -0,0 +1,95 @@
+"""Language profiles, so that one pass over a project tokenizes several
+languages.
+
+The `[Language]` section of config.ini is the default profile, and every
+`[Language <name>]` section adds a profile with the same keys:
+File_extensions, separators, comment_inline, comment_open_tag,
+comment_close_tag, string_delimiters and, for the block-level tokenizer,
+BLOCK_EXTRACTOR. Projects are opened once for the extensions of all the
+profiles and each file is tokenized with the profile of its extension, so a
+corpus of Java, Python and C code is decompressed once, not once per
+language.
+
+Clones are only searched within a language, so every profile writes its
+tokens to files of its own, `files-tokens-<name>-N` next to the
+`files-tokens-N` of the default profile. Stats and bookkeeping files are
+shared, the ids being unique across profiles.
+"""
+
+import os
+import re
+
+from .comments import CommentStripper
+
+SECTION = 'Language'
+NAME_RE = re.compile(r'[A-Za-z]\w*')
+# How the block-level tokenizer finds the blocks of a file
+BLOCK_EXTRACTORS = ('java', 'python', 'none')
+
+
+def default_block_extractor(extensions):
+    if '.java' in extensions:
+        return 'java'
+    if '.py' in extensions:
+        return 'python'
+    return 'none'
+
+
+class LanguageProfile(object):
+    def __init__(self, name, extensions, separators, comment_stripper, block_extractor=None):
+        self.name = name
+        self.extensions = extensions
+        self.separators = separators
+        self.comment_stripper = comment_stripper
+        self.block_extractor = block_extractor if block_extractor is not None else default_block_extractor(extensions)
+
+    @classmethod
+    def from_config(cls, config, section=SECTION):
+        name = section[len(SECTION):].strip()
+        if name and not NAME_RE.fullmatch(name):
+            raise ValueError(f'Invalid language name "{name}" in [{section}], expected a letter followed by letters, digits or _')
+        extensions = config.get(section, 'File_extensions').split()
+        # Read raw, the separators include % which is %% in some config files
+        separators = config.get(section, 'separators', raw=True).replace('%%', '%').strip('"').split(' ')
+        block_extractor = config.get(section, 'BLOCK_EXTRACTOR', fallback=default_block_extractor(extensions))
+        if block_extractor not in BLOCK_EXTRACTORS:
+            raise ValueError(f'Unknown BLOCK_EXTRACTOR "{block_extractor}" in [{section}], expected one of: {", ".join(BLOCK_EXTRACTORS)}')
+        return cls(name, extensions, separators, CommentStripper.from_config(config, section), block_extractor)
+
+    def output_name(self, name, process_num=None):
+        """files-tokens-java-3 for the output files-tokens of process 3,
+        files-tokens-3 for the default profile."""
+        if self.name:
+            name = f'{name}-{self.name}'
+        return name if process_num is None else f'{name}-{process_num}'
+
+
+class LanguageRegistry(object):
+    """The profiles of a configuration, by extension."""
+
+    def __init__(self, profiles):
+        self.profiles = profiles
+        self.by_extension = {}
+        for profile in profiles:
+            for extension in profile.extensions:
+                other = self.by_extension.get(extension)
+                if other is not None:
+                    raise ValueError(f'Extension {extension} is in two language profiles: "{other.name}" and "{profile.name}"')
+                self.by_extension[extension] = profile
+        # All the extensions tokenized, for open_source and plan_tasks
+        self.extensions = list(self.by_extension)
+
+    @classmethod
+    def from_config(cls, config):
+        sections = [section for section in config.sections() if section == SECTION or section.startswith(SECTION + ' ')]
+        return cls([LanguageProfile.from_config(config, section) for section in sections])
+
+    def profile_for(self, path):
+        return self.by_extension.get(os.path.splitext(path)[1])
+
+    def default(self):
+        """Profile of the [Language] section, None if there is none."""
+        for profile in self.profiles:
+            if not profile.name:
+                return profile
+        return None
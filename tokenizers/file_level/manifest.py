@@ -0,0 +1,155 @@
+"""Manifest of the projects already tokenized, used to resume a run.
+
+Every worker appends one JSON line to `manifest-<process_num>.jsonl` after a
+project is completely written. The line holds the project path, size and
+mtime, the hash of the configuration and the byte range the project
+occupies in each of the worker's output files. On restart the drivers skip
+the recorded projects and cut every output file back to the end of its last
+recorded project, dropping the tail of a project that was interrupted.
+The chunks of a split project are recorded separately, with their index.
+
+The rows of a project are interleaved with the ones of the other projects
+of its worker, so they can't be taken back once recorded. When a recorded
+project changed on disk, or the configuration changed, the drivers refuse
+to resume and ask for a clean run instead of appending the project again
+under new file ids.
+"""
+
+import glob
+import hashlib
+import json
+import os
+
+MANIFEST_PATTERN = 'manifest-{}.jsonl'
+# Files of the bookkeeping folder that are not tokenizer output
+STATE_PREFIXES = ('manifest-', 'progress-')
+
+
+def file_md5(path):
+    m = hashlib.md5()
+    with open(path, 'rb') as f:
+        m.update(f.read())
+    return m.hexdigest()
+
+
+def output_offsets(files):
+    """Flush the given {name: open file} and return {name: (path, size)}."""
+    offsets = {}
+    for name, f in files.items():
+        f.flush()
+        offsets[name] = (f.name, os.fstat(f.fileno()).st_size)
+    return offsets
+
+
+class Manifest(object):
+    def __init__(self, folder, config_hash):
+        self.folder = folder
+        self.config_hash = config_hash
+        # proj_path, or (proj_path, chunk index) -> record, only for records
+        # whose output is still complete
+        self.completed = {}
+        # process_num -> number of files written by that process
+        self.files_per_process = {}
+        # process_num -> number of projects completed by that process
+        self.projects_per_process = {}
+        # output path -> size at the end of its last complete project
+        self.committed_sizes = {}
+
+    def load(self):
+        """Read all the worker manifests. Returns the number of records.
+
+        A manifest is cut at its first record that is half written or whose
+        output is no longer complete; later projects of that worker were
+        written after it and are processed again too.
+        """
+        count = 0
+        for manifest_path in sorted(glob.glob(os.path.join(self.folder, MANIFEST_PATTERN.format('*')))):
+            offset = 0
+            with open(manifest_path, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line.decode('utf-8'))
+                    except ValueError:
+                        record = None
+                    if record is None or not line.endswith(b'\n'):
+                        print(f"[WARNING] Dropping half written record from {manifest_path}")
+                        break
+                    if not self._outputs_present(record):
+                        print(f"[WARNING] Output of project {record['proj_path']} is incomplete, it will be processed again")
+                        break
+                    self._add(record)
+                    offset += len(line)
+                    count += 1
+            if offset < os.path.getsize(manifest_path):
+                os.truncate(manifest_path, offset)
+        return count
+
+    def _outputs_present(self, record):
+        for path, _, end in record["outputs"].values():
+            if not os.path.isfile(path) or os.path.getsize(path) < end:
+                return False
+        return True
+
+    def _add(self, record):
+        chunk = record.get("chunk")
+        self.completed[record["proj_path"] if chunk is None else (record["proj_path"], chunk)] = record
+        process_num = record["process_num"]
+        self.files_per_process[process_num] = self.files_per_process.get(process_num, 0) + record["files"]
+        self.projects_per_process[process_num] = self.projects_per_process.get(process_num, 0) + 1
+        for path, _, end in record["outputs"].values():
+            self.committed_sizes[path] = max(end, self.committed_sizes.get(path, 0))
+
+    def stale(self):
+        """Recorded projects whose archive changed since they were tokenized
+        or that were tokenized with another configuration."""
+        stale = []
+        for record in self.completed.values():
+            try:
+                stat = os.stat(record["proj_path"])
+            except OSError:
+                continue
+            if record["size"] != stat.st_size or record["mtime"] != stat.st_mtime:
+                stale.append((record["proj_path"], "changed since it was tokenized"))
+            elif record["config_hash"] != self.config_hash:
+                stale.append((record["proj_path"], "was tokenized with another configuration"))
+        return stale
+
+    def records(self, process_num):
+        """Records of a worker, in the order its projects were written."""
+        return [record for record in self.completed.values() if record["process_num"] == process_num]
+
+    def is_completed(self, proj_path, chunk=None):
+        return (proj_path if chunk is None else (proj_path, chunk)) in self.completed
+
+    def truncate_outputs(self, folders):
+        """Cut every output file in `folders` back to its committed size."""
+        for folder in folders:
+            for path in glob.glob(os.path.join(folder, '*')):
+                if not os.path.isfile(path) or os.path.dirname(path) == self.folder and os.path.basename(path).startswith(STATE_PREFIXES):
+                    continue
+                size = self.committed_sizes.get(path, 0)
+                if os.path.getsize(path) > size:
+                    print(f"[INFO] Truncating unfinished output {path} to {size} bytes")
+                    os.truncate(path, size)
+
+    def record(self, process_num, proj_id, proj_path, n_files, start_offsets, end_offsets, chunk=None):
+        if not os.path.exists(proj_path):
+            return
+        stat = os.stat(proj_path)
+        record = {
+            "proj_id": proj_id,
+            "proj_path": proj_path,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "config_hash": self.config_hash,
+            "process_num": process_num,
+            "files": n_files,
+            "outputs": {name: (path, start_offsets[name][1], end) for name, (path, end) in end_offsets.items()}
+        }
+        if chunk is not None:
+            record["chunk"] = chunk
+        manifest_path = os.path.join(self.folder, MANIFEST_PATTERN.format(process_num))
+        with open(manifest_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
@@ -0,0 +1,132 @@
+"""Per-stage timing metrics of the tokenizers.
+
+Stages are timed with `time.perf_counter_ns()` and recorded with
+`Metrics.observe(stage, ns)`, which keeps the count, sum and maximum of the
+stage and a histogram of power of two buckets: bucket `i` counts durations
+below 2**i ns (and at least 2**(i-1) ns). Plain counters (files, dedup hits,
+...) are kept with `Metrics.count(name, n)`.
+
+Workers send the metrics of every finished project to the parent as
+`to_dict()`; the parent merges them and writes a snapshot at every report and
+at exit, as JSON or, for a `.prom` path, in the Prometheus text format so a
+node exporter textfile collector can pick it up.
+"""
+
+import collections
+import json
+import os
+
+STAGES = ('open', 'read', 'decode', 'parse', 'regex', 'separators', 'format', 'hash', 'write')
+N_BUCKETS = 48
+PROMETHEUS_PREFIX = 'sourcerercc_tokenizer'
+
+
+class StageStats(object):
+    __slots__ = ('count', 'total_ns', 'max_ns', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.buckets = [0] * N_BUCKETS
+
+    def quantile(self, q):
+        """Upper bound in ns of the bucket holding the q-quantile."""
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(1 << i, self.max_ns)
+        return self.max_ns
+
+
+class Metrics(object):
+    def __init__(self):
+        self.stages = {}
+        self.counters = collections.Counter()
+
+    def observe(self, stage, ns):
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = self.stages[stage] = StageStats()
+        stats.count += 1
+        stats.total_ns += ns
+        if ns > stats.max_ns:
+            stats.max_ns = ns
+        stats.buckets[min(ns.bit_length(), N_BUCKETS - 1)] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def total_ms(self, stage):
+        stats = self.stages.get(stage)
+        return stats.total_ns / 1e6 if stats is not None else 0.0
+
+    def to_dict(self):
+        return {
+            "stages": {stage: {"count": stats.count, "total_ns": stats.total_ns, "max_ns": stats.max_ns,
+                               "buckets": {str(i): n for i, n in enumerate(stats.buckets) if n}}
+                       for stage, stats in self.stages.items()},
+            "counters": dict(self.counters)
+        }
+
+    def merge(self, data):
+        """Add the metrics of a to_dict() result to these."""
+        for stage, other in data["stages"].items():
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats()
+            stats.count += other["count"]
+            stats.total_ns += other["total_ns"]
+            stats.max_ns = max(stats.max_ns, other["max_ns"])
+            for i, n in other["buckets"].items():
+                stats.buckets[int(i)] += n
+        self.counters.update(data["counters"])
+
+    def _ordered_stages(self):
+        known = [stage for stage in STAGES if stage in self.stages]
+        return known + sorted(stage for stage in self.stages if stage not in STAGES)
+
+    def to_prometheus(self):
+        lines = []
+        name = f'{PROMETHEUS_PREFIX}_stage_seconds'
+        lines.append(f'# HELP {name} Time spent in each tokenizer stage.')
+        lines.append(f'# TYPE {name} histogram')
+        for stage in self._ordered_stages():
+            stats = self.stages[stage]
+            last = max([i for i, n in enumerate(stats.buckets) if n], default=0)
+            cumulative = 0
+            for i in range(last + 1):
+                cumulative += stats.buckets[i]
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{(1 << i) / 1e9:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {stats.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {stats.total_ns / 1e9:g}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {stats.count}')
+        for counter in sorted(self.counters):
+            lines.append(f'# TYPE {PROMETHEUS_PREFIX}_{counter}_total counter')
+            lines.append(f'{PROMETHEUS_PREFIX}_{counter}_total {self.counters[counter]}')
+        return '\n'.join(lines) + '\n'
+
+    def write_snapshot(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            if path.endswith('.prom'):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_dict(), f, indent=1)
+        os.replace(tmp_path, path)
+
+    def summary(self):
+        """Lines with the share of the time taken by every stage."""
+        total_ns = sum(stats.total_ns for stats in self.stages.values())
+        lines = []
+        for stage in self._ordered_stages():
+            stats = self.stages[stage]
+            share = 100.0 * stats.total_ns / total_ns if total_ns else 0.0
+            lines.append(f'{stage:>10}: {stats.total_ns / 1e9:10.3f} s {share:5.1f}%  '
+                         f'{stats.count} calls, p50 <= {stats.quantile(0.5) / 1e3:g} us, '
+                         f'p99 <= {stats.quantile(0.99) / 1e3:g} us, max {stats.max_ns / 1e3:g} us')
+        for counter in sorted(self.counters):
+            lines.append(f'{counter:>10}: {self.counters[counter]}')
+        return lines
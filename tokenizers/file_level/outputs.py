@@ -0,0 +1,145 @@
+"""Output streams of a tokenizer process.
+
+Every process writes three streams (tokens, stats and bookkeeping), each one
+through a large write buffer. With MAX_SHARD_SIZE set, a stream that grew
+past that size is closed at the end of a project and continues in a new
+numbered shard, `files-tokens-<process>-<shard>.tokens`, so a project never
+spans two shards.
+
+FSYNC decides when the data reaches the disk: `none` leaves it to the OS,
+`project` syncs every stream at the end of each project and `shard` syncs a
+shard when it is closed.
+
+At the end of every project each process atomically replaces its
+`progress-<process>.json` in the bookkeeping folder. It lists the finished
+shards, which are complete and never written again, and how many bytes of
+the current shards belong to finished projects, so downstream consumers can
+read them while the tokenizer is still running.
+"""
+
+import glob
+import json
+import os
+import re
+
+BUFFER_SIZE = 1 << 20
+FSYNC_NONE = 'none'
+FSYNC_PROJECT = 'project'
+FSYNC_SHARD = 'shard'
+FSYNC_POLICIES = (FSYNC_NONE, FSYNC_PROJECT, FSYNC_SHARD)
+PROGRESS_PATTERN = 'progress-{}.json'
+
+
+class OutputStream(object):
+    """Sharded, buffered output file. `base_path` is the shard path without
+    shard number and extension. `opener(path)` opens one shard for appending,
+    by default as a text file with a buffer of `buffer_size` bytes."""
+
+    def __init__(self, base_path, extension, opener=None, buffer_size=BUFFER_SIZE, max_bytes=0, fsync=FSYNC_NONE):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError('Unknown FSYNC policy "{}", expected one of: {}'.format(fsync, ', '.join(FSYNC_POLICIES)))
+        self.base_path = base_path
+        self.extension = extension
+        if opener is None:
+            opener = lambda path: open(path, 'a+', encoding="utf-8", buffering=buffer_size)
+        self.opener = opener
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.finished = []
+        self.shard = 0
+        if max_bytes > 0:
+            # Resuming: shards with data were already reported finished, only
+            # an empty last shard is reused
+            shards = sorted(self._existing_shards())
+            if shards:
+                self.shard = shards[-1]
+                if os.path.getsize(self.shard_path(self.shard)) > 0:
+                    self.shard += 1
+                self.finished = [self.shard_path(shard) for shard in shards if shard < self.shard]
+        self.file = opener(self.shard_path(self.shard))
+
+    def _existing_shards(self):
+        pattern = re.compile(re.escape(os.path.basename(self.base_path)) + r'-(\d+)' + re.escape(self.extension) + '$')
+        for path in glob.glob(glob.escape(self.base_path) + '-*' + self.extension):
+            match = pattern.match(os.path.basename(path))
+            if match:
+                yield int(match.group(1))
+
+    def shard_path(self, shard):
+        if self.max_bytes > 0:
+            return f'{self.base_path}-{shard}{self.extension}'
+        return self.base_path + self.extension
+
+    @property
+    def name(self):
+        return self.file.name if self.file is not None else None
+
+    def write(self, data):
+        self.file.write(data)
+
+    def write_bag(self, *args):
+        self.file.write_bag(*args)
+
+    def flush(self):
+        self.file.flush()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def size(self):
+        if self.file is None:
+            return 0
+        self.file.flush()
+        return os.fstat(self.file.fileno()).st_size
+
+    def end_project(self):
+        """Called after a project is completely written, before it is
+        recorded in the manifest."""
+        if self.fsync == FSYNC_PROJECT:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        if self.max_bytes > 0 and self.size() >= self.max_bytes:
+            self._close_shard(self.fsync == FSYNC_SHARD)
+            self.shard += 1
+            self.file = self.opener(self.shard_path(self.shard))
+
+    def _close_shard(self, fsync):
+        self.file.flush()
+        if fsync:
+            os.fsync(self.file.fileno())
+        self.file.close()
+        self.file = None
+        self.finished.append(self.shard_path(self.shard))
+
+    def close(self):
+        """Close the stream, its last shard counts as finished."""
+        if self.file is None:
+            return
+        if self.shard > 0 and self.size() == 0:
+            # Opened after the last rotation and never used
+            self.file.close()
+            self.file = None
+            os.remove(self.shard_path(self.shard))
+            return
+        self._close_shard(self.fsync != FSYNC_NONE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def write_progress(folder, process_num, streams, projects):
+    """Atomically record how far the streams of a process are complete."""
+    progress = {
+        "process_num": process_num,
+        "projects": projects,
+        "streams": {name: {"finished": stream.finished, "current": stream.name, "committed_size": stream.size()}
+                    for name, stream in streams.items()}
+    }
+    path = os.path.join(folder, PROGRESS_PATTERN.format(process_num))
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(progress, f)
+    os.replace(tmp_path, path)
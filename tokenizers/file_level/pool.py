@@ -0,0 +1,115 @@
+"""Long-lived pool of tokenizer processes.
+
+N_PROCESSES workers are started once and pull single projects from a shared
+queue until they get the stop sentinel. A worker that finishes a small
+project immediately takes the next one, so one huge project no longer keeps
+the rest of its batch waiting while other cores are idle.
+
+Workers report every finished project on the result queue as
+`(process_num, proj_id, n_files, seconds, metrics)`, metrics being the
+`Metrics.to_dict()` of that project, and finally send
+`(process_num, None, total_files, seconds, None)` before exiting.
+"""
+
+import datetime as dt
+import queue
+import threading
+import time
+from multiprocessing import Process, Queue
+
+from .metrics import Metrics
+
+REPORT_INTERVAL = 60
+
+
+def worker_tasks(task_queue):
+    """Yield the tasks of a worker until the stop sentinel is received."""
+    while True:
+        task = task_queue.get()
+        if task is None:
+            return
+        yield task
+
+
+def _feed(task_queue, tasks, n_processes):
+    for task in tasks:
+        task_queue.put(task)
+    for _ in range(n_processes):
+        task_queue.put(None)
+
+
+class WorkerStats(object):
+    def __init__(self):
+        self.projects = 0
+        self.files = 0
+        self.busy_seconds = 0.0
+        self.finished = False
+
+    def throughput(self):
+        return self.files / self.busy_seconds if self.busy_seconds > 0 else 0.0
+
+
+def run_pool(n_processes, target, args, tasks, queued_per_process=1, report_interval=REPORT_INTERVAL, metrics_path=None):
+    """Run `target(process_num, task_queue, result_queue, *args)` in
+    n_processes processes over `tasks`. Returns the number of files processed
+    and the Metrics merged from all the processes, which are also written to
+    `metrics_path` at every report if given.
+    """
+    task_queue = Queue(maxsize=max(1, n_processes * queued_per_process))
+    result_queue = Queue()
+    feeder = threading.Thread(target=_feed, args=(task_queue, tasks, n_processes), daemon=True)
+    feeder.start()
+
+    workers = []
+    for process_num in range(n_processes):
+        p = Process(name=f'Process {process_num}', target=target, args=(process_num, task_queue, result_queue) + tuple(args))
+        p.start()
+        workers.append(p)
+
+    stats = [WorkerStats() for _ in range(n_processes)]
+    metrics = Metrics()
+    p_start = time.perf_counter()
+    last_report = p_start
+    running = n_processes
+    while running > 0:
+        try:
+            process_num, proj_id, n_files, seconds, project_metrics = result_queue.get(timeout=1)
+        except queue.Empty:
+            for process_num, p in enumerate(workers):
+                if not stats[process_num].finished and p.exitcode not in (None, 0):
+                    print(f"[ERROR] Process {process_num} died with exit code {p.exitcode}, its current project is left unfinished")
+                    stats[process_num].finished = True
+                    running -= 1
+        else:
+            worker = stats[process_num]
+            if proj_id is None:
+                worker.finished = True
+                running -= 1
+                print(f"[INFO] Process {process_num} finished, {n_files} files in {worker.projects} projects ({worker.throughput():.1f} files/s)")
+            else:
+                worker.projects += 1
+                worker.files += n_files
+                worker.busy_seconds += seconds
+                if project_metrics is not None:
+                    metrics.merge(project_metrics)
+        now = time.perf_counter()
+        if now - last_report >= report_interval:
+            last_report = now
+            report(stats, now - p_start)
+            if metrics_path:
+                metrics.write_snapshot(metrics_path)
+
+    for p in workers:
+        p.join()
+    report(stats, time.perf_counter() - p_start)
+    if metrics_path:
+        metrics.write_snapshot(metrics_path)
+    return sum(worker.files for worker in stats), metrics
+
+
+def report(stats, elapsed):
+    total_files = sum(worker.files for worker in stats)
+    print(f"[INFO] *** {total_files} files in {dt.timedelta(seconds=int(elapsed))} ({total_files / max(elapsed, 1e-9):.1f} files/s)")
+    for process_num, worker in enumerate(stats):
+        state = 'done' if worker.finished else 'running'
+        print(f"[INFO]     Process {process_num} ({state}): {worker.projects} projects, {worker.files} files, {worker.throughput():.1f} files/s")
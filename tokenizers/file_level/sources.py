@@ -0,0 +1,164 @@
+"""Readers of the projects in the project list.
+
+A project can be a zip file, a plain directory, a tarball (optionally
+compressed, read as a stream) or a bare git repository, from which the blobs
+of HEAD are read with `git cat-file --batch`, without a checkout.
+
+`open_source(proj_path, file_extensions)` returns a source whose `files()`
+yields a SourceFile for every code file, in a deterministic order:
+
+    path  path of the file inside the project
+    size  uncompressed size in bytes
+    key   content key known without reading the file (the blob SHA of a git
+          file, used as dedup key), or None
+    read  function returning the content as bytes
+    compressed_size  size in the archive, when the source knows it
+    peek  function returning the first n bytes without reading the whole
+          file, None if the source can't do it cheaply
+"""
+
+import collections
+import functools
+import os
+import subprocess
+import tarfile
+import zipfile
+
+from .chunks import code_members
+
+SourceFile = collections.namedtuple('SourceFile', 'path size key read compressed_size peek', defaults=(None, None))
+
+
+def has_extension(path, file_extensions):
+    return os.path.splitext(path)[1] in file_extensions
+
+
+class ZipSource(object):
+    def __init__(self, path, file_extensions):
+        self.zip_file = zipfile.ZipFile(path, 'r')
+        self.file_extensions = file_extensions
+
+    def _read(self, info, n=-1):
+        with self.zip_file.open(info, 'r') as f:
+            return f.read(n)
+
+    def files(self, chunk=None):
+        members = code_members(self.zip_file, self.file_extensions)
+        if chunk is not None:
+            members = members[chunk.start:chunk.end]
+        for info in members:
+            yield SourceFile(info.filename, info.file_size, None, functools.partial(self._read, info),
+                             info.compress_size, functools.partial(self._read, info))
+
+    def close(self):
+        self.zip_file.close()
+
+
+def read_file(path, n=-1):
+    with open(path, 'rb') as f:
+        return f.read(n)
+
+
+class DirectorySource(object):
+    def __init__(self, path, file_extensions):
+        self.path = path
+        self.file_extensions = file_extensions
+
+    def files(self, chunk=None):
+        for root, dirs, names in os.walk(self.path):
+            dirs[:] = sorted(d for d in dirs if d != '.git')
+            for name in sorted(names):
+                full_path = os.path.join(root, name)
+                if has_extension(name, self.file_extensions) and os.path.isfile(full_path):
+                    yield SourceFile(os.path.relpath(full_path, self.path), os.path.getsize(full_path), None,
+                                     functools.partial(read_file, full_path), None, functools.partial(read_file, full_path))
+
+    def close(self):
+        pass
+
+
+class TarSource(object):
+    """Reads the tarball as a stream, every file must be read before the
+    next one is requested."""
+
+    def __init__(self, path, file_extensions):
+        self.tar_file = tarfile.open(path, 'r|*')
+        self.file_extensions = file_extensions
+
+    def _read(self, member):
+        with self.tar_file.extractfile(member) as f:
+            return f.read()
+
+    def files(self, chunk=None):
+        for member in self.tar_file:
+            if member.isfile() and has_extension(member.name, self.file_extensions):
+                # `tar -C dir .` stores the names as ./path
+                yield SourceFile(os.path.normpath(member.name), member.size, None, functools.partial(self._read, member))
+
+    def close(self):
+        self.tar_file.close()
+
+
+def is_bare_git_repository(path):
+    return all(os.path.exists(os.path.join(path, name)) for name in ('HEAD', 'objects', 'refs'))
+
+
+class GitSource(object):
+    """Blobs of HEAD of a bare repository."""
+
+    def __init__(self, path, file_extensions):
+        self.path = path
+        self.file_extensions = file_extensions
+        self.cat_file = None
+
+    def _git(self, *args):
+        return ['git', '--git-dir', self.path] + list(args)
+
+    def _read(self, sha):
+        if self.cat_file is None:
+            self.cat_file = subprocess.Popen(self._git('cat-file', '--batch'), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.cat_file.stdin.write(sha.encode('ascii') + b'\n')
+        self.cat_file.stdin.flush()
+        header = self.cat_file.stdout.readline().split()
+        if len(header) != 3:
+            raise IOError(f'git cat-file failed on {sha} in {self.path}')
+        content = self.cat_file.stdout.read(int(header[2]))
+        self.cat_file.stdout.read(1)
+        return content
+
+    def files(self, chunk=None):
+        # mode SP type SP sha SP size TAB path NUL
+        listing = subprocess.run(self._git('ls-tree', '-r', '-l', '-z', 'HEAD'), stdout=subprocess.PIPE, check=True).stdout
+        for entry in listing.split(b'\0'):
+            if not entry:
+                continue
+            info, _, path = entry.partition(b'\t')
+            mode, object_type, sha, size = info.split()
+            path = path.decode('utf-8', errors='replace')
+            # symlinks are blobs too, their content is the target path
+            if object_type != b'blob' or mode == b'120000' or not has_extension(path, self.file_extensions):
+                continue
+            sha = sha.decode('ascii')
+            yield SourceFile(path, int(size), 'git:' + sha, functools.partial(self._read, sha))
+
+    def close(self):
+        if self.cat_file is not None:
+            self.cat_file.stdin.close()
+            self.cat_file.wait()
+            self.cat_file.stdout.close()
+            self.cat_file = None
+
+
+def open_source(proj_path, file_extensions):
+    """Source of the project at proj_path, or None if it is not supported."""
+    if os.path.isdir(proj_path):
+        if is_bare_git_repository(proj_path):
+            return GitSource(proj_path, file_extensions)
+        return DirectorySource(proj_path, file_extensions)
+    if not os.path.isfile(proj_path):
+        return None
+    if zipfile.is_zipfile(proj_path):
+        return ZipSource(proj_path, file_extensions)
+    if tarfile.is_tarfile(proj_path):
+        return TarSource(proj_path, file_extensions)
+    return None
@@ -1,13 +1,54 @@
+import argparse
+import configparser
+import importlib
+import io
+import json
+import os
 import re
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
 import unittest
+import zipfile
 
+from ..block_level import fast_java_functions
+from ..block_level import file_view
+from ..block_level import python_comments
+from ..block_level import windows
+from . import binary_format
+from . import block_ids
+from . import chunks
+from . import comments
+from . import dedup
+from . import engines
+from . import filters
+from . import languages
+from . import manifest
+from . import metrics
+from . import outputs
+from . import sources
 from . import tokenizing
+from . import vocabulary
 
 
 REGEX = re.compile('.+@@::@@\d+')
+REPO = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 tokenizing.read_config()
 
 
+def import_from(folder, name):
+    """Import a script of the repository that is not part of a package."""
+    sys.path.insert(0, folder)
+    try:
+        return importlib.import_module(name)
+    finally:
+        sys.path.remove(folder)
+
+
 class TestParser(unittest.TestCase):
     # Input is something like: @#@print@@::@@1,include@@::@@1,sys@@::@@1
     def assert_common_properties(self, list_tokens_string):
@@ -116,6 +157,670 @@ class TestParser(unittest.TestCase):
 
         self.assertEqual(tokenizing.md5_hash(tokens[3:]), token_hash)
 
+    def test_engines_agree(self):
+        strings = ["", "a", "  a.b(c) + a->b[0] %s\"x\" 'y' #z$w\\q~!",
+                   "printf(\"%s\", \"asciiじゃない文字\");\nfoo = bar + baz * foo;"]
+        separators = tokenizing.language_config["separators"]
+        replace_engine = engines.get_engine("replace", separators)
+        translate_engine = engines.get_engine("translate", separators)
+        for string in strings:
+            self.assertEqual(replace_engine.tokenize(string), translate_engine.tokenize(string))
+        self.assertEqual(translate_engine.tokenize_batch(strings), [replace_engine.tokenize(s) for s in strings])
+
+    def test_multichar_separators(self):
+        separators = ["a", "ab", "."]
+        strings = ["abc.ab", "xaby.z"]
+        self.assertEqual(engines.get_engine("translate", separators).tokenize_batch(strings),
+                         engines.get_engine("replace", separators).tokenize_batch(strings))
+
+    def test_files_tokenized_in_batches(self):
+        contents = [b'int a = 1; // x', b'a(b, c);', b'int a = 1; // x', b'/* only */']
+        batches = []
+        engine = tokenizing.tokenizer_engine
+
+        class RecordingEngine(object):
+            def tokenize_batch(self, strings):
+                batches.append(len(strings))
+                return engine.tokenize_batch(strings)
+
+        tokenizing.tokenizer_engine, tokenizing.language_engines[''] = RecordingEngine(), RecordingEngine()
+        tokenizing.dedup_cache = dedup.DedupCache({}, max_entries=10)
+        try:
+            tokens_file, stats_file = io.StringIO(), io.StringIO()
+            batch = tokenizing.FileBatch(stats_file, 3)
+            for file_id, content in enumerate(contents, start=1):
+                batch.add(content, '1', file_id, 'p.zip', f'{file_id}.c', str(len(content)), tokens_file)
+            self.assertEqual(len(tokens_file.getvalue().splitlines()), 3)
+            batch.flush()
+        finally:
+            tokenizing.tokenizer_engine, tokenizing.language_engines[''] = engine, engine
+            tokenizing.dedup_cache = None
+
+        # The third file has the content of the first one, in the same batch
+        self.assertEqual(batches, [2, 1])
+        # Same lines as tokenizing every file on its own, in the order added
+        expected = []
+        for file_id, content in enumerate(contents, start=1):
+            (total, unique, tokens_hash, tokens) = tokenizing.tokenize_files(content.decode('utf-8'))[1]
+            expected.append(f'1,{file_id},{total},{unique}, {tokens_hash}{tokens}')
+        self.assertEqual(tokens_file.getvalue().splitlines(), expected)
+
+    def test_comment_markers_in_strings(self):
+        stripper = comments.CommentStripper('//', '/*', '*/')
+        self.assertEqual(stripper.strip('url = "http://x/*y*/"; // tail\nc = \'"\'; /* a\n b */ d'),
+                         'url = "http://x/*y*/"; \nc = \'"\';  d')
+        self.assertEqual(stripper.strip('s = "a\\"// b"; t'), 's = "a\\"// b"; t')
+        self.assertEqual(stripper.strip('s = "open\n// comment'), 's = "open\n')
+        self.assertEqual(stripper.strip('a /* never closed\n b'), 'a ')
+
+    def test_longest_comment_marker_wins(self):
+        stripper = comments.CommentStripper('#', "'''", "'''")
+        self.assertEqual(stripper.strip("x = 'a#b' # c\n'''doc\nstring'''\ny"), "x = 'a#b' \n\ny")
+
+    def test_string_literal_comments(self):
+        input_str = 'String url = "http://example.com"; // comment'
+        (final_stats, final_tokens, _) = tokenizing.tokenize_files(input_str)
+        (_, _, _, SLOC) = final_stats
+        (_, _, _, tokens) = final_tokens
+
+        self.assertEqual(SLOC, 1)
+        self.assertIn('example@@::@@1', tokens[3:].split(','))
+        self.assertNotIn('comment@@::@@1', tokens[3:].split(','))
+
+    def test_dedup_cache_shards(self):
+        stores = [{}, {}]
+        first, second = dedup.DedupCache(stores, max_entries=2), dedup.DedupCache(stores, max_entries=2)
+        keys = [dedup.content_hash(str(i).encode()) for i in range(3)]
+        for key in keys:
+            first.put(key, key.upper())
+        # Only its share of entries, spread over the shards
+        self.assertEqual(sum(map(len, stores)), 2)
+        self.assertTrue(all(stores))
+        self.assertEqual([second.get(key) for key in keys], [keys[0].upper(), keys[1].upper(), None])
+        self.assertEqual((second.hits, second.misses), (2, 1))
+        # Later lookups are answered by the local dict
+        stores[0].clear()
+        stores[1].clear()
+        self.assertEqual(second.get(keys[0]), keys[0].upper())
+
+    def test_dedup_cache_reuses_tokens(self):
+        tokenizing.dedup_cache = dedup.DedupCache({}, max_entries=10)
+        try:
+            tokens_file, stats_file = io.StringIO(), io.StringIO()
+            content = 'int main() { return 0; } // main'.encode('utf-8')
+            tokenizing.process_file_contents(content, '1', 1, 'p.zip', 'a.c', '32', tokens_file, stats_file)
+            tokenizing.process_file_contents(content, '2', 2, 'q.zip', 'a.c', '32', tokens_file, stats_file)
+        finally:
+            cache, tokenizing.dedup_cache = tokenizing.dedup_cache, None
+
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        first, second = tokens_file.getvalue().splitlines()
+        self.assertEqual(first.split(',', 2)[2], second.split(',', 2)[2])
+        self.assertTrue(second.startswith('2,2,'))
+        self.assertIn(dedup.content_hash(content), stats_file.getvalue().splitlines()[1])
+
+
+    def test_binary_format_round_trip(self):
+        string = 'int main() { printf("じゃない"); return main(0); }'
+        (_, (total, unique, tokens_hash, tokens), _) = tokenizing.tokenize_files(string)
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'files-tokens-0')
+            with binary_format.open_tokens_output(path, 'binary', binary_format.KIND_FILES) as writer:
+                writer.write_bag('1', 7, total, unique, tokens_hash, tokens)
+            # Appending reuses the vocabulary already in the file
+            self.assertEqual(binary_format.read_vocabulary(path + binary_format.BINARY_EXTENSION),
+                             [token for token, _ in binary_format.parse_tokens(tokens)])
+            with binary_format.open_tokens_output(path, 'binary', binary_format.KIND_FILES) as writer:
+                writer.write_bag('2', 8, total, unique, tokens_hash, tokens)
+            text = io.StringIO()
+            binary_format.convert_to_text(path + binary_format.BINARY_EXTENSION, text)
+
+        self.assertEqual(text.getvalue().splitlines(), [f'{proj_id},{file_id},{total},{unique}, {tokens_hash}{tokens}'
+                                                        for proj_id, file_id in (('1', 7), ('2', 8))])
+
+
+    def test_vocabulary_ordered_by_frequency(self):
+        with tempfile.TemporaryDirectory() as folder:
+            for process_num, tokens in enumerate(['@#@b@@::@@2,a@@::@@1', '@#@a@@::@@2,c@@::@@4,Z@@::@@1', '@#@']):
+                counter = vocabulary.TokenCounter()
+                counter.add(tokens)
+                counter.files = 1
+                counter.dump(os.path.join(folder, vocabulary.COUNTS_PATTERN.format(process_num)))
+            self.assertEqual(vocabulary.TokenCounter.resume(folder, 1, [{"files": 1, "outputs": {}}]).counts, {'a': 2, 'c': 4, 'Z': 1})
+            vocabulary.write_vocabulary(vocabulary.merge_counts(folder), folder)
+            with open(os.path.join(folder, vocabulary.VOCABULARY_FILE)) as f:
+                vocabulary_lines = f.read().splitlines()
+            with open(os.path.join(folder, vocabulary.WFM_FILE)) as f:
+                wfm_lines = f.read().splitlines()
+
+        self.assertEqual(vocabulary_lines, ['0,4,c', '1,3,a', '2,2,b', '3,1,Z'])
+        self.assertEqual(wfm_lines, ['Z:1', 'a:3', 'b:2', 'c:4'])
+
+
+    def test_vocabulary_resume_counts_recorded_projects(self):
+        with tempfile.TemporaryDirectory() as folder:
+            for output_format in ('text', 'binary'):
+                path = os.path.join(folder, 'files-tokens-' + output_format)
+                records = []
+                with binary_format.open_tokens_output(path, output_format, binary_format.KIND_FILES) as tokens_file:
+                    for proj_id, tokens in enumerate([[('a', 1)], [('a', 2), ('b', 1)], [('b', 3)]], start=1):
+                        start = manifest.output_offsets({"tokens": tokens_file})
+                        total, unique = sum(count for _, count in tokens), len(tokens)
+                        if output_format == 'binary':
+                            tokens_file.write_bag(proj_id, proj_id, total, unique, '0' * 32, tokens)
+                        else:
+                            tokens_file.write(f'{proj_id},{proj_id},{total},{unique}, {"0" * 32}{binary_format.format_tokens(tokens)}\n')
+                        end = manifest.output_offsets({"tokens": tokens_file})
+                        records.append({"files": 1, "outputs": {name: (path, start[name][1], end) for name, (path, end) in end.items()}})
+                        if proj_id == 1:
+                            counter = vocabulary.TokenCounter()
+                            counter.counts['a'] = 1
+                            counter.save(folder, 0, 1)
+
+                # The projects written after the counts were saved are counted from the tokens file
+                counter = vocabulary.TokenCounter.resume(folder, 0, records)
+                self.assertEqual((output_format, counter.files, counter.counts), (output_format, 3, {'a': 3, 'b': 4}))
+
+    def test_metrics_merge_and_buckets(self):
+        worker = metrics.Metrics()
+        worker.observe('regex', 1500)
+        worker.observe('regex', 3000000)
+        worker.count('files', 2)
+        total = metrics.Metrics()
+        total.merge(worker.to_dict())
+        total.merge(worker.to_dict())
+
+        regex = total.stages['regex']
+        self.assertEqual((regex.count, regex.total_ns, regex.max_ns), (4, 6003000, 3000000))
+        self.assertEqual(regex.buckets[(1500).bit_length()], 2)
+        self.assertEqual(total.counters['files'], 4)
+        self.assertEqual(total.total_ms('regex'), 6.003)
+        prometheus = total.to_prometheus()
+        self.assertIn('sourcerercc_tokenizer_stage_seconds_bucket{stage="regex",le="+Inf"} 4', prometheus)
+        self.assertIn('sourcerercc_tokenizer_files_total 4', prometheus)
+
+
+    def test_output_stream_rotates_between_projects(self):
+        with tempfile.TemporaryDirectory() as folder:
+            base_path = os.path.join(folder, 'files-tokens-0')
+            with outputs.OutputStream(base_path, '.tokens', max_bytes=10) as stream:
+                stream.write('0123456789ab\n')
+                stream.end_project()
+                stream.write('short\n')
+                stream.end_project()
+                outputs.write_progress(folder, 0, {"tokens": stream}, 2)
+                with open(os.path.join(folder, 'progress-0.json')) as f:
+                    progress = json.load(f)["streams"]["tokens"]
+            self.assertEqual(progress["finished"], [base_path + '-0.tokens'])
+            self.assertEqual((progress["current"], progress["committed_size"]), (base_path + '-1.tokens', 6))
+
+            # A resumed stream doesn't append to shards already reported finished
+            with outputs.OutputStream(base_path, '.tokens', max_bytes=10) as stream:
+                self.assertEqual(stream.name, base_path + '-2.tokens')
+                self.assertEqual(len(stream.finished), 2)
+            self.assertEqual(sorted(os.listdir(folder)), ['files-tokens-0-0.tokens', 'files-tokens-0-1.tokens', 'progress-0.json'])
+
+
+    def test_manifest_resume(self):
+        with tempfile.TemporaryDirectory() as folder:
+            project, output = os.path.join(folder, 'p.zip'), os.path.join(folder, 'output')
+            tokens_path = os.path.join(output, 'files-tokens-0.tokens')
+            os.mkdir(output)
+            with zipfile.ZipFile(project, 'w') as z:
+                z.writestr('a.c', 'int a;')
+            with open(tokens_path, 'w') as tokens:
+                tokens.write('1,1,@#@a@@::@@1\n')
+                start = manifest.output_offsets({"tokens": tokens})
+                tokens.write('1,2,@#@b@@::@@1\n')
+                manifest.Manifest(output, 'config').record(0, 1, project, 1, start, manifest.output_offsets({"tokens": tokens}))
+                # Interrupted in the middle of the next project
+                tokens.write('2,3,@#@c')
+
+            resumed = manifest.Manifest(output, 'config')
+            self.assertEqual(resumed.load(), 1)
+            resumed.truncate_outputs([output])
+            with open(tokens_path) as f:
+                self.assertEqual(f.read(), '1,1,@#@a@@::@@1\n1,2,@#@b@@::@@1\n')
+            self.assertTrue(resumed.is_completed(project))
+            self.assertEqual((resumed.files_per_process, resumed.stale()), ({0: 1}, []))
+
+            # Its rows can't be taken back, so a changed configuration or project is reported
+            other_config = manifest.Manifest(output, 'other')
+            other_config.load()
+            self.assertEqual(other_config.stale(), [(project, 'was tokenized with another configuration')])
+            with zipfile.ZipFile(project, 'a') as z:
+                z.writestr('b.c', 'int b;')
+            self.assertEqual(resumed.stale(), [(project, 'changed since it was tokenized')])
+
+    def test_large_projects_split_in_chunks(self):
+        with tempfile.TemporaryDirectory() as folder:
+            small, big = os.path.join(folder, 'small.zip'), os.path.join(folder, 'big.zip')
+            with zipfile.ZipFile(small, 'w') as z:
+                z.writestr('a.c', 'x' * 100)
+            with zipfile.ZipFile(big, 'w') as z:
+                for i in range(5):
+                    z.writestr(f'{i}.c', 'x' * 100)
+                    z.writestr(f'{i}.txt', 'x' * 1000)
+            tasks = chunks.plan_tasks([(1, small), (2, big), (3, small)], ['.c'], 150, 200, 1000)
+
+        self.assertEqual([(proj_id, chunk) for proj_id, _, chunk in tasks],
+                         [(2, chunks.Chunk(0, 3, 0, 2, 1000)), (2, chunks.Chunk(1, 3, 2, 4, 1002)),
+                          (2, chunks.Chunk(2, 3, 4, 5, 1004)), (1, None), (3, None)])
+
+    def test_project_sources(self):
+        files = {'src/a.c': b'int a;', 'src/b/b.c': b'int b;', 'README': b'text'}
+        with tempfile.TemporaryDirectory() as folder:
+            directory = os.path.join(folder, 'project')
+            for path, content in files.items():
+                os.makedirs(os.path.dirname(os.path.join(directory, path)), exist_ok=True)
+                with open(os.path.join(directory, path), 'wb') as f:
+                    f.write(content)
+            zip_path, tar_path = os.path.join(folder, 'project.zip'), os.path.join(folder, 'project.tar.gz')
+            with zipfile.ZipFile(zip_path, 'w') as z:
+                for path, content in sorted(files.items()):
+                    z.writestr(path, content)
+            with tarfile.open(tar_path, 'w:gz') as t:
+                for path in sorted(files):
+                    t.add(os.path.join(directory, path), path)
+            paths = [zip_path, tar_path, directory]
+
+            if shutil.which('git'):
+                git = ['git', '-C', directory, '-c', 'user.name=t', '-c', 'user.email=t@t']
+                subprocess.run(git + ['init', '-q'], check=True)
+                subprocess.run(git + ['add', '.'], check=True)
+                subprocess.run(git + ['commit', '-q', '-m', 'files'], check=True)
+                bare = os.path.join(folder, 'project.git')
+                subprocess.run(['git', 'clone', '-q', '--bare', directory, bare], check=True)
+                paths.append(bare)
+
+            for path in paths:
+                source = sources.open_source(path, ['.c'])
+                try:
+                    read = [(f.path, f.size, f.read()) for f in source.files()]
+                finally:
+                    source.close()
+                self.assertEqual(read, [('src/a.c', 6, b'int a;'), ('src/b/b.c', 6, b'int b;')], path)
+            self.assertIsNone(sources.open_source(os.path.join(directory, 'README'), ['.c']))
+
+
+    def test_file_filter(self):
+        file_filter = filters.FileFilter(max_file_size=1000, max_compression_ratio=10, peek_size=16, max_line_length=10,
+                                         generated_markers=['@generated'])
+        self.assertEqual(file_filter.check_size(2000, 1000), 'too_large')
+        self.assertEqual(file_filter.check_size(1000, 50), 'compression_ratio')
+        self.assertIsNone(file_filter.check_size(1000, 500))
+        self.assertEqual(file_filter.check_head(b'ab\0cd'), 'binary')
+        self.assertEqual(file_filter.check_head(b'\xff\xfeab'), 'binary')
+        # A multi-byte character cut by the peek is fine
+        self.assertIsNone(file_filter.check_head('int a;\nint \u00e9'.encode('utf-8')[:12]))
+        self.assertEqual(file_filter.check_head(b'x' * 11), 'minified')
+        self.assertEqual(file_filter.check_head(b'// \n@generated'), 'generated')
+        self.assertIsNone(filters.FileFilter().check_head(b'x' * 100000))
+
+        # Without peek, the head is checked once read
+        source_file = sources.SourceFile('a.c', 5, None, lambda: b'a\0bcd')
+        self.assertIsNone(file_filter.check(source_file))
+        with self.assertRaises(filters.SkipFile) as skip:
+            file_filter.read(source_file, False)
+        self.assertEqual(skip.exception.reason, 'binary')
+        self.assertEqual(file_filter.read(source_file, True), b'a\0bcd')
+
+
+    def test_fast_java_functions(self):
+        java = """package a.b;
+public class Foo {
+    @Override
+    public int bar(int x, String[] y, java.util.List<String> z) {
+        String s = "}{"; char c = '}'; /* } */
+    }
+    abstract void abs();
+    class Inner { void baz() { Runnable r = new Runnable() { public void run() { } }; } }
+    enum E { A { void f() {} }, B; void g() {} }
+    Runnable field = () -> { };
+}
+"""
+        block_linenos, blocks, names = fast_java_functions.get_functions(java, 'Foo.java')
+        self.assertEqual(list(zip(block_linenos, names)),
+                         [((4, 6), 'a.b.Foo.bar(int,String[],java.util.List)'), ((7, 7), 'a.b.Foo.abs()'),
+                          ((8, 8), 'a.b.Foo$Inner.baz()'), ((8, 8), 'a.b.Foo$Inner$Runnable.run()'),
+                          ((9, 9), 'a.b.Foo$E$A.f()'), ((9, 9), 'a.b.Foo$E.g()')])
+        self.assertTrue(blocks[0].startswith('    public int bar(') and blocks[0].endswith('    }'))
+        for broken in ('class A { void f() { }', 'class A { void f() { "x }', 'class A { # }'):
+            with self.assertRaises(fast_java_functions.AmbiguousSource):
+                fast_java_functions.get_functions(broken, 'A.java')
+
+
+    def test_class_namer(self):
+        namer = fast_java_functions.ClassNamer()
+        self.assertEqual([namer.name(key, name) for key, name in [(1, 'A'), (2, 'B'), (3, 'A'), (1, 'A'), (4, 'A')]],
+                         ['A', 'B', 'A_0', 'A', 'A_1'])
+        java = 'class A { class B { class A { void f() {} } } }\nclass C { void g() { new B() { void h() {} }; } }'
+        self.assertEqual(fast_java_functions.get_functions(java, 'A.java')[2],
+                         ['JHawkDefaultPackage.A$B$A_0.f()', 'JHawkDefaultPackage.C.g()', 'JHawkDefaultPackage.C$B_0.h()'])
+
+    def test_file_view_blocks(self):
+        stripper = comments.CommentStripper('//', '/*', '*/')
+        java = 'class A {\n  /* one\n  two */\n  int f(a.b c) {\n\n    return c; // done\n  }\n}'
+        view = file_view.FileView(java, stripper, '; . ( ) { }')
+        self.assertEqual(view.tokens(4, 7), ({'int': 1, 'f': 1, 'a': 1, 'b': 1, 'c': 2, 'return': 1}, 7))
+        self.assertEqual(view.stats(4, 7), (3, 3))
+        self.assertEqual(view.stats(1, 8), (7, 5))
+        # A method starting on the line that closes a comment: the end of the
+        # comment is left out, where stripping the block alone kept it as code
+        java_after_comment = '/* see\n   below */ int g() {\n  return 1;\n}'
+        view_after_comment = file_view.FileView(java_after_comment, stripper, '; . ( ) { }')
+        self.assertEqual(view_after_comment.tokens(2, 4), ({'int': 1, 'g': 1, 'return': 1, '1': 1}, 4))
+        self.assertEqual(view_after_comment.stats(2, 4), (3, 3))
+        self.assertIn('below */', stripper.strip('   below */ int g() {\n  return 1;\n}'))
+
+    def test_python_comments(self):
+        fallback = comments.CommentStripper('#', "'''", "'''", ['"', "'"])
+        stripper = python_comments.PythonCommentStripper(fallback)
+        source = 'def f(a):\n    """Usage:\n    # not a comment\n    """\n    s = "#x"  # comment\n    \'\'\'doc\'\'\'\n    return a\n'
+        self.assertEqual(stripper.strip(source), 'def f(a):\n    """Usage:\n    # not a comment\n    """\n    s = "#x"  \n    \n    return a\n')
+        view = file_view.FileView(source, stripper, '( ) : = "')
+        self.assertEqual(view.tokens(1, 7), ({'def': 1, 'f': 1, 'a': 3, 'Usage': 1, '#': 1, 'not': 1, 'comment': 1, 's': 1, '#x': 1, 'return': 1}, 12))
+        # Not Python, left to the generic stripper
+        self.assertEqual(stripper.strip('x = """\n# c'), fallback.strip('x = """\n# c'))
+
+    def test_block_ids(self):
+        block_id = block_ids.encode_block_id(123456789, 95000)
+        self.assertEqual(block_ids.decode_block_id(str(block_id)), (123456789, 95000))
+        self.assertTrue(block_ids.is_block_id(block_id))
+        self.assertFalse(block_ids.is_block_id(123456789))
+        self.assertLess(block_ids.encode_block_id(block_ids.MAX_FILE_ID, block_ids.MAX_BLOCKS - 1), 1 << 63)
+        # Same number of digits, ordered by file and then by block
+        ids = [block_ids.encode_block_id(f, b) for f, b in [(1, 2), (1, 10), (2, 0), (50000001, 0)]]
+        self.assertEqual(sorted(ids), ids)
+        self.assertEqual(len({len(str(i)) for i in ids}), 1)
+        with self.assertRaises(ValueError):
+            block_ids.encode_block_id(1, block_ids.MAX_BLOCKS)
+        with self.assertRaises(ValueError):
+            block_ids.decode_block_id(42)
+
+    def test_parser_sandbox(self):
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        try:
+            from block_level.parser_sandbox import ParserSandbox
+        finally:
+            sys.path.pop(0)
+        sandbox = ParserSandbox(2, 1 << 30)
+        try:
+            self.assertEqual(sandbox.run(len, 'abc'), 3)
+            reasons = []
+            for function, arg in [(time.sleep, 5), (bytearray, 1 << 34), (os._exit, 1), (int, 'x')]:
+                try:
+                    sandbox.run(function, arg)
+                except Exception as e:
+                    reasons.append(e.reason)
+            self.assertEqual(reasons, ['parse_timeout', 'parse_memory', 'parse_crash', 'parse_error'])
+            # Still usable after every failure
+            self.assertEqual(sandbox.run(len, 'abcd'), 4)
+        finally:
+            sandbox.close()
+
+    def test_sliding_windows(self):
+        stripper = comments.CommentStripper('//', '/*', '*/')
+        java = 'a(b,\n  c);\n// x\n\nd e;\nf;\ng g;'
+        view = file_view.FileView(java, stripper, '; ( ) ,')
+        self.assertEqual([u[:2] for u in windows.units(view, 'lines')], [(1, 1), (2, 2), (5, 5), (6, 6), (7, 7)])
+        self.assertEqual([u[:2] for u in windows.units(view, 'statements')], [(1, 2), (5, 5), (6, 6), (7, 7)])
+        # Brackets in string literals don't open a statement
+        java_literals = file_view.FileView('if (c == \'(\') {\n  s = "[(";\n}\na;\nb;\nc;\nd;', stripper, '; ( ) ,')
+        self.assertEqual([u[:2] for u in windows.units(java_literals, 'statements')], [(i, i) for i in range(1, 8)])
+        python_stripper = python_comments.PythonCommentStripper(comments.CommentStripper('#', "'''", "'''"))
+        python_literals = file_view.FileView('x = """(\n"""\ny = f(\n  1)\nz = 2', python_stripper, '( ) =')
+        self.assertEqual([u[:2] for u in windows.units(python_literals, 'statements')], [(1, 1), (2, 2), (3, 4), (5, 5)])
+        self.assertEqual(windows.window_starts(5, 2, 2), [0, 2, 3])
+        result = [(start, end, dict(bag.bag), bag.total, bag.hexdigest()) for start, end, bag in windows.windows(view, 2, 2)]
+        self.assertEqual([r[:4] for r in result], [(1, 2, {'a': 1, 'b': 1, 'c': 1}, 3),
+                                                  (5, 6, {'d': 1, 'e': 1, 'f': 1}, 3),
+                                                  (6, 7, {'f': 1, 'g': 2}, 3)])
+        # The rolled hash is the hash of the bag built from scratch
+        bag = windows.RollingBag()
+        bag.add(['g', 'f', 'g'])
+        self.assertEqual(result[2][4], bag.hexdigest())
+
+    def test_archive_file_names(self):
+        prettify_results = import_from(REPO, 'prettify_results')
+        # The archive of the default branch unpacks to <repo>-<branch or commit>/
+        self.assertEqual(prettify_results.get_file_name('"/data/Mondego--SourcererCC.zip/SourcererCC-master/a/B.java"'),
+                         'Mondego/SourcererCC/tree/master/a/B.java')
+        self.assertEqual(prettify_results.get_file_name('/data/o--my-repo.zip/my-repo-main/tree/B.java'),
+                         'o/my-repo/tree/main/tree/B.java')
+        self.assertEqual(prettify_results.get_file_name('o--r.zip/r-3f2a9c1/B.java'), 'o/r/tree/3f2a9c1/B.java')
+
+    def test_pipeline_channel(self):
+        run = import_from(REPO, 'run')
+        channel = run.Channel(2, 2)
+        channel.put('a')
+        channel.close()
+        self.assertEqual(channel.get(), 'a')
+        # One producer still open
+        self.assertIs(channel.get(0.01), run.EMPTY)
+        channel.close()
+        self.assertIs(channel.get(), run.END)
+        # A failed producer cancels the consumer, even with items left
+        failed = run.Channel(2, 1)
+        failed.put('a')
+        failed.close(failed=True)
+        with self.assertRaises(run.UpstreamFailed):
+            failed.get()
+        # A producer blocked on a full channel goes on once its consumer gives up
+        abandoned = run.Channel(1, 1)
+        producer = threading.Thread(target=lambda: [abandoned.put(item) for item in 'abc'])
+        producer.start()
+        producer.join(0.1)
+        self.assertTrue(producer.is_alive())
+        abandoned.abandon()
+        producer.join(5)
+        self.assertFalse(producer.is_alive())
+        self.assertEqual(len(abandoned.items), 0)
+
+    def test_pipeline_plan(self):
+        run = import_from(REPO, 'run')
+        stages = [run.Stage('fetch', None), run.Stage('tokenize', None, ['fetch']), run.Stage('queries', None, ['tokenize']),
+                  run.Stage('detect', None, ['queries']), run.Stage('collect', None, ['detect', 'tokenize']),
+                  run.Stage('other', None)]
+        with tempfile.TemporaryDirectory() as workdir:
+            options = argparse.Namespace(workdir=workdir, from_stage=None, queue_size=4)
+            pipeline = run.Pipeline(stages, options)
+            os.makedirs(pipeline.state_folder)
+            self.assertEqual(list(pipeline.plan()), [stage.name for stage in stages])
+            for stage in stages:
+                pipeline.save_checkpoint(stage, {"status": "done", "items": []})
+            self.assertEqual(pipeline.plan(), {})
+            # The stages after an interrupted one run again, the others don't
+            pipeline.save_checkpoint(stages[1], {"status": "running"})
+            self.assertEqual(list(pipeline.plan()), ['tokenize', 'queries', 'detect', 'collect'])
+            self.assertEqual(pipeline.plan()['tokenize'], {"status": "running"})
+            pipeline.save_checkpoint(stages[1], {"status": "done", "items": []})
+            options.from_stage = 'detect'
+            self.assertEqual(list(pipeline.plan()), ['detect', 'collect', 'other'])
+
+    def test_pipeline_replays_checkpoints(self):
+        run = import_from(REPO, 'run')
+        calls = []
+        received = []
+
+        def produce(ctx):
+            calls.append(ctx.name)
+            for item in [1, 2, 3]:
+                ctx.emit(item)
+
+        def consume(ctx):
+            calls.append(ctx.name)
+            received.append(list(ctx))
+
+        def fail(ctx):
+            raise RuntimeError('broken')
+
+        stages = [run.Stage('produce', produce), run.Stage('consume', consume, ['produce'])]
+        with tempfile.TemporaryDirectory() as workdir:
+            options = argparse.Namespace(workdir=workdir, from_stage=None, queue_size=1)
+            self.assertTrue(run.Pipeline(stages, options).run())
+            # The producer is done, its items come from its checkpoint
+            options.from_stage = 'consume'
+            pipeline = run.Pipeline(stages, options)
+            self.assertTrue(pipeline.run())
+            self.assertEqual(calls, ['produce', 'consume', 'consume'])
+            self.assertEqual(received, [[1, 2, 3], [1, 2, 3]])
+            self.assertEqual(pipeline.results['produce'], {"status": "skipped", "items_out": 3})
+            # A failed stage cancels the stages after it
+            options.from_stage = 'produce'
+            pipeline = run.Pipeline([run.Stage('produce', fail), stages[1]], options)
+            self.assertFalse(pipeline.run())
+            self.assertEqual([pipeline.results[name]['status'] for name in ['produce', 'consume']], ['failed', 'cancelled'])
+            self.assertEqual(pipeline.load_checkpoint(stages[1])['status'], 'running')
+
+    def test_incremental_split(self):
+        unevensplit = import_from(os.path.join(REPO, 'clone-detector'), 'unevensplit')
+        rows = [f'{i}\n' for i in range(1000)]
+        with tempfile.TemporaryDirectory() as folder:
+            spliter = unevensplit.IncrementalSpliter(4, folder)
+            for start in range(0, len(rows), 7):
+                spliter.write(rows[start:start + 7])
+            spliter.close()
+            self.assertEqual(spliter.counts, [143, 214, 286, 357])
+            split = []
+            for part in range(1, 5):
+                with open(os.path.join(folder, f'query_{part}.file')) as f:
+                    split.append(f.readlines())
+            self.assertEqual([len(lines) for lines in split], spliter.counts)
+            self.assertEqual(sorted(sum(split, []), key=int), rows)
+            # Spliter knows the total and rounds its limits up, the last split taking what is left
+            with open(os.path.join(folder, 'input.file'), 'w') as f:
+                f.writelines(rows)
+            cwd = os.getcwd()
+            os.chdir(folder)
+            try:
+                unevensplit.Spliter({'split_count': 4, 'input_filename': 'input.file'}).split()
+            finally:
+                os.chdir(cwd)
+            for part in range(1, 5):
+                with open(os.path.join(folder, f'query_{part}.file')) as f:
+                    self.assertLessEqual(abs(len(f.readlines()) - spliter.counts[part - 1]), 2)
+
+    def test_controller_state(self):
+        controller = import_from(os.path.join(REPO, 'clone-detector'), 'controller')
+        self.assertEqual(controller.dependents('index'), {'move_index', 'prepare_queries', 'search'})
+        self.assertEqual(controller.dependents('search'), set())
+        full_file_path = controller.full_file_path
+        with tempfile.TemporaryDirectory() as folder:
+            controller.full_file_path = lambda name: os.path.join(folder, name)
+            try:
+                script = controller.ScriptController(2)
+                self.assertEqual(script.state, {"steps": {}, "nodes": {}})
+                self.assertEqual(script.ready_steps([]), ['split_1', 'backup_gtpm', 'split_n'])
+                script.state["steps"].update(split_1='done', backup_gtpm='done', split_n='failed')
+                self.assertEqual(script.ready_steps(['split_n']), ['init'])
+                # Old versions kept a single integer, the state being run
+                expected = {controller.STATE_INIT: {'split_1': 'done', 'backup_gtpm': 'done', 'init': 'failed'},
+                            controller.STATE_MOVE_INDEX: dict.fromkeys(['split_1', 'backup_gtpm', 'init', 'index'], 'done'),
+                            controller.STATE_SEARCH: {step: 'done' for step in controller.STEPS if step != 'search'}}
+                for old_state, steps in expected.items():
+                    with open(script.script_meta_file_name, 'w') as f:
+                        f.write(f'{old_state}\n')
+                    self.assertEqual(script.load_previous_state(), {"steps": steps, "nodes": {}})
+                script.flush_state()
+                self.assertEqual(script.load_previous_state(), script.state)
+                # "<exit code> <wall seconds>" written by runnodes.sh
+                for node, status in [(1, '0 12\n'), (2, '2 7\n'), (3, 'killed\n')]:
+                    os.makedirs(os.path.join(folder, f'NODE_{node}'))
+                    with open(os.path.join(folder, f'NODE_{node}', 'search.status'), 'w') as f:
+                        f.write(status)
+                self.assertEqual([script.read_node_status('search', node) for node in '1234'],
+                                 [{'status': 'done', 'wall': 12}, {'status': 'failed', 'wall': 7},
+                                  {'status': 'failed', 'wall': None}, {'status': 'failed', 'wall': None}])
+            finally:
+                controller.full_file_path = full_file_path
+
+    def test_controller_resumes_failed_nodes(self):
+        controller = import_from(os.path.join(REPO, 'clone-detector'), 'controller')
+        commands = []
+        failing = set()
+
+        def run_command(cmd, cwd=None):
+            commands.append([os.path.basename(cmd[0])] + cmd[1:])
+            if os.path.basename(cmd[0]) != 'runnodes.sh':
+                return 0
+            mode, nodes = cmd[1], cmd[4].split(',')
+            for node in nodes:
+                os.makedirs(os.path.join(folder, f'NODE_{node}'), exist_ok=True)
+                with open(os.path.join(folder, f'NODE_{node}', f'{mode}.status'), 'w') as f:
+                    f.write('1 3\n' if (mode, node) in failing else '0 5\n')
+            return 1 if any((mode, node) in failing for node in nodes) else 0
+
+        full_file_path, original_run_command = controller.full_file_path, controller.run_command
+        with tempfile.TemporaryDirectory() as folder, tempfile.TemporaryDirectory() as split_dir:
+            for node in range(1, 4):
+                with open(os.path.join(split_dir, f'query_{node}.file'), 'w') as f:
+                    f.write(f'{node}\n')
+            controller.full_file_path = lambda name: os.path.join(folder, name)
+            controller.run_command = run_command
+            try:
+                failing.add(('search', '2'))
+                with self.assertRaises(controller.ScriptControllerException):
+                    controller.ScriptController(3, split_dir).execute()
+                self.assertEqual(commands[-1], ['runnodes.sh', 'search', '3', '', '1,2,3'])
+                # Only the failed node runs again, the other steps are done
+                failing.clear()
+                del commands[:]
+                controller.ScriptController(3, split_dir).execute()
+                self.assertEqual(commands, [['runnodes.sh', 'search', '3', '', '2']])
+                self.assertFalse(os.path.exists(os.path.join(folder, 'scriptinator_metadata.scc')))
+                # An old state file of a run that failed at init restores the
+                # gtpm index from its backup before running init again
+                with open(os.path.join(folder, 'scriptinator_metadata.scc'), 'w') as f:
+                    f.write(f'{controller.STATE_INIT}\n')
+                del commands[:]
+                controller.ScriptController(3, split_dir).execute()
+                scripts = [command[0] for command in commands]
+                self.assertLess(scripts.index('restore-gtpm.sh'), commands.index(['runnodes.sh', 'init', '1', '', '1']))
+                self.assertNotIn('backup-gtpm.sh', scripts)
+                self.assertNotIn('execute.sh', scripts)
+            finally:
+                controller.full_file_path = full_file_path
+                controller.run_command = original_run_command
+
+    def test_language_registry(self):
+        config = configparser.ConfigParser()
+        config.read_string("""
+[Language]
+separators = ; . ( ) %%
+comment_inline = //
+comment_open_tag = /*
+comment_close_tag = */
+File_extensions = .java
+
+[Language python]
+separators = ; . ( ) :
+comment_inline = #
+comment_open_tag = '''
+comment_close_tag = '''
+File_extensions = .py .pyw
+""")
+        registry = languages.LanguageRegistry.from_config(config)
+        self.assertEqual(registry.extensions, ['.java', '.py', '.pyw'])
+        java, python = registry.profile_for('a/B.java'), registry.profile_for('c/d.pyw')
+        self.assertEqual((java.name, java.separators, java.block_extractor), ('', [';', '.', '(', ')', '%'], 'java'))
+        self.assertEqual((python.name, python.block_extractor), ('python', 'python'))
+        self.assertIsNone(registry.profile_for('e.c'))
+        self.assertEqual(registry.default(), java)
+        self.assertEqual([p.output_name('files-tokens', 3) for p in registry.profiles], ['files-tokens-3', 'files-tokens-python-3'])
+        # Each file is tokenized with the rules of its language
+        tokenizing.language_engines['python'] = engines.get_engine('translate', python.separators)
+        try:
+            (_, (_, _, _, tokens), _) = tokenizing.tokenize_files('x = 1 # y', python)
+        finally:
+            del tokenizing.language_engines['python']
+        self.assertEqual(tokens, '@#@x@@::@@1,=@@::@@1,1@@::@@1')
+        config['Language c'] = {'separators': ';', 'comment_inline': '//', 'comment_open_tag': '/*', 'comment_close_tag': '*/',
+                                'File_extensions': '.c .py'}
+        with self.assertRaises(ValueError):
+            languages.LanguageRegistry.from_config(config)
+
+
 
 if __name__ == '__main__':
     unittest.main()
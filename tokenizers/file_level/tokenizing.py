@@ -1,38 +1,72 @@
-import datetime as dt
-import zipfile
-import re
-import collections
-import hashlib
+import functools
+import time
 import os
+import sys
 from configparser import ConfigParser
 
+from .dedup import DedupCache, content_hash
+from .engines import get_engine, md5_hash
+from .filters import FileFilter, SkipFile, skipped_line
+from .languages import LanguageRegistry
+from .manifest import file_md5
+from .metrics import Metrics
+from .sources import open_source
+
 MULTIPLIER = 50000000
 
 N_PROCESSES = 2
 PROJECTS_BATCH = 20
+FILES_BATCH = 64
+DEDUP_CACHE_SIZE = 0
+OUTPUT_FORMAT = 'text'
+BUILD_VOCABULARY = False
+METRICS_FILE = ''
+OUTPUT_BUFFER_SIZE = 1 << 20
+MAX_SHARD_SIZE = 0
+FSYNC = 'none'
+SPLIT_PROJECT_SIZE = 0
+CHUNK_SIZE = 1 << 25
 
 dirs_config = {}
 dirs_config["bookkeeping_folder"] = 'bookkeeping_projs'
 dirs_config["tokens_file"] = 'files_tokens'
+dirs_config["vocabulary_folder"] = 'vocabulary'
 FILE_projects_list = "project-list.txt"
+# Settings of the default language profile, the [Language] section
 language_config = {}
+tokenizer_engine = None
+# Every language profile, and the engine of each one by name
+languages = LanguageRegistry([])
+language_engines = {}
+file_filter = FileFilter()
+dedup_cache = None
+token_counter = None
+# Timings of the current project, see metrics.py
+metrics = Metrics()
+config_hash = None
 
 file_count = 0
 
 
 def read_config():
-    global N_PROCESSES, PROJECTS_BATCH
+    global N_PROCESSES, PROJECTS_BATCH, FILES_BATCH, DEDUP_CACHE_SIZE, OUTPUT_FORMAT, BUILD_VOCABULARY, METRICS_FILE
+    global OUTPUT_BUFFER_SIZE, MAX_SHARD_SIZE, FSYNC, SPLIT_PROJECT_SIZE, CHUNK_SIZE
     global dirs_config
-    global language_config
+    global language_config, languages, language_engines
     global init_file_id
     global init_proj_id
     global FILE_projects_list
+    global tokenizer_engine
+    global file_filter
+    global config_hash
 
     config = ConfigParser()
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.ini')
 
     # parse existing file
     try:
-        config.read(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.ini'))
+        config.read(config_path)
+        config_hash = file_md5(config_path)
     except IOError:
         print('ERROR - config.ini not found')
         sys.exit()
@@ -40,22 +74,44 @@ def read_config():
     # Get info from config.ini into global variables
     N_PROCESSES = config.getint('Main', 'N_PROCESSES')
     PROJECTS_BATCH = config.getint('Main', 'PROJECTS_BATCH')
+    FILES_BATCH = max(1, config.getint('Main', 'FILES_BATCH', fallback=64))
+    DEDUP_CACHE_SIZE = config.getint('Main', 'DEDUP_CACHE_SIZE', fallback=0)
+    OUTPUT_FORMAT = config.get('Main', 'OUTPUT_FORMAT', fallback='text')
+    BUILD_VOCABULARY = config.getboolean('Main', 'BUILD_VOCABULARY', fallback=False)
+    OUTPUT_BUFFER_SIZE = config.getint('Main', 'OUTPUT_BUFFER_SIZE', fallback=1 << 20)
+    MAX_SHARD_SIZE = config.getint('Main', 'MAX_SHARD_SIZE', fallback=0)
+    FSYNC = config.get('Main', 'FSYNC', fallback='none')
+    SPLIT_PROJECT_SIZE = config.getint('Main', 'SPLIT_PROJECT_SIZE', fallback=0)
+    CHUNK_SIZE = config.getint('Main', 'CHUNK_SIZE', fallback=1 << 25)
     dirs_config["stats_folder"] = config.get('Folders/Files', 'PATH_stats_file_folder')
     dirs_config["bookkeeping_folder"] = config.get('Folders/Files', 'PATH_bookkeeping_proj_folder')
     dirs_config["tokens_file"] = config.get('Folders/Files', 'PATH_tokens_file_folder')
-
-    # Reading Language settings
-    language_config["separators"] = config.get('Language', 'separators').strip('"').split(' ')
-    language_config["comment_inline"] = re.escape(config.get('Language', 'comment_inline'))
-    language_config["comment_inline_pattern"] = language_config["comment_inline"] + '.*?$'
-    language_config["comment_open_tag"] = re.escape(config.get('Language', 'comment_open_tag'))
-    language_config["comment_close_tag"] = re.escape(config.get('Language', 'comment_close_tag'))
-    language_config["comment_open_close_pattern"] = language_config["comment_open_tag"] + '.*?' + language_config["comment_close_tag"]
-    language_config["file_extensions"] = config.get('Language', 'File_extensions').split(' ')
+    dirs_config["vocabulary_folder"] = config.get('Folders/Files', 'PATH_vocabulary_folder', fallback='vocabulary')
+    METRICS_FILE = config.get('Folders/Files', 'METRICS_FILE', fallback='')
+
+    # Reading Language settings, one profile per [Language] section
+    languages = LanguageRegistry.from_config(config)
+    default = languages.default()
+    if default is not None:
+        language_config["separators"] = default.separators
+        language_config["comment_stripper"] = default.comment_stripper
+        language_config["file_extensions"] = default.extensions
     FILE_projects_list = config.get("Main", "FILE_projects_list")
     # Reading config settings
     init_file_id = config.getint('Config', 'init_file_id')
     init_proj_id = config.getint('Config', 'init_proj_id')
+    # Engine used to split the comment-free source into tokens
+    engine_name = config.get('Main', 'TOKENIZER_ENGINE', fallback='translate')
+    language_engines = {profile.name: get_engine(engine_name, profile.separators) for profile in languages.profiles}
+    tokenizer_engine = language_engines.get('')
+    file_filter = FileFilter.from_config(config)
+
+
+def init_dedup_cache(shared_stores):
+    """Called in every worker with the stores shared by all of them, each
+    worker adding its share of DEDUP_CACHE_SIZE files."""
+    global dedup_cache
+    dedup_cache = DedupCache(shared_stores, max(1, DEDUP_CACHE_SIZE // N_PROCESSES))
 
 
 def count_lines(string, count_empty = True):
@@ -65,152 +121,251 @@ def count_lines(string, count_empty = True):
     return result
 
 
-def md5_hash(string):
-    m = hashlib.md5()
-    m.update(string.encode("utf-8"))
-    return m.hexdigest()
-
-
-def tokenize_files(file_string):
+def strip_file(file_string, comment_stripper):
+    """Returns the file stats, its code without comments nor blank lines and
+    the ns spent hashing and stripping comments."""
     times = {}
-    h_time = dt.datetime.now()
+    h_time = time.perf_counter_ns()
     file_hash = md5_hash(file_string)
-    times["hash_time"] = (dt.datetime.now() - h_time).microseconds
+    times["hash"] = time.perf_counter_ns() - h_time
 
     lines = count_lines(file_string)
     file_string = "".join([s for s in file_string.splitlines(True) if s.strip()])
 
     loc = count_lines(file_string)
 
-    start_time = dt.datetime.now()
-    # Remove tagged comments
-    file_string = re.sub(language_config["comment_open_close_pattern"], '', file_string, flags=re.DOTALL)
-    # Remove end of line comments
-    file_string = re.sub(language_config["comment_inline_pattern"], '', file_string, flags=re.MULTILINE)
-    times["regex_time"] = (dt.datetime.now() - start_time).microseconds
+    start_time = time.perf_counter_ns()
+    # Remove tagged and end of line comments
+    file_string = comment_stripper.strip(file_string)
+    times["regex"] = time.perf_counter_ns() - start_time
 
     file_string = "".join([s for s in file_string.splitlines(True) if s.strip()]).strip()
     sloc = file_string.count('\n')
     if file_string != '' and not file_string.endswith('\n'):
         sloc += 1
-    final_stats = (file_hash, lines, loc, sloc)
-    # Rather a copy of the file string here for tokenization
-    file_string_for_tokenization = file_string
-
-    # Transform separators into spaces (remove them)
-    start_time = dt.datetime.now()
-    for x in language_config["separators"]:
-        file_string_for_tokenization = file_string_for_tokenization.replace(x, ' ')
-    times["string_time"] = (dt.datetime.now() - start_time).microseconds
-
-    # Create a list of tokens
-    file_string_for_tokenization = file_string_for_tokenization.split()
-    # Total number of tokens
-    tokens_count_total = len(file_string_for_tokenization)
-    # Count occurrences
-    file_string_for_tokenization = collections.Counter(file_string_for_tokenization)
-    # Converting Counter to dict because according to StackOverflow is better
-    file_string_for_tokenization = dict(file_string_for_tokenization)
-    # Unique number of tokens
-    tokens_count_unique = len(file_string_for_tokenization)
-
-    # SourcererCC formatting
-    start_time = dt.datetime.now()
-    tokens = '@#@'
-    tokens += ','.join(['{}@@::@@{}'.format(k, v) for k, v in file_string_for_tokenization.items()])
-    times["tokens_time"] = (dt.datetime.now() - start_time).microseconds
-
-    start_time = dt.datetime.now()
-    tokens_hash = md5_hash(tokens[3:])
-    times["hash_time"] += (dt.datetime.now() - start_time).microseconds
-
-    final_tokens = (tokens_count_total, tokens_count_unique, tokens_hash, tokens)
-    return final_stats, final_tokens, times
-
-
-def process_file_contents(file_string, proj_id, file_id, container_path, file_path, file_bytes, FILE_tokens_file, FILE_stats_file):
-    global file_count
-
-    file_count += 1
-    (final_stats, final_tokens, file_times) = tokenize_files(file_string)
-    (file_hash, lines, LOC, SLOC) = final_stats
-    (tokens_count_total, tokens_count_unique, token_hash, tokens) = final_tokens
-    file_path = os.path.join(container_path, file_path)
-    start_time = dt.datetime.now()
-    FILE_stats_file.write(f'{proj_id},{file_id},"{file_path}","{file_hash}",{file_bytes},{lines},{LOC},{SLOC}\n')
-    FILE_tokens_file.write(f'{proj_id},{file_id},{tokens_count_total},{tokens_count_unique}, {tokens_hash}{tokens}\n')
-    file_times["write_time"] = (dt.datetime.now() - start_time).microseconds
-
-    return file_times
-
-
-def process_zip_ball(process_num, zip_file, proj_id, proj_path, base_file_id, FILE_tokens_file, FILE_bookkeeping_proj, FILE_stats_file):
-    times = {
-        "zip_time": 0,
-        "file_time": 0,
-        "string_time": 0,
-        "tokens_time": 0,
-        "write_time": 0,
-        "hash_time": 0,
-        "regex_time": 0
-    }
-    print(f"[INFO] Attempting to process_zip_ball {zip_file}")
-    with zipfile.ZipFile(proj_path, 'r') as my_file:
-        for code_file in my_file.infolist():
-            if not os.path.splitext(code_file.filename)[1] in language_config["file_extensions"]:
-                continue
-
-            file_id = process_num * MULTIPLIER + base_file_id + file_count
-            file_bytes = str(code_file.file_size)
-            file_path = code_file.filename
-            full_code_file_path = os.path.join(proj_path, file_path)
-
-            z_time = dt.datetime.now()
+    return (file_hash, lines, loc, sloc), file_string, times
+
+
+def tokenize_files_batch(file_strings, profile=None):
+    """tokenize_files of several files of the same language profile. The
+    engine turns the code of all of them into tokens with one tokenize_batch
+    call, whose time is counted as the "separators" stage of the first file
+    (it also formats and hashes the tokens)."""
+    if profile is None:
+        comment_stripper, engine = language_config["comment_stripper"], tokenizer_engine
+    else:
+        comment_stripper, engine = profile.comment_stripper, language_engines[profile.name]
+    stripped = [strip_file(file_string, comment_stripper) for file_string in file_strings]
+    start_time = time.perf_counter_ns()
+    # Transform separators into spaces (remove them), split, count
+    # occurrences and format them for SourcererCC
+    all_tokens = engine.tokenize_batch([code for _, code, _ in stripped])
+    if stripped:
+        stripped[0][2]["separators"] = time.perf_counter_ns() - start_time
+    return [(final_stats, final_tokens, times) for (final_stats, _, times), final_tokens in zip(stripped, all_tokens)]
+
+
+def tokenize_files(file_string, profile=None):
+    """Returns the file stats, the tokens and the ns spent in every stage,
+    with the language profile given or the default one."""
+    return tokenize_files_batch([file_string], profile)[0]
+
+
+class PendingFile(object):
+    """A file added to a FileBatch, with its tokenize_files result once it
+    was tokenized (or found in the dedup cache)."""
+    __slots__ = ('proj_id', 'file_id', 'path', 'size', 'tokens_file', 'profile', 'key', 'string', 'result')
+
+    def __init__(self, proj_id, file_id, path, size, tokens_file, profile, key, string, result):
+        self.proj_id = proj_id
+        self.file_id = file_id
+        self.path = path
+        self.size = size
+        self.tokens_file = tokens_file
+        self.profile = profile
+        self.key = key
+        self.string = string
+        self.result = result
+
+
+class FileBatch(object):
+    """Files of a project waiting to be tokenized together.
+
+    A file is read and decoded, and gets its file id, when it is added. Once
+    FILES_BATCH files were added they are tokenized with one
+    tokenize_files_batch call per language profile, and written in the order
+    they were added. A file whose content is already in the dedup cache, or
+    earlier in the batch, is not tokenized again.
+    """
+
+    def __init__(self, FILE_stats_file, size=1):
+        self.FILE_stats_file = FILE_stats_file
+        self.size = size
+        self.files = []
+        # dedup key -> file of the batch tokenizing that content
+        self.keys = {}
+
+    def add(self, file_content, proj_id, file_id, container_path, file_path, file_bytes, FILE_tokens_file, content_key=None, profile=None):
+        """file_content is the content as bytes or, when content_key
+        identifies it (a git blob SHA), a function that reads it only on a
+        dedup miss. profile is the language profile of the file, the default
+        one if None. Raises SkipFile if the content can't be read or
+        decoded."""
+        global file_count
+
+        file_content_hash = None
+        cached = None
+        same = None
+        if dedup_cache is not None:
+            file_content_hash = content_key if content_key is not None else content_hash(file_content)
+            if profile is not None and profile.name:
+                # Other languages tokenize the same content differently
+                file_content_hash = f'{profile.name}:{file_content_hash}'
+            same = self.keys.get(file_content_hash)
+            if same is None:
+                cached = dedup_cache.get(file_content_hash)
+
+        file_string = None
+        if cached is None and same is None:
+            if callable(file_content):
+                start_time = time.perf_counter_ns()
+                file_content = file_content()
+                metrics.observe("read", time.perf_counter_ns() - start_time)
+                metrics.count("bytes", len(file_content))
+            start_time = time.perf_counter_ns()
+            try:
+                file_string = file_content.decode("utf-8")
+            except UnicodeDecodeError:
+                raise SkipFile('decode_error')
+            metrics.observe("decode", time.perf_counter_ns() - start_time)
+            if dedup_cache is not None:
+                metrics.count("dedup_misses")
+        else:
+            # Same content was already tokenized, only the ids are new
+            metrics.count("dedup_hits")
+        file_count += 1
+        metrics.count("files")
+        pending = PendingFile(proj_id, file_id, os.path.join(container_path, file_path), file_bytes, FILE_tokens_file, profile,
+                              file_content_hash, file_string, cached)
+        if file_string is not None and file_content_hash is not None:
+            self.keys[file_content_hash] = pending
+        self.files.append(pending)
+        if len(self.files) >= self.size:
+            self.flush()
+
+    def flush(self):
+        """Tokenize and write the files added since the last flush."""
+        by_profile = {}
+        for pending in self.files:
+            if pending.string is not None:
+                by_profile.setdefault(pending.profile, []).append(pending)
+        for profile, files in by_profile.items():
+            results = tokenize_files_batch([pending.string for pending in files], profile)
+            for pending, (final_stats, final_tokens, file_times) in zip(files, results):
+                for stage, ns in file_times.items():
+                    metrics.observe(stage, ns)
+                pending.result = (final_stats, final_tokens)
+                if dedup_cache is not None:
+                    dedup_cache.put(pending.key, pending.result)
+
+        FILE_stats_file = self.FILE_stats_file
+        for pending in self.files:
+            # Content tokenized for a file earlier in the batch otherwise
+            result = pending.result or self.keys[pending.key].result
+            (file_hash, lines, LOC, SLOC), (tokens_count_total, tokens_count_unique, tokens_hash, tokens) = result
+            proj_id, file_id = pending.proj_id, pending.file_id
+            start_time = time.perf_counter_ns()
+            FILE_stats_file.write(f'{proj_id},{file_id},"{pending.path}","{file_hash}",{pending.size},{lines},{LOC},{SLOC}\n')
+            if token_counter is not None:
+                token_counter.add(tokens)
+            if OUTPUT_FORMAT == 'binary':
+                pending.tokens_file.write_bag(proj_id, file_id, tokens_count_total, tokens_count_unique, tokens_hash, tokens)
+            else:
+                pending.tokens_file.write(f'{proj_id},{file_id},{tokens_count_total},{tokens_count_unique}, {tokens_hash}{tokens}\n')
+            metrics.observe("write", time.perf_counter_ns() - start_time)
+        self.files = []
+        self.keys = {}
+
+
+def process_file_contents(file_content, proj_id, file_id, container_path, file_path, file_bytes, FILE_tokens_file, FILE_stats_file, content_key=None,
+                          profile=None):
+    """Tokenize and write a single file, see FileBatch.add."""
+    FileBatch(FILE_stats_file).add(file_content, proj_id, file_id, container_path, file_path, file_bytes, FILE_tokens_file, content_key, profile)
+
+
+def skip_file(proj_id, proj_path, source_file, reason, FILE_skipped_file):
+    print(f"[INFO] Skipping file <{os.path.join(proj_path, source_file.path)}>: {reason}")
+    metrics.count(f"skipped_{reason}")
+    if FILE_skipped_file is not None:
+        FILE_skipped_file.write(skipped_line(proj_id, os.path.join(proj_path, source_file.path), source_file.size, reason))
+
+
+def process_source(process_num, proj_id, proj_path, base_file_id, FILE_tokens_files, FILE_stats_file, chunk=None, FILE_skipped_file=None):
+    """FILE_tokens_files has the tokens output of every language profile, by
+    name. Each file is tokenized with the profile of its extension."""
+    print(f"[INFO] Attempting to process_source {proj_path}")
+    start_time = time.perf_counter_ns()
+    try:
+        source = open_source(proj_path, languages.extensions)
+    except Exception as e:
+        print(f"[WARNING] Unable to open project <{proj_path}> (process {process_num}): {e}")
+        return
+    metrics.observe("open", time.perf_counter_ns() - start_time)
+    if source is None:
+        print(f"[WARNING] Unsupported project <{proj_path}>, expected a zip, tarball, directory or bare git repository (process {process_num})")
+        return
+
+    batch = FileBatch(FILE_stats_file, FILES_BATCH)
+    try:
+        for member_index, source_file in enumerate(source.files(chunk)):
+            if chunk is None:
+                file_id = process_num * MULTIPLIER + base_file_id + file_count
+            else:
+                file_id = chunk.first_file_id + member_index
             try:
-                my_zip_file = my_file.open(file_path, 'r')
-            except:
-                print(f"[WARNING] Unable to open file <{full_code_file_path}> (process {process_num})")
-                break
-            times["zip_time"] += (dt.datetime.now() - z_time).microseconds
-
-            if my_zip_file is None:
-                print(f"[WARNING] Opened file is None <{full_code_file_path}> (process {process_num})")
-                break
-
-            f_time = dt.datetime.now()
-            file_string = my_zip_file.read().decode("utf-8")
-            times["file_time"] += (dt.datetime.now() - f_time).microseconds
-
-            file_times = process_file_contents(file_string, proj_id, file_id, zip_file, file_path, file_bytes, FILE_tokens_file, FILE_stats_file)
-            for time_name, time in file_times.items():
-                times[time_name] += time
-    print("[INFO] Successfully ran process_zip_ball {zip_file}")
-    return times
-
-
-def process_one_project(process_num, proj_id, proj_path, base_file_id, FILE_tokens_file, FILE_bookkeeping_proj, FILE_stats_file):
-    print(f"[INFO] Starting  project <{proj_id},{proj_path}> (process {process_num})")
-    p_start = dt.datetime.now()
-    zip_file = proj_path
-    times = process_zip_ball(process_num, zip_file, proj_id, proj_path, base_file_id, FILE_tokens_file, FILE_bookkeeping_proj, FILE_stats_file)
-    zip_time, file_time, string_time, tokens_time, write_time, hash_time, regex_time = (-1, -1, -1, -1, -1, -1, -1)
-    if times is not None:
-        zip_time = times["zip_time"]
-        file_time = times["file_time"]
-        string_time = times["string_time"]
-        tokens_time = times["tokens_time"]
-        write_time = times["write_time"]
-        hash_time = times["hash_time"]
-        regex_time = times["regex_time"]
-
-    FILE_bookkeeping_proj.write(f'{proj_id},"{proj_path}"\n')
-    p_elapsed = dt.datetime.now() - p_start
-    print(f"[INFO] Project finished <{proj_id},{proj_path}> (process {process_num}))")
-    print(f"[INFO]  ({process_num}): Total: {p_elapsed} ms")
-    print(f"[INFO]      Zip: {zip_time} ms")
-    print(f"[INFO]      Read: {file_time} ms")
-    print(f"[INFO]      Separators: {string_time} ms")
-    print(f"[INFO]      Tokens: {tokens_time} ms")
-    print(f"[INFO]      Write: {write_time} ms")
-    print(f"[INFO]      Hash: {hash_time} ms")
-    print(f"[INFO]      regex: {regex_time} ms")
\ No newline at end of file
+                reason = file_filter.check(source_file)
+                if reason is not None:
+                    raise SkipFile(reason)
+                read = functools.partial(file_filter.read, source_file, source_file.peek is not None)
+                if source_file.key is not None and dedup_cache is not None:
+                    # Read only if the content key was not seen yet
+                    file_content = read
+                else:
+                    start_time = time.perf_counter_ns()
+                    file_content = read()
+                    metrics.observe("read", time.perf_counter_ns() - start_time)
+                    metrics.count("bytes", len(file_content))
+
+                profile = languages.profile_for(source_file.path)
+                batch.add(file_content, proj_id, file_id, proj_path, source_file.path, str(source_file.size),
+                          FILE_tokens_files[profile.name], source_file.key, profile)
+            except SkipFile as e:
+                skip_file(proj_id, proj_path, source_file, e.reason, FILE_skipped_file)
+        batch.flush()
+    finally:
+        source.close()
+    print(f"[INFO] Successfully ran process_source {proj_path}")
+
+
+def process_one_project(process_num, proj_id, proj_path, base_file_id, FILE_tokens_files, FILE_bookkeeping_proj, FILE_stats_file, chunk=None,
+                        FILE_skipped_file=None):
+    """Tokenize one project, or one chunk of it. Its timings are added to
+    `metrics`."""
+    part = '' if chunk is None else f' chunk {chunk.index + 1}/{chunk.count}'
+    print(f"[INFO] Starting  project <{proj_id},{proj_path}>{part} (process {process_num})")
+    p_start = time.perf_counter_ns()
+    process_source(process_num, proj_id, proj_path, base_file_id, FILE_tokens_files, FILE_stats_file, chunk, FILE_skipped_file)
+
+    if chunk is None or chunk.index == 0:
+        FILE_bookkeeping_proj.write(f'{proj_id},"{proj_path}"\n')
+    p_elapsed = (time.perf_counter_ns() - p_start) / 1e6
+    print(f"[INFO] Project finished <{proj_id},{proj_path}>{part} (process {process_num}))")
+    print(f"[INFO]  ({process_num}): Total: {p_elapsed:.1f} ms")
+    print(f"[INFO]      Open: {metrics.total_ms('open'):.1f} ms")
+    print(f"[INFO]      Read: {metrics.total_ms('read') + metrics.total_ms('decode'):.1f} ms")
+    print(f"[INFO]      Separators and tokens: {metrics.total_ms('separators'):.1f} ms")
+    print(f"[INFO]      Write: {metrics.total_ms('write'):.1f} ms")
+    print(f"[INFO]      Hash: {metrics.total_ms('hash'):.1f} ms")
+    print(f"[INFO]      regex: {metrics.total_ms('regex'):.1f} ms")
+    if dedup_cache is not None:
+        print(f"[INFO]      Dedup: {metrics.counters['dedup_hits']} hits, {metrics.counters['dedup_misses']} misses")
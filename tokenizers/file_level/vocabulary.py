@@ -0,0 +1,158 @@
+"""Global token vocabulary built while tokenizing.
+
+Every worker counts the tokens of the bags it writes and saves its counts to
+`token-counts-<process_num>.json` in the vocabulary folder when one of its
+output files continues in a new shard and when it finishes. On resume the
+bags of the projects recorded in the manifest after the counts were saved
+are counted again from the byte ranges of the tokens files, so the counts
+stay exact after a crash. The driver then merges them into two files:
+
+    vocabulary.txt  one `id,frequency,token` line per token, the ids being
+                    dense and ordered by decreasing frequency
+    gtpm.wfm        `token:frequency` lines sorted by token, the format of
+                    the clone detector's word frequency (.wfm) files
+
+gtpm.wfm can be imported by the clone detector's init step (GTPM_WFM_FILE in
+sourcerer-cc.properties) instead of reading the whole dataset again. Note
+that it counts every bag, while init only counts bags within MIN_TOKENS and
+MAX_TOKENS.
+
+Rebuilding the vocabulary from existing tokens files, text or binary:
+python -m file_level.vocabulary <tokens folder> [vocabulary folder]
+"""
+
+import collections
+import glob
+import itertools
+import json
+import os
+import sys
+
+from .binary_format import BINARY_EXTENSION, TEXT_EXTENSION, BinaryTokensReader
+
+COUNTS_PATTERN = 'token-counts-{}.json'
+VOCABULARY_FILE = 'vocabulary.txt'
+WFM_FILE = 'gtpm.wfm'
+
+
+class TokenCounter(object):
+    """Token -> count table of one worker."""
+
+    def __init__(self, files=0):
+        self.counts = collections.Counter()
+        # Number of files whose tokens were counted, checked when resuming
+        self.files = files
+
+    def add(self, tokens):
+        """Count a formatted `@#@token@@::@@count,...` bag."""
+        if len(tokens) <= 3:
+            return
+        counts = self.counts
+        for pair in tokens[3:].split(','):
+            token, _, count = pair.rpartition('@@::@@')
+            counts[token] += int(count)
+
+    def count_range(self, path, start, end):
+        """Count the bags of the tokens file `path` between the byte offsets
+        `start` and `end`."""
+        counts = self.counts
+        if path.endswith(BINARY_EXTENSION):
+            for record in BinaryTokensReader(path, start, end):
+                for token, count in record.tokens:
+                    counts[token] += count
+            return
+        with open(path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start).decode('utf-8')
+        for line in data.split('\n')[:-1]:
+            self.add('@#@' + line.partition('@#@')[2])
+
+    def dump(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"files": self.files, "counts": self.counts}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        counter = cls(data["files"])
+        counter.counts.update(data["counts"])
+        return counter
+
+    def save(self, folder, process_num, files):
+        """Save the counts of the first `files` files of a worker."""
+        self.files = files
+        self.dump(os.path.join(folder, COUNTS_PATTERN.format(process_num)))
+
+    @classmethod
+    def resume(cls, folder, process_num, records):
+        """Counter of a worker whose projects in the manifest `records` were
+        already tokenized."""
+        path = os.path.join(folder, COUNTS_PATTERN.format(process_num))
+        counter = cls.load(path) if os.path.isfile(path) else cls()
+        # Number of files of the worker after each of its projects
+        files = list(itertools.accumulate([record["files"] for record in records], initial=0))
+        if counter.files not in files:
+            print(f"[WARNING] Token counts of process {process_num} don't match its {files[-1]} files already tokenized, "
+                  f"the vocabulary will be incomplete (rebuild it with file_level.vocabulary)")
+            return cls(files[-1])
+        for record in records[files.index(counter.files):]:
+            for output_path, start, end in record["outputs"].values():
+                if output_path.endswith((TEXT_EXTENSION, BINARY_EXTENSION)):
+                    counter.count_range(output_path, start, end)
+        counter.files = files[-1]
+        return counter
+
+
+def remove_counts(folder):
+    """Forget the counts of a previous run, before starting a new one."""
+    for path in glob.glob(os.path.join(folder, COUNTS_PATTERN.format('*'))):
+        os.remove(path)
+
+
+def merge_counts(folder):
+    counts = collections.Counter()
+    for path in sorted(glob.glob(os.path.join(folder, COUNTS_PATTERN.format('*')))):
+        counts.update(TokenCounter.load(path).counts)
+    return counts
+
+
+def write_vocabulary(counts, folder):
+    """Write vocabulary.txt and gtpm.wfm. Returns the number of tokens."""
+    by_frequency = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    with open(os.path.join(folder, VOCABULARY_FILE), 'w', encoding='utf-8') as f:
+        f.writelines([f'{token_id},{count},{token}\n' for token_id, (token, count) in enumerate(by_frequency)])
+    # Sorted as Java compares strings, by UTF-16 code units, for the .wfm merge
+    with open(os.path.join(folder, WFM_FILE), 'w', encoding='utf-8') as f:
+        f.writelines([f'{token}:{counts[token]}\n' for token in sorted(counts, key=lambda token: token.encode('utf-16-be'))])
+    return len(by_frequency)
+
+
+def count_tokens_files(tokens_folder):
+    """Count the tokens of every tokens file in `tokens_folder`."""
+    counter = TokenCounter()
+    for path in sorted(glob.glob(os.path.join(tokens_folder, '*'))):
+        if path.endswith(BINARY_EXTENSION):
+            for record in BinaryTokensReader(path):
+                for token, count in record.tokens:
+                    counter.counts[token] += count
+                counter.files += 1
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    counter.add('@#@' + line.rstrip('\n').partition('@#@')[2])
+                    counter.files += 1
+    return counter
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    output_folder = sys.argv[2] if len(sys.argv) > 2 else '.'
+    os.makedirs(output_folder, exist_ok=True)
+    counter = count_tokens_files(sys.argv[1])
+    n_tokens = write_vocabulary(counter.counts, output_folder)
+    print(f"[INFO] {n_tokens} distinct tokens in {counter.files} bags written to {output_folder}")
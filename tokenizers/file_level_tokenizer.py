@@ -3,59 +3,77 @@
 import datetime as dt
 import os
 import sys
-from multiprocessing import Process, Queue
-
-from file_level.tokenizing import *
-
-
-def process_projects(process_num, list_projects, base_file_id, global_queue):
-    file_files_stats_file = os.path.join(dirs_config["stats_folder"], f'files-stats-{process_num}.stats')
-    file_bookkeeping_proj_name = os.path.join(dirs_config["bookkeeping_folder"], f'bookkeeping-proj-{process_num}.projs')
-    file_files_tokens_file = os.path.join(dirs_config["tokens_file"], f'files-tokens-{process_num}.tokens')
-
-    global file_count
-    file_count = 0
-    with open(file_files_tokens_file, 'a+', encoding="utf-8") as FILE_tokens, open(file_bookkeeping_proj_name, 'a+', encoding="utf-8") as FILE_bookkeeping, open(file_files_stats_file, 'a+', encoding="utf-8") as FILE_stats:
+from contextlib import ExitStack
+
+from file_level import tokenizing
+from file_level.binary_format import KIND_FILES, tokens_opener
+from file_level.chunks import plan_tasks
+from file_level.dedup import create_shared_store
+from file_level.filters import SKIPPED_EXTENSION, SKIPPED_NAME
+from file_level.manifest import Manifest, output_offsets
+from file_level.metrics import Metrics
+from file_level.outputs import OutputStream, write_progress
+from file_level.pool import run_pool, worker_tasks
+from file_level.tokenizing import dirs_config, process_one_project, read_config
+from file_level.vocabulary import TokenCounter, merge_counts, remove_counts, write_vocabulary
+
+
+def process_projects(process_num, task_queue, result_queue, dedup_store, manifest):
+    file_files_stats_file = os.path.join(dirs_config["stats_folder"], f'files-stats-{process_num}')
+    file_bookkeeping_proj_name = os.path.join(dirs_config["bookkeeping_folder"], f'bookkeeping-proj-{process_num}')
+    file_skipped_name = os.path.join(dirs_config["bookkeeping_folder"], SKIPPED_NAME.format(process_num))
+    stream_options = {"buffer_size": tokenizing.OUTPUT_BUFFER_SIZE, "max_bytes": tokenizing.MAX_SHARD_SIZE, "fsync": tokenizing.FSYNC}
+    tokens_extension, tokens_file_opener = tokens_opener(tokenizing.OUTPUT_FORMAT, KIND_FILES, tokenizing.OUTPUT_BUFFER_SIZE)
+    n_projects = manifest.projects_per_process.get(process_num, 0)
+
+    base_file_id = tokenizing.init_file_id + manifest.files_per_process.get(process_num, 0)
+    tokenizing.file_count = 0
+    if dedup_store is not None:
+        tokenizing.init_dedup_cache(dedup_store)
+    if tokenizing.BUILD_VOCABULARY:
+        tokenizing.token_counter = TokenCounter.resume(dirs_config["vocabulary_folder"], process_num, manifest.records(process_num))
+    with ExitStack() as tokens_streams, \
+            OutputStream(file_bookkeeping_proj_name, '.projs', **stream_options) as FILE_bookkeeping, \
+            OutputStream(file_files_stats_file, '.stats', **stream_options) as FILE_stats, \
+            OutputStream(file_skipped_name, SKIPPED_EXTENSION, **stream_options) as FILE_skipped:
+        # One tokens output per language profile
+        FILE_tokens = {}
+        for profile in tokenizing.languages.profiles:
+            FILE_tokens[profile.name] = tokens_streams.enter_context(OutputStream(
+                os.path.join(dirs_config["tokens_file"], profile.output_name('files-tokens', process_num)), tokens_extension, tokens_file_opener, **stream_options))
         print(f"[INFO] Process {process_num} starting")
+        outputs = {"bookkeeping": FILE_bookkeeping, "stats": FILE_stats, "skipped": FILE_skipped}
+        for profile in tokenizing.languages.profiles:
+            outputs[profile.output_name('tokens')] = FILE_tokens[profile.name]
         p_start = dt.datetime.now()
-        for proj_id, proj_path in list_projects:
-            process_one_project(process_num, str(proj_id), proj_path, base_file_id, FILE_tokens, FILE_bookkeeping, FILE_stats)
-
-    p_elapsed = (dt.datetime.now() - p_start).seconds
-    print(f"[INFO] Process {process_num} finished. {file_count} files in {p_elapsed} sec")
+        for proj_id, proj_path, chunk in worker_tasks(task_queue):
+            start_offsets = output_offsets(outputs)
+            files_before = tokenizing.file_count
+            proj_start = dt.datetime.now()
+            tokenizing.metrics = Metrics()
+            process_one_project(process_num, str(proj_id), proj_path, base_file_id, FILE_tokens, FILE_bookkeeping, FILE_stats, chunk, FILE_skipped)
+            n_files = tokenizing.file_count - files_before
+            end_offsets = output_offsets(outputs)
+            n_shards = sum(len(stream.finished) for stream in outputs.values())
+            for stream in outputs.values():
+                stream.end_project()
+            manifest.record(process_num, proj_id, proj_path, n_files, start_offsets, end_offsets, None if chunk is None else chunk.index)
+            if tokenizing.token_counter is not None and sum(len(stream.finished) for stream in outputs.values()) > n_shards:
+                # A resume only counts again the projects written after this
+                tokenizing.token_counter.save(dirs_config["vocabulary_folder"], process_num, manifest.files_per_process.get(process_num, 0) + tokenizing.file_count)
+            n_projects += 1
+            write_progress(dirs_config["bookkeeping_folder"], process_num, outputs, n_projects)
+            result_queue.put((process_num, proj_id, n_files, (dt.datetime.now() - proj_start).total_seconds(), tokenizing.metrics.to_dict()))
+    write_progress(dirs_config["bookkeeping_folder"], process_num, outputs, n_projects)
+
+    if tokenizing.token_counter is not None:
+        tokenizing.token_counter.save(dirs_config["vocabulary_folder"], process_num, manifest.files_per_process.get(process_num, 0) + tokenizing.file_count)
+
+    p_elapsed = (dt.datetime.now() - p_start).total_seconds()
+    print(f"[INFO] Process {process_num} finished. {tokenizing.file_count} files in {p_elapsed} sec")
 
     # Let parent know
-    global_queue.put((process_num, file_count))
-    sys.exit(0)
-
-
-def start_child(processes, global_queue, proj_paths, batch):
-    # This is a blocking get. If the queue is empty, it waits
-    pid, n_files_processed = global_queue.get()
-    # OK, one of the processes finished. Let's get its data and kill it
-    kill_child(processes, pid, n_files_processed)
-
-    # Get a new batch of project paths ready
-    paths_batch = proj_paths[:batch]
-    del proj_paths[:batch]
-
-    print("Starting new process %s" % pid)
-    p = Process(name=f'Process {pid}', target=process_projects, args=(pid, paths_batch, processes[pid][1], global_queue))
-    processes[pid][0] = p
-    p.start()
-
-
-def kill_child(processes, pid, n_files_processed):
-    global file_count
-    file_count += n_files_processed
-    if processes[pid][0] is not None:
-        processes[pid][0] = None
-        processes[pid][1] += n_files_processed
-        print(f"Process {pid} finished, {n_files_processed} files processed (total by that process: {processes[pid][1]}). Current total: {file_count}")
-
-
-def active_process_count(processes):
-    return len(list(filter(lambda p: p[0] is not None, processes)))
+    result_queue.put((process_num, None, tokenizing.file_count, p_elapsed, None))
 
 
 if __name__ == '__main__':
@@ -67,36 +85,67 @@ if __name__ == '__main__':
     p_start = dt.datetime.now()
 
     proj_paths = []
-    with open(FILE_projects_list, "r", encoding="utf-8") as f:
+    with open(tokenizing.FILE_projects_list, "r", encoding="utf-8") as f:
         proj_paths = f.read().split("\n")
-    proj_paths = list(enumerate(proj_paths, start=1))
-
-    if os.path.exists(dirs_config["stats_folder"]) or os.path.exists(dirs_config["bookkeeping_folder"]) or os.path.exists(dirs_config["tokens_file"]):
-        missing_files = filter(os.path.exists, [dirs_config["stats_folder"], dirs_config["bookkeeping_folder"], dirs_config["tokens_file"]])
-        print('ERROR - Folder [' + '] or ['.join(missing_files) + '] already exists!')
-        sys.exit(1)
+    proj_paths = [(proj_id, proj_path) for proj_id, proj_path in enumerate(proj_paths, start=1) if proj_path]
+    # Chunks of split projects take their file ids above the ones of the processes
+    tasks = plan_tasks(proj_paths, tokenizing.languages.extensions, tokenizing.SPLIT_PROJECT_SIZE, tokenizing.CHUNK_SIZE,
+                       tokenizing.init_file_id + tokenizing.N_PROCESSES * tokenizing.MULTIPLIER)
+
+    output_folders = [dirs_config["stats_folder"], dirs_config["bookkeeping_folder"], dirs_config["tokens_file"]]
+    manifest = Manifest(dirs_config["bookkeeping_folder"], tokenizing.config_hash)
+    if any(map(os.path.exists, output_folders)):
+        if manifest.load() == 0:
+            existing_folders = filter(os.path.exists, output_folders)
+            print('ERROR - Folder [' + '] or ['.join(existing_folders) + '] already exists and has no manifest to resume from!')
+            sys.exit(1)
+        stale = manifest.stale()
+        if stale:
+            for proj_path, reason in stale:
+                print(f"[ERROR] Project {proj_path} {reason}")
+            print('ERROR - Its rows are already in [' + '] and ['.join(output_folders) + '], remove these folders to start a clean run')
+            sys.exit(1)
+        # Resuming: drop what was written after the last finished project
+        for folder in output_folders:
+            os.makedirs(folder, exist_ok=True)
+        manifest.truncate_outputs(output_folders)
+        n_tasks = len(tasks)
+        tasks = [(proj_id, proj_path, chunk) for proj_id, proj_path, chunk in tasks if not manifest.is_completed(proj_path, None if chunk is None else chunk.index)]
+        print(f"*** Resuming, {n_tasks - len(tasks)} projects or chunks already processed")
     else:
-        os.makedirs(dirs_config["stats_folder"])
-        os.makedirs(dirs_config["bookkeeping_folder"])
-        os.makedirs(dirs_config["tokens_file"])
-
-    # Multiprocessing with N_PROCESSES
-    # [process, file_count]
-    processes = [[None, init_file_id] for i in range(N_PROCESSES)]
-    # The queue for processes to communicate back to the parent (this process)
-    # Initialize it with N_PROCESSES number of (process_id, n_files_processed)
-    global_queue = Queue()
-    for i in range(N_PROCESSES):
-        global_queue.put((i, 0))
-
+        for folder in output_folders:
+            os.makedirs(folder)
+        if os.path.isdir(dirs_config["vocabulary_folder"]):
+            remove_counts(dirs_config["vocabulary_folder"])
+    if tokenizing.BUILD_VOCABULARY:
+        os.makedirs(dirs_config["vocabulary_folder"], exist_ok=True)
+
+    # Cache of already tokenized file contents, shared by all the processes
+    dedup_managers, dedup_store = [], None
+    if tokenizing.DEDUP_CACHE_SIZE > 0:
+        dedup_managers, dedup_store = create_shared_store(tokenizing.N_PROCESSES)
+
+    # Pool of N_PROCESSES long-lived processes pulling projects one at a time
     print("*** Starting regular projects...")
-    while len(proj_paths) > 0:
-        start_child(processes, global_queue, proj_paths, PROJECTS_BATCH)
-
-    print("*** No more projects to process. Waiting for children to finish...")
-    while active_process_count(processes) > 0:
-        pid, n_files_processed = global_queue.get()
-        kill_child(processes, pid, n_files_processed)
+    n_processes = min(tokenizing.N_PROCESSES, len(tasks))
+    file_count = 0
+    if n_processes > 0:
+        file_count, metrics = run_pool(n_processes, process_projects, (dedup_store, manifest), tasks, tokenizing.PROJECTS_BATCH,
+                                       metrics_path=tokenizing.METRICS_FILE)
+        print("*** Time per stage:")
+        for line in metrics.summary():
+            print(line)
+
+    for dedup_manager in dedup_managers:
+        dedup_manager.shutdown()
+
+    if tokenizing.BUILD_VOCABULARY:
+        # Processes of the previous runs that had nothing left to do
+        for process_num, n_files in manifest.files_per_process.items():
+            if process_num >= n_processes:
+                TokenCounter.resume(dirs_config["vocabulary_folder"], process_num, manifest.records(process_num)).save(dirs_config["vocabulary_folder"], process_num, n_files)
+        n_tokens = write_vocabulary(merge_counts(dirs_config["vocabulary_folder"]), dirs_config["vocabulary_folder"])
+        print(f"*** Vocabulary of {n_tokens} tokens written to {dirs_config['vocabulary_folder']}")
 
     p_elapsed = dt.datetime.now() - p_start
     print(f"*** All done. {file_count} files in {p_elapsed}")
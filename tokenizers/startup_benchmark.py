@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Startup time of a block-level tokenizer worker.
+
+Every run is a fresh interpreter that imports block_level.tokenizing, reads
+the configuration and tokenizes the given files, timing each step, the way a
+new worker starts on its first files. The modules loaded along the way show
+which extractors and parsers the first files pulled in.
+
+Usage: python startup_benchmark.py [--runs N] file [file ...]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from argparse import SUPPRESS, ArgumentParser
+
+STEPS = ('import', 'read_config', 'first_file', 'total')
+WATCHED_MODULES = ('javalang', 'block_level.extract_java_functions', 'block_level.extract_python_functions')
+
+
+def run_once(paths):
+    """Timings in ms of one startup, in this interpreter."""
+    start = time.perf_counter()
+    from block_level import tokenizing
+    imported = time.perf_counter()
+    tokenizing.read_config()
+    configured = time.perf_counter()
+    first_file = None
+    for path in paths:
+        profile = tokenizing.languages.profile_for(path)
+        if profile is None:
+            print(f"[WARNING] No language profile for {path}", file=sys.stderr)
+            continue
+        with open(path, encoding='utf-8') as f:
+            file_string = f.read()
+        tokenizing.tokenize_blocks(file_string, tokenizing.comment_strippers[profile.name], '', ' '.join(profile.separators), path, profile.block_extractor)
+        if first_file is None:
+            first_file = time.perf_counter()
+    end = time.perf_counter()
+    sandboxed = tokenizing.parser_sandbox is not None
+    if sandboxed:
+        tokenizing.parser_sandbox.close()
+    return {
+        "import": (imported - start) * 1000,
+        "read_config": (configured - imported) * 1000,
+        "first_file": ((first_file or end) - configured) * 1000,
+        "total": (end - start) * 1000,
+        "modules": [name for name in WATCHED_MODULES if name in sys.modules],
+        "sandboxed": sandboxed,
+    }
+
+
+def main():
+    parser = ArgumentParser(description="Time the startup of a block-level tokenizer worker")
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters to average over")
+    parser.add_argument("--child", action="store_true", help=SUPPRESS)
+    parser.add_argument("files", nargs="+", help="files tokenized after the startup")
+    args = parser.parse_args()
+    paths = [os.path.abspath(path) for path in args.files]
+
+    if args.child:
+        print(json.dumps(run_once(paths)))
+        return
+
+    results = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"] + paths,
+                                stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+        # The tokenizer prints its own progress, the timings are the last line
+        results.append(json.loads(output.strip().split("\n")[-1]))
+    print(f"Startup of {args.runs} workers, ms:")
+    print("{:<12} {:>8} {:>8} {:>8}".format("step", "min", "median", "max"))
+    for step in STEPS:
+        values = [result[step] for result in results]
+        print("{:<12} {:>8.1f} {:>8.1f} {:>8.1f}".format(step, min(values), statistics.median(values), max(values)))
+    print("Loaded by the worker: " + (", ".join(results[-1]["modules"]) or "no extractor"))
+    if results[-1]["sandboxed"]:
+        print("The extractors ran in the parser process (PARSE_TIMEOUT > 0), first_file includes starting it")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
 import sys, os
 from db import DB
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'tokenizers'))
+from file_level.block_ids import decode_block_id
 import logging
 import urllib
 
@@ -154,8 +156,7 @@ def import_tokenizer_output_blocks_tokens(db, output_path, logging):
                         if len(entry_split) == 8:
                             proj_id, block_id, block_hash, lines, loc, sloc, starting_line, ending_line = entry_split
 
-                            b_id = block_id[:5]
-                            file_id = block_id[5:]
+                            file_id, b_id = decode_block_id(block_id)
                             block_hash = block_hash[1:-1]  # To remove surrounding quotation marks
 
                             db.insert_block(proj_id, file_id, b_id, block_hash, starting_line, ending_line)